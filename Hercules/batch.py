@@ -0,0 +1,135 @@
+import io
+import posixpath
+import zipfile
+from typing import Optional
+
+REPORT_NAME = 'ERRORS.txt'
+
+
+class BatchError(Exception):
+    """
+    Raised when a batch can't be processed at all, e.g. because the archive is broken or too big.
+    """
+
+
+def safe_path(name: str) -> Optional[str]:
+    """
+    Normalizes a path from an archive or an attachment name and rejects paths that would leave the archive root.
+
+    Args:
+        name: The path.
+
+    Returns:
+        The normalized relative path, or None if the path is absolute or escapes the root.
+    """
+    path = name.replace('\\', '/')
+    if path.startswith('/') or (len(path) > 1 and path[1] == ':'):
+        return None
+    path = posixpath.normpath(path)
+    if path in ('.', '') or path == '..' or path.startswith('../'):
+        return None
+    return path
+
+
+def unique_path(path: str, taken: set[str]) -> str:
+    """
+    Returns path, or path with a number appended to the name if it is taken. The result is added to taken.
+    """
+    result = path
+    root, extension = posixpath.splitext(path)
+    number = 2
+    while result.lower() in taken:
+        result = f'{root} ({number}){extension}'
+        number += 1
+    taken.add(result.lower())
+    return result
+
+
+def extract_lua_files(data: bytes, max_files: int, max_bytes: int, max_file_bytes: int, used_files: int = 0,
+                      used_bytes: int = 0) -> tuple[list[tuple[str, bytes]], list[str]]:
+    """
+    Reads the .lua files of a zip archive into memory without extracting anything to disk.
+    Members with unsafe paths are skipped, and every member is read with a cap, so archives that lie about
+    their sizes can't inflate beyond the limits. The limits apply to a whole batch: files and bytes that earlier
+    attachments of the batch already used count against them, and reading stops as soon as they are exceeded.
+
+    Args:
+        data: The zip archive.
+        max_files: Number of .lua files allowed.
+        max_bytes: Total uncompressed size of the .lua files allowed.
+        max_file_bytes: Uncompressed size of a single .lua file allowed.
+        used_files: Lua files the batch already contains.
+        used_bytes: Size of the Lua files the batch already contains.
+
+    Returns:
+        A tuple of the (path, content) tuples and a list of problems with single members.
+
+    Raises:
+        BatchError: If the archive is broken or the batch exceeds max_files or max_bytes.
+    """
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(data))
+    except (zipfile.BadZipFile, zipfile.LargeZipFile) as e:
+        raise BatchError(f"The archive could not be read: {e}")
+
+    files, problems = [], []
+    taken = set()
+    total = used_bytes
+    skipped = 0
+    with archive:
+        members = [info for info in archive.infolist() if not info.is_dir()]
+        for info in members:
+            if not info.filename.lower().endswith('.lua'):
+                skipped += 1
+                continue
+            path = safe_path(info.filename)
+            if path is None:
+                problems.append(f"{info.filename}: unsafe path, skipped")
+                continue
+            if path.lower() in taken:
+                problems.append(f"{info.filename}: duplicate path, skipped")
+                continue
+            if used_files + len(files) >= max_files:
+                raise BatchError(f"The batch contains more than {max_files} Lua files.")
+            if info.file_size > max_file_bytes:
+                problems.append(f"{path}: bigger than {max_file_bytes // 1024 // 1024} MB, skipped")
+                continue
+            if total + info.file_size > max_bytes:
+                raise BatchError(f"The Lua files are bigger than {max_bytes // 1024 // 1024} MB in total.")
+            try:
+                with archive.open(info) as member:
+                    content = member.read(min(max_file_bytes, max_bytes - total) + 1)
+            except (RuntimeError, NotImplementedError, zipfile.BadZipFile, EOFError) as e:
+                problems.append(f"{path}: could not be read ({e}), skipped")
+                continue
+            if total + len(content) > max_bytes:
+                raise BatchError(f"The Lua files are bigger than {max_bytes // 1024 // 1024} MB in total.")
+            if len(content) > max_file_bytes:
+                problems.append(f"{path}: bigger than {max_file_bytes // 1024 // 1024} MB, skipped")
+                continue
+            total += len(content)
+            taken.add(path.lower())
+            files.append((path, content))
+
+    if skipped:
+        problems.append(f"{skipped} files that are not Lua files were left out.")
+    return files, problems
+
+
+def build_report(errors: list[tuple[str, str]], problems: list[str]) -> str:
+    """
+    Builds the error report of a batch.
+
+    Args:
+        errors: (path, error output) tuples of files that failed.
+        problems: Problems with the batch that don't belong to a processed file.
+
+    Returns:
+        The report as text.
+    """
+    sections = []
+    if problems:
+        sections.append('Skipped:\n' + '\n'.join(f'  {problem}' for problem in problems))
+    for path, error in errors:
+        sections.append(f"{path}\n{'=' * len(path)}\n{error.strip()}")
+    return '\n\n'.join(sections) + '\n'
@@ -0,0 +1,266 @@
+"""
+Offline benchmark of the obfuscation pipeline.
+
+Runs Hercules.obfuscate and isValidLUASyntax over the bundled corpus at increasing input sizes, once per
+single method, with the default methods and with every preset. Every run happens in a fresh child process,
+so CPU time and peak RSS of the obfuscator and luacheck are measured through RUSAGE_CHILDREN.
+
+    python benchmark.py --output results.json
+    python benchmark.py --baseline results.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+CORPUS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_corpus')
+PRESETS = ['min', 'mid', 'max']
+METRICS = ['wall_seconds', 'cpu_seconds', 'peak_rss_kb', 'output_ratio']
+
+_hercules = None
+
+
+def _get_hercules():
+    """
+    Creates the Hercules instance of the current process without caches, daemon or worker pool,
+    so every run pays the full cost.
+    """
+    global _hercules
+    if _hercules is None:
+        import hercules
+        logger = logging.getLogger('Benchmark')
+        logger.setLevel(logging.WARNING)
+        _hercules = hercules.Hercules(logger, validation_cache_size=0, luacheck_daemon=False)
+    return _hercules
+
+
+def _children_usage() -> tuple[float, int]:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime, usage.ru_maxrss
+
+
+def _run_case(case: dict) -> dict:
+    """
+    Runs a single case. Called in a fresh child process.
+
+    Args:
+        case: The case, see build_cases().
+
+    Returns:
+        The measurements of the run.
+    """
+    herc = _get_hercules()
+    folder = tempfile.mkdtemp(prefix='hercules-benchmark-')
+    try:
+        file_path = os.path.join(folder, 'input.lua')
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(case['source'])
+        input_size = os.path.getsize(file_path)
+
+        cpu_before, _ = _children_usage()
+        start = time.perf_counter()
+        if case['variant'] == 'validate':
+            success, output = herc.isValidLUASyntax(file_path, True)
+        else:
+            success, output = herc.obfuscate(file_path, case['bitkey'], case['preset'])
+        wall = time.perf_counter() - start
+        cpu_after, peak_rss = _children_usage()
+
+        return {
+            'success': success,
+            'error': None if success else output[-500:],
+            'wall_seconds': wall,
+            'cpu_seconds': cpu_after - cpu_before,
+            'peak_rss_kb': peak_rss,
+            'input_bytes': input_size,
+            'output_ratio': os.path.getsize(file_path) / input_size if input_size else 0,
+        }
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def load_corpus(folder: str, scales: list[int]) -> dict[str, str]:
+    """
+    Loads the corpus and builds bigger inputs by repeating each script in its own block.
+
+    Args:
+        folder: Folder with the .lua files.
+        scales: Repetition factors.
+
+    Returns:
+        A dict mapping input names to sources.
+    """
+    inputs = {}
+    for name in sorted(os.listdir(folder)):
+        if not name.endswith('.lua'):
+            continue
+        with open(os.path.join(folder, name), 'r', encoding='utf-8') as f:
+            source = f.read()
+        for scale in scales:
+            inputs[f'{name[:-4]}@x{scale}'] = source if scale == 1 else '\n'.join(f'do\n{source}\nend' for _ in range(scale))
+    return inputs
+
+
+def build_cases(inputs: dict[str, str], methods: list[dict], presets: list[str], single_methods: bool = True) -> list[dict]:
+    """
+    Builds the cases of a benchmark run.
+
+    Args:
+        inputs: Input names and sources.
+        methods: Hercules.methods.
+        presets: Presets to run with the default methods.
+        single_methods: Whether to run every method on its own.
+
+    Returns:
+        A list of cases.
+    """
+    default_bitkey = sum(1 << method['bitkey'] for method in methods if method['enabled'])
+    variants = [('validate', 0, None), ('default', default_bitkey, None)]
+    variants += [(f'preset:{preset}', default_bitkey, preset) for preset in presets]
+    if single_methods:
+        variants += [(f"method:{method['key']}", 1 << method['bitkey'], None) for method in methods]
+
+    return [{'id': f'{name}/{variant}', 'input': name, 'variant': variant, 'bitkey': bitkey, 'preset': preset, 'source': source}
+            for name, source in inputs.items()
+            for variant, bitkey, preset in variants]
+
+
+def run(cases: list[dict], repeat: int, jobs: int) -> dict[str, dict]:
+    """
+    Runs all cases and aggregates the repetitions.
+
+    Args:
+        cases: The cases.
+        repeat: Runs per case.
+        jobs: Cases run in parallel. Keep at 1 for stable timings.
+
+    Returns:
+        A dict mapping case ids to the median wall and CPU time, the highest peak RSS and the median output ratio.
+    """
+    runs: dict[str, list[dict]] = {case['id']: [] for case in cases}
+    with ProcessPoolExecutor(max_workers=jobs, max_tasks_per_child=1) as executor:
+        futures = [(case, executor.submit(_run_case, case)) for case in cases for _ in range(repeat)]
+        for case, future in futures:
+            result = future.result()
+            runs[case['id']].append(result)
+            print(f"{case['id']:<50} {result['wall_seconds']:8.3f}s {'ok' if result['success'] else 'FAILED'}", file=sys.stderr)
+
+    results = {}
+    for case_id, case_runs in runs.items():
+        ok = [r for r in case_runs if r['success']]
+        if not ok:
+            results[case_id] = {'success': False, 'error': case_runs[-1]['error']}
+            continue
+        results[case_id] = {
+            'success': len(ok) == len(case_runs),
+            'runs': len(case_runs),
+            'input_bytes': ok[0]['input_bytes'],
+            'wall_seconds': statistics.median(r['wall_seconds'] for r in ok),
+            'cpu_seconds': statistics.median(r['cpu_seconds'] for r in ok),
+            'peak_rss_kb': max(r['peak_rss_kb'] for r in ok),
+            'output_ratio': statistics.median(r['output_ratio'] for r in ok),
+        }
+    return results
+
+
+def compare(results: dict[str, dict], baseline: dict[str, dict], threshold: float) -> list[str]:
+    """
+    Compares results against a baseline.
+
+    Args:
+        results: The current results.
+        baseline: The baseline results.
+        threshold: Relative increase that counts as a regression.
+
+    Returns:
+        A list of regressions, empty if there are none.
+    """
+    regressions = []
+    print(f"\n{'case':<50} {'metric':<14} {'baseline':>12} {'current':>12} {'change':>8}")
+    for case_id, current in results.items():
+        previous = baseline.get(case_id)
+        if not previous:
+            continue
+        if previous.get('success') and not current.get('success'):
+            regressions.append(f"{case_id}: fails now")
+            continue
+        if not current.get('success'):
+            continue
+        for metric in METRICS:
+            old, new = previous.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            marker = ' !' if change > threshold else ''
+            print(f"{case_id:<50} {metric:<14} {old:>12.4g} {new:>12.4g} {change:>+7.1%}{marker}")
+            if change > threshold:
+                regressions.append(f"{case_id}: {metric} {change:+.1%}")
+    return regressions
+
+
+def print_table(results: dict[str, dict]):
+    print(f"\n{'case':<50} {'bytes':>9} {'wall s':>9} {'cpu s':>9} {'rss MB':>8} {'ratio':>7}")
+    for case_id, result in results.items():
+        if not result.get('success') and 'wall_seconds' not in result:
+            print(f"{case_id:<50} FAILED: {(result.get('error') or '').strip().splitlines()[-1:]}")
+            continue
+        print(f"{case_id:<50} {result['input_bytes']:>9} {result['wall_seconds']:>9.3f} {result['cpu_seconds']:>9.3f} "
+              f"{result['peak_rss_kb'] / 1024:>8.1f} {result['output_ratio']:>7.2f}")
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the obfuscation pipeline.')
+    parser.add_argument('--corpus', default=CORPUS_FOLDER, help='Folder with .lua inputs.')
+    parser.add_argument('--scales', default='1,4,16', help='Comma-separated repetition factors for bigger inputs.')
+    parser.add_argument('--presets', default=','.join(PRESETS), help='Comma-separated presets, empty for none.')
+    parser.add_argument('--no-single-methods', action='store_true', help='Skip the per-method sweep.')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per case.')
+    parser.add_argument('--jobs', type=int, default=1, help='Cases run in parallel.')
+    parser.add_argument('--output', help='Write the results as JSON.')
+    parser.add_argument('--baseline', help='Compare against results written by --output.')
+    parser.add_argument('--threshold', type=float, default=0.15, help='Relative increase that counts as a regression.')
+    args = parser.parse_args(argv)
+
+    herc = _get_hercules()
+    inputs = load_corpus(args.corpus, [int(s) for s in args.scales.split(',') if s])
+    presets = [p for p in args.presets.split(',') if p]
+    cases = build_cases(inputs, herc.methods, presets, single_methods=not args.no_single_methods)
+    print(f"Running {len(cases)} cases x {args.repeat}...", file=sys.stderr)
+
+    results = run(cases, args.repeat, args.jobs)
+    print_table(results)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({
+                'meta': {
+                    'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                    'obfuscator_revision': herc._obfuscator_revision(),
+                    'python': platform.python_version(),
+                    'platform': platform.platform(),
+                },
+                'results': results,
+            }, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline['results'], args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regressions:\n" + '\n'.join(regressions))
+            return 1
+        print("\nNo regressions.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
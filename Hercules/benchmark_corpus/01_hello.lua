@@ -0,0 +1,9 @@
+-- Smallest input: a few statements and a function call.
+local function greet(name)
+    return "Hello, " .. name .. "!"
+end
+
+local names = {"Lua", "Hercules", "World"}
+for i = 1, #names do
+    print(greet(names[i]))
+end
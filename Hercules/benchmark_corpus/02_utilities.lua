@@ -0,0 +1,99 @@
+-- Small input: string and table helpers as found in typical scripts.
+local utils = {}
+
+function utils.split(text, separator)
+    local parts = {}
+    local pattern = string.format("([^%s]+)", separator or "%s")
+    for part in string.gmatch(text, pattern) do
+        parts[#parts + 1] = part
+    end
+    return parts
+end
+
+function utils.trim(text)
+    return (text:gsub("^%s+", ""):gsub("%s+$", ""))
+end
+
+function utils.starts_with(text, prefix)
+    return text:sub(1, #prefix) == prefix
+end
+
+function utils.map(list, fn)
+    local result = {}
+    for i, value in ipairs(list) do
+        result[i] = fn(value, i)
+    end
+    return result
+end
+
+function utils.filter(list, predicate)
+    local result = {}
+    for _, value in ipairs(list) do
+        if predicate(value) then
+            result[#result + 1] = value
+        end
+    end
+    return result
+end
+
+function utils.reduce(list, fn, initial)
+    local accumulator = initial
+    for _, value in ipairs(list) do
+        accumulator = fn(accumulator, value)
+    end
+    return accumulator
+end
+
+function utils.copy(value, seen)
+    if type(value) ~= "table" then
+        return value
+    end
+    seen = seen or {}
+    if seen[value] then
+        return seen[value]
+    end
+    local result = {}
+    seen[value] = result
+    for key, item in pairs(value) do
+        result[utils.copy(key, seen)] = utils.copy(item, seen)
+    end
+    return setmetatable(result, getmetatable(value))
+end
+
+function utils.serialize(value, indent)
+    indent = indent or ""
+    if type(value) == "string" then
+        return string.format("%q", value)
+    elseif type(value) ~= "table" then
+        return tostring(value)
+    end
+    local keys = {}
+    for key in pairs(value) do
+        keys[#keys + 1] = key
+    end
+    table.sort(keys, function(a, b)
+        return tostring(a) < tostring(b)
+    end)
+    local lines = {"{"}
+    for _, key in ipairs(keys) do
+        lines[#lines + 1] = string.format("%s  [%s] = %s,", indent, utils.serialize(key), utils.serialize(value[key], indent .. "  "))
+    end
+    lines[#lines + 1] = indent .. "}"
+    return table.concat(lines, "\n")
+end
+
+local words = utils.split("  the quick brown fox jumps over the lazy dog  ")
+local lengths = utils.map(words, function(word)
+    return #word
+end)
+local long_words = utils.filter(words, function(word)
+    return #word > 3
+end)
+local total = utils.reduce(lengths, function(a, b)
+    return a + b
+end, 0)
+
+print(utils.trim("   padded   "))
+print(utils.starts_with("hercules", "herc"))
+print(total, #long_words)
+print(utils.serialize(utils.copy({words = long_words, total = total, nested = {a = 1, b = {c = true}}})))
@@ -0,0 +1,193 @@
+-- Medium input: a small object model with inheritance, closures and a simulation loop.
+local Item = {}
+Item.__index = Item
+
+function Item.new(name, weight, value, kind)
+    local self = setmetatable({}, Item)
+    self.name = name
+    self.weight = weight
+    self.value = value
+    self.kind = kind or "misc"
+    return self
+end
+
+function Item:ratio()
+    if self.weight == 0 then
+        return math.huge
+    end
+    return self.value / self.weight
+end
+
+function Item:__tostring()
+    return string.format("%s (%s, %.1fkg, %d gold)", self.name, self.kind, self.weight, self.value)
+end
+
+local Weapon = setmetatable({}, {__index = Item})
+Weapon.__index = Weapon
+Weapon.__tostring = Item.__tostring
+
+function Weapon.new(name, weight, value, damage, speed)
+    local self = Item.new(name, weight, value, "weapon")
+    self.damage = damage
+    self.speed = speed
+    return setmetatable(self, Weapon)
+end
+
+function Weapon:dps()
+    return self.damage * self.speed
+end
+
+local Inventory = {}
+Inventory.__index = Inventory
+
+function Inventory.new(capacity)
+    return setmetatable({items = {}, capacity = capacity, listeners = {}}, Inventory)
+end
+
+function Inventory:weight()
+    local total = 0
+    for _, item in ipairs(self.items) do
+        total = total + item.weight
+    end
+    return total
+end
+
+function Inventory:on(event, callback)
+    self.listeners[event] = self.listeners[event] or {}
+    table.insert(self.listeners[event], callback)
+end
+
+function Inventory:emit(event, ...)
+    for _, callback in ipairs(self.listeners[event] or {}) do
+        callback(...)
+    end
+end
+
+function Inventory:add(item)
+    if self:weight() + item.weight > self.capacity then
+        self:emit("rejected", item)
+        return false
+    end
+    table.insert(self.items, item)
+    self:emit("added", item)
+    return true
+end
+
+function Inventory:remove(name)
+    for index, item in ipairs(self.items) do
+        if item.name == name then
+            table.remove(self.items, index)
+            self:emit("removed", item)
+            return item
+        end
+    end
+    return nil
+end
+
+function Inventory:sorted(by)
+    local copy = {table.unpack(self.items)}
+    table.sort(copy, function(a, b)
+        return by(a) > by(b)
+    end)
+    return copy
+end
+
+function Inventory:best_fit(capacity)
+    -- 0/1 knapsack over integer weights.
+    local items = self.items
+    local best = {}
+    for w = 0, capacity do
+        best[w] = 0
+    end
+    local keep = {}
+    for i, item in ipairs(items) do
+        keep[i] = {}
+        local weight = math.floor(item.weight)
+        for w = capacity, weight, -1 do
+            local candidate = best[w - weight] + item.value
+            if candidate > best[w] then
+                best[w] = candidate
+                keep[i][w] = true
+            end
+        end
+    end
+    local chosen, w = {}, capacity
+    for i = #items, 1, -1 do
+        if keep[i][w] then
+            table.insert(chosen, 1, items[i])
+            w = w - math.floor(items[i].weight)
+        end
+    end
+    return chosen, best[capacity]
+end
+
+local function make_counter()
+    local counts = {}
+    return function(kind)
+        counts[kind] = (counts[kind] or 0) + 1
+        return counts[kind]
+    end, function()
+        return counts
+    end
+end
+
+local count, counts = make_counter()
+local log = {}
+local inventory = Inventory.new(60)
+
+inventory:on("added", function(item)
+    count(item.kind)
+    log[#log + 1] = "added " .. tostring(item)
+end)
+inventory:on("rejected", function(item)
+    log[#log + 1] = "rejected " .. item.name
+end)
+inventory:on("removed", function(item)
+    log[#log + 1] = "removed " .. item.name
+end)
+
+local catalogue = {
+    Weapon.new("Short Sword", 4, 30, 6, 1.4),
+    Weapon.new("War Hammer", 12, 55, 14, 0.7),
+    Weapon.new("Dagger", 1, 12, 3, 2.5),
+    Item.new("Rope", 3, 5, "tool"),
+    Item.new("Lantern", 2, 10, "tool"),
+    Item.new("Ration", 1, 2, "food"),
+    Item.new("Gold Idol", 8, 120, "treasure"),
+    Item.new("Tent", 15, 25, "tool"),
+    Item.new("Potion", 1, 40, "potion"),
+    Item.new("Anvil", 40, 60, "tool"),
+}
+
+local seed = 42
+local function random(limit)
+    seed = (seed * 1103515245 + 12345) % 2147483648
+    return seed % limit + 1
+end
+
+for turn = 1, 200 do
+    local item = catalogue[random(#catalogue)]
+    if not inventory:add(item) and turn % 3 == 0 then
+        local heaviest = inventory:sorted(function(i)
+            return i.weight
+        end)[1]
+        if heaviest then
+            inventory:remove(heaviest.name)
+        end
+    end
+end
+
+local by_ratio = inventory:sorted(Item.ratio)
+local chosen, value = inventory:best_fit(30)
+local damage = 0
+for _, item in ipairs(inventory.items) do
+    if getmetatable(item) == Weapon then
+        damage = damage + item:dps()
+    end
+end
+
+print(#log, #inventory.items, inventory:weight())
+print(tostring(by_ratio[1]), value, #chosen, string.format("%.2f", damage))
+for kind, amount in pairs(counts()) do
+    print(kind, amount)
+end
@@ -0,0 +1,307 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class ObfuscationCache:
+    """
+    Disk-backed, size-bounded LRU cache for obfuscation results.
+    Entries are addressed by the SHA-256 of the source, the bitkey, the preset and the obfuscator revision.
+    Each entry is the raw obfuscated code in a .lua file and its validation output and obfuscator revision in a
+    .json file next to it. Entries of other revisions can't be hit anymore and are removed by set_revision().
+    """
+
+    def __init__(self, folder: str, max_bytes: int):
+        """
+        Initializes the cache and indexes the entries already on disk. Temporary files left by an interrupted
+        write are removed.
+
+        Args:
+            folder: Folder the entries are stored in.
+            max_bytes: Maximum total size of all entries.
+        """
+        self._folder = folder
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index: OrderedDict[str, int] = OrderedDict()
+        self._revisions: dict[str, Optional[str]] = {}
+        self._size = 0
+        self._revision = None
+        os.makedirs(folder, exist_ok=True)
+
+        entries = []
+        names = set(os.listdir(folder))
+        for name in names:
+            if name.endswith('.tmp'):
+                try:
+                    os.remove(os.path.join(folder, name))
+                except OSError:
+                    pass
+            elif name.endswith('.lua') and f'{name[:-4]}.json' not in names:
+                self._remove(name[:-4])
+            elif name.endswith('.json'):
+                key = name[:-5]
+                try:
+                    with open(os.path.join(folder, name), 'r', encoding='utf-8') as f:
+                        revision = json.load(f).get('revision')
+                    stat = os.stat(os.path.join(folder, name))
+                    size = stat.st_size + os.path.getsize(self._blob_path(key))
+                except (OSError, ValueError, AttributeError):
+                    self._remove(key)
+                    continue
+                entries.append((stat.st_mtime, key, size, revision))
+        for _, key, size, revision in sorted(entries):
+            self._index[key] = size
+            self._revisions[key] = revision
+            self._size += size
+
+    @staticmethod
+    def make_key(source: bytes, bitkey: int, optional_preset: Optional[str], revision: str) -> str:
+        """
+        Builds the cache key of a job.
+
+        Args:
+            source: The LUA source as bytes.
+            bitkey: Bitkey representing the obfuscation methods to use.
+            optional_preset: Optional preset for obfuscation level.
+            revision: Revision of the obfuscator checkout.
+
+        Returns:
+            The key as a hex string.
+        """
+        digest = hashlib.sha256(source)
+        digest.update(f"\0{bitkey}\0{optional_preset or ''}\0{revision}".encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def seed_for(key: str) -> int:
+        """
+        Derives a deterministic random seed from a cache key.
+
+        Args:
+            key: The cache key.
+
+        Returns:
+            A 48-bit integer seed.
+        """
+        return int(key[:12], 16)
+
+    def set_revision(self, revision: str):
+        """
+        Sets the obfuscator revision and removes the entries of every other revision, as they can't be hit anymore.
+
+        Args:
+            revision: Revision of the obfuscator checkout.
+        """
+        with self._lock:
+            if self._revision == revision:
+                return
+            self._revision = revision
+            for key in list(self._index):
+                if self._revisions.get(key) != revision:
+                    self._remove(key)
+
+    def get(self, key: str) -> Optional[tuple[bytes, str]]:
+        """
+        Looks up an entry and marks it as recently used.
+
+        Args:
+            key: The cache key.
+
+        Returns:
+            A tuple of the obfuscated code and the validation output, or None on a miss.
+        """
+        with self._lock:
+            if key not in self._index:
+                return None
+            path = self._path(key)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+                with open(self._blob_path(key), 'rb') as f:
+                    output = f.read()
+                os.utime(path)
+            except (OSError, ValueError):
+                self._remove(key)
+                return None
+            self._index.move_to_end(key)
+        return output, entry['conout']
+
+    def put(self, key: str, output: bytes, conout: str):
+        """
+        Stores an entry and evicts the least recently used entries if the cache is too big.
+
+        Args:
+            key: The cache key.
+            output: The obfuscated code.
+            conout: The validation output of the obfuscated code.
+        """
+        data = json.dumps({'conout': conout, 'revision': self._revision}).encode('utf-8')
+        size = len(data) + len(output)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            # The metadata is written last, an entry only counts once its .json file exists.
+            if not self._write(self._blob_path(key), output) or not self._write(self._path(key), data):
+                self._remove(key)
+                return
+            self._size += size - self._index.pop(key, 0)
+            self._index[key] = size
+            self._revisions[key] = self._revision
+            while self._size > self.max_bytes and self._index:
+                self._remove(next(iter(self._index)))
+
+    def _write(self, path: str, data: bytes) -> bool:
+        fd, temp_path = tempfile.mkstemp(dir=self._folder, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return False
+        return True
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._folder, f'{key}.json')
+
+    def _blob_path(self, key: str) -> str:
+        return os.path.join(self._folder, f'{key}.lua')
+
+    def _remove(self, key: str):
+        self._size -= self._index.pop(key, 0)
+        self._revisions.pop(key, None)
+        for path in (self._path(key), self._blob_path(key)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class ValidationCache:
+    """
+    Cache for luacheck results, keyed by the SHA-256 of the code and the luacheck version.
+    Valid and invalid results are both cached, in a bounded in-memory LRU and optionally on disk.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600, folder: Optional[str] = None):
+        """
+        Initializes the cache.
+
+        Args:
+            max_entries: Maximum number of entries kept in memory.
+            ttl: Seconds an entry stays valid.
+            folder: Optional folder to persist entries in.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._folder = folder
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[float, bool, str]] = OrderedDict()
+        self._puts = 0
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+    @staticmethod
+    def make_key(lua_code: bytes, version: str) -> str:
+        """
+        Builds the cache key of a validation.
+
+        Args:
+            lua_code: The LUA code as bytes.
+            version: The luacheck version.
+
+        Returns:
+            The key as a hex string.
+        """
+        digest = hashlib.sha256(lua_code)
+        digest.update(f"\0{version}".encode())
+        return digest.hexdigest()
+
+    def get(self, key: str, disk: bool = True) -> Optional[tuple[bool, str]]:
+        """
+        Looks up a validation result.
+
+        Args:
+            key: The cache key.
+            disk: Whether to fall back to the disk cache on a memory miss.
+
+        Returns:
+            A tuple of the validity and the luacheck output, or None on a miss.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                return entry[1], entry[2]
+            self._entries.pop(key, None)
+
+        if not self._folder or not disk:
+            return None
+        path = os.path.join(self._folder, f'{key}.json')
+        try:
+            expires = os.path.getmtime(path) + self.ttl
+            if expires <= now:
+                os.remove(path)
+                return None
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self._remember(key, expires, data['valid'], data['output'])
+        return data['valid'], data['output']
+
+    def put(self, key: str, valid: bool, output: str):
+        """
+        Stores a validation result.
+
+        Args:
+            key: The cache key.
+            valid: Whether the code is valid.
+            output: The luacheck output.
+        """
+        self._remember(key, time.time() + self.ttl, valid, output)
+        if not self._folder:
+            return
+
+        fd, temp_path = tempfile.mkstemp(dir=self._folder, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'valid': valid, 'output': output}, f)
+            os.replace(temp_path, os.path.join(self._folder, f'{key}.json'))
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        with self._lock:
+            self._puts += 1
+            prune = self._puts % 256 == 0
+        if prune:
+            self._prune_disk()
+
+    def _remember(self, key: str, expires: float, valid: bool, output: str):
+        with self._lock:
+            self._entries[key] = (expires, valid, output)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _prune_disk(self):
+        """
+        Removes expired entries from disk.
+        """
+        cutoff = time.time() - self.ttl
+        for name in os.listdir(self._folder):
+            path = os.path.join(self._folder, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                continue
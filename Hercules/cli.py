@@ -0,0 +1,260 @@
+"""
+Headless command line interface for the obfuscation pipeline.
+
+Validates or obfuscates files and directory trees in parallel, through the same Hercules code path as the bot,
+without Discord and without the bot's configuration.
+
+    python -m Hercules.cli scripts/ --output obfuscated/ --preset max --summary summary.json
+    python cli.py main.lua --methods control_flow,string_encoding --jobs 4
+    python cli.py scripts/ --check
+
+Without --output, results are written next to the inputs as <name>.obfuscated.lua. Inputs are only
+overwritten with --in-place.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+from typing import Optional
+
+import hercules
+import ingest
+from limits import ResourceLimitExceeded, ResourceLimits
+
+PRESETS = ['min', 'mid', 'max']
+OBFUSCATED_SUFFIX = '.obfuscated.lua'
+
+
+def collect_files(paths: list[str], extension: str = '.lua') -> list[tuple[str, str]]:
+    """
+    Expands the given files and directories into the files to process.
+
+    Args:
+        paths: Files and directories. Directories are searched recursively.
+        extension: Extension of the files to pick from directories. Results of earlier runs next to the inputs are skipped.
+
+    Returns:
+        A sorted list of (path, path relative to its directory argument) tuples.
+    """
+    files = {}
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                dirs.sort()
+                for name in names:
+                    if name.endswith(extension) and not name.endswith(OBFUSCATED_SUFFIX):
+                        full = os.path.join(root, name)
+                        files[os.path.abspath(full)] = (full, os.path.relpath(full, path))
+        elif os.path.isfile(path):
+            files[os.path.abspath(path)] = (path, os.path.basename(path))
+        else:
+            raise FileNotFoundError(f"No such file or directory: {path}")
+    return sorted(files.values(), key=lambda f: f[0])
+
+
+def default_destination(path: str) -> str:
+    """
+    Returns the path the result of a file is written to without --output and --in-place.
+    """
+    root, _ = os.path.splitext(path)
+    return root + OBFUSCATED_SUFFIX
+
+
+def parse_bitkey(methods: list[dict], keys: Optional[str], bitkey: Optional[int]) -> int:
+    """
+    Builds the bitkey from method keys, an explicit bitkey or the default methods.
+
+    Args:
+        methods: Hercules.methods.
+        keys: Comma-separated method keys, or None.
+        bitkey: Explicit bitkey, or None.
+
+    Returns:
+        The bitkey.
+
+    Raises:
+        ValueError: If a method key is unknown or the bitkey is out of range.
+    """
+    if bitkey is not None:
+        max_bitkey = (1 << len(methods)) - 1
+        if not 0 <= bitkey <= max_bitkey:
+            raise ValueError(f"--bitkey must be between 0 and {max_bitkey}")
+        return bitkey
+    if keys is None:
+        return sum(1 << method['bitkey'] for method in methods if method['enabled'])
+    by_key = {method['key']: method for method in methods}
+    result = 0
+    for key in filter(None, (k.strip() for k in keys.split(','))):
+        if key not in by_key:
+            raise ValueError(f"Unknown method '{key}'. Known methods: {', '.join(by_key)}")
+        result |= 1 << by_key[key]['bitkey']
+    return result
+
+
+async def process_file(herc: hercules.Hercules, path: str, destination: str, bitkey: int, preset: Optional[str], check_only: bool) -> dict:
+    """
+    Validates or obfuscates a single file.
+
+    Args:
+        herc: The Hercules instance.
+        path: File to process.
+        destination: Where to write the result.
+        bitkey: Bitkey representing the obfuscation methods to use.
+        preset: Optional preset for obfuscation level.
+        check_only: Only validate the file.
+
+    Returns:
+        The result of the file, see main().
+    """
+    result = {'path': path, 'output': None, 'success': False, 'error': None, 'input_bytes': 0, 'output_bytes': 0}
+    start = time.perf_counter()
+    try:
+        with open(path, 'rb') as f:
+            raw = f.read()
+        result['input_bytes'] = len(raw)
+        lua_code = await asyncio.to_thread(ingest.decode_source, raw)
+
+        valid, conout = await herc.isValidLUASyntax_async(lua_code)
+        if not valid or check_only:
+            result['success'] = valid
+            result['error'] = None if valid else conout
+            return result
+
+        success, conout, output = await herc.obfuscate_code_async(lua_code, bitkey, preset)
+        result['success'] = success
+        result['error'] = None if success else conout
+        if success:
+            os.makedirs(os.path.dirname(os.path.abspath(destination)), exist_ok=True)
+            with open(destination, 'wb') as f:
+                f.write(output)
+            result['output'] = destination
+            result['output_bytes'] = len(output)
+    except ResourceLimitExceeded as e:
+        result['error'] = str(e)
+    except (OSError, ValueError) as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    finally:
+        result['seconds'] = round(time.perf_counter() - start, 3)
+    return result
+
+
+async def run(herc: hercules.Hercules, files: list[tuple[str, str]], output_folder: Optional[str], bitkey: int, preset: Optional[str],
+              check_only: bool, jobs: int, quiet: bool = False, in_place: bool = False) -> list[dict]:
+    """
+    Processes all files with up to jobs files at a time and prints the progress to stderr.
+    Results go to output_folder, over the inputs with in_place, or next to the inputs otherwise.
+
+    Returns:
+        The results in the order of the files.
+    """
+    semaphore = asyncio.Semaphore(jobs)
+    done = 0
+
+    async def __process(path: str, relative: str) -> dict:
+        nonlocal done
+        if output_folder:
+            destination = os.path.join(output_folder, relative)
+        else:
+            destination = path if in_place else default_destination(path)
+        async with semaphore:
+            result = await process_file(herc, path, destination, bitkey, preset, check_only)
+        done += 1
+        if not quiet:
+            status = 'ok' if result['success'] else 'FAILED'
+            print(f"[{done}/{len(files)}] {path} {status} {result['seconds']:.2f}s", file=sys.stderr)
+        return result
+
+    if not check_only:
+        await herc.start_worker_pool()
+    await herc.start_luacheck_daemon()
+    try:
+        return await asyncio.gather(*(__process(path, relative) for path, relative in files))
+    finally:
+        await herc.stop_worker_pool()
+        await herc.stop_luacheck_daemon()
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Validate and obfuscate LUA files without the Discord bot.')
+    parser.add_argument('paths', nargs='*', help='Files and directories to process. Directories are searched for .lua files.')
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument('--output', help=f'Folder for the results, mirroring the input trees. Without it results are written next to the inputs as <name>{OBFUSCATED_SUFFIX}.')
+    output.add_argument('--in-place', action='store_true', help='Overwrite the inputs with the results.')
+    parser.add_argument('--methods', help='Comma-separated method keys, see --list-methods. Defaults to the methods enabled in the bot.')
+    parser.add_argument('--bitkey', type=int, help='Methods as a bitkey, overrides --methods.')
+    parser.add_argument('--preset', choices=PRESETS, help='Obfuscation preset.')
+    parser.add_argument('--check', action='store_true', help='Only validate the files.')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='Files processed in parallel.')
+    parser.add_argument('--seed', action='store_true', help='Seed the obfuscator from the input, so equal inputs give equal results.')
+    parser.add_argument('--timeout', type=float, help='Seconds an obfuscator run may take.')
+    parser.add_argument('--summary', help="Write a JSON summary to this file, '-' for stdout.")
+    parser.add_argument('--list-methods', action='store_true', help='List the obfuscation methods and exit.')
+    parser.add_argument('--quiet', action='store_true', help='No progress output.')
+    parser.add_argument('--verbose', action='store_true', help='Log the pipeline to stderr.')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format='%(levelname)s %(message)s', stream=sys.stderr)
+    logger = logging.getLogger('Hercules')
+    herc = hercules.Hercules(logger,
+                             worker_pool_size=args.jobs,
+                             cache_folder=None,
+                             deterministic_seed=args.seed,
+                             validation_cache_size=0,
+                             resource_limits=ResourceLimits(wall_seconds=args.timeout)
+                             )
+
+    if args.list_methods:
+        for method in herc.methods:
+            print(f"{method['key']:<20} bit {method['bitkey']:<3} {'default' if method['enabled'] else '':<8} {method['name']}")
+        return 0
+    if not args.paths:
+        parser.error('no files given')
+
+    try:
+        bitkey = parse_bitkey(herc.methods, args.methods, args.bitkey)
+        files = collect_files(args.paths)
+    except (ValueError, FileNotFoundError) as e:
+        parser.error(str(e))
+    if bitkey == 0 and not args.preset and not args.check:
+        parser.error('no obfuscation methods selected, pass --methods, --bitkey or --preset')
+    if args.output and not args.check:
+        os.makedirs(args.output, exist_ok=True)
+
+    start = time.perf_counter()
+    results = asyncio.run(run(herc, files, None if args.check else args.output, bitkey, args.preset, args.check, max(args.jobs, 1), args.quiet,
+                              args.in_place))
+    failed = [r for r in results if not r['success']]
+    summary = {
+        'mode': 'check' if args.check else 'obfuscate',
+        'bitkey': bitkey,
+        'methods': [m['key'] for m in herc.methods if bitkey >> m['bitkey'] & 1],
+        'preset': args.preset,
+        'files': len(results),
+        'succeeded': len(results) - len(failed),
+        'failed': len(failed),
+        'seconds': round(time.perf_counter() - start, 3),
+        'results': results,
+    }
+
+    if not args.quiet:
+        print(f"{summary['succeeded']}/{summary['files']} files succeeded in {summary['seconds']:.1f}s", file=sys.stderr)
+        for result in failed:
+            error = (result['error'] or '').strip().splitlines()
+            print(f"  {result['path']}: {error[-1] if error else 'failed'}", file=sys.stderr)
+    if args.summary == '-':
+        json.dump(summary, sys.stdout, indent=2)
+        print()
+    elif args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
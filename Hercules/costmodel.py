@@ -0,0 +1,239 @@
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import deque
+from typing import NamedTuple, Optional
+
+PRESETS = ['min', 'mid', 'max']
+TOKEN_PATTERN = re.compile(rb'[A-Za-z_][A-Za-z0-9_]*|\d[\w.]*|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|\[=*\[|\]=*\]|--|\.\.\.?|[=~<>]=|::|\S')
+
+
+class Estimate(NamedTuple):
+    seconds: float
+    output_bytes: float
+
+
+def count_tokens(source: bytes) -> int:
+    """
+    Counts the LUA tokens of the source, approximately. Comments and long strings are not skipped.
+
+    Args:
+        source: LUA code as bytes.
+
+    Returns:
+        The number of tokens.
+    """
+    return sum(1 for _ in TOKEN_PATTERN.finditer(source))
+
+
+def _solve(matrix: list[list[float]], vector: list[float]) -> list[float]:
+    """
+    Solves a linear system with Gaussian elimination and partial pivoting.
+    """
+    n = len(vector)
+    rows = [row[:] + [value] for row, value in zip(matrix, vector)]
+    for column in range(n):
+        pivot = max(range(column, n), key=lambda r: abs(rows[r][column]))
+        if abs(rows[pivot][column]) < 1e-12:
+            continue
+        rows[column], rows[pivot] = rows[pivot], rows[column]
+        for r in range(column + 1, n):
+            factor = rows[r][column] / rows[column][column]
+            if factor:
+                for c in range(column, n + 1):
+                    rows[r][c] -= factor * rows[column][c]
+    result = [0.0] * n
+    for r in range(n - 1, -1, -1):
+        if abs(rows[r][r]) < 1e-12:
+            continue
+        result[r] = (rows[r][n] - sum(rows[r][c] * result[c] for c in range(r + 1, n))) / rows[r][r]
+    return result
+
+
+def _fit(samples: list[list[float]], targets: list[float], ridge: float) -> list[float]:
+    """
+    Fits a linear model with ridge regularisation through the normal equations. The intercept is not regularised.
+    """
+    n = len(samples[0])
+    gram = [[0.0] * n for _ in range(n)]
+    moment = [0.0] * n
+    for x, y in zip(samples, targets):
+        for i in range(n):
+            moment[i] += x[i] * y
+            for j in range(i, n):
+                gram[i][j] += x[i] * x[j]
+    for i in range(n):
+        for j in range(i):
+            gram[i][j] = gram[j][i]
+        if i:
+            gram[i][i] += ridge
+    return _solve(gram, moment)
+
+
+class CostModel:
+    """
+    Predicts the run time and output size of an obfuscation job.
+    Both are modelled as log-linear in the input size and token count, with one term per method and preset,
+    and fitted with ridge regression on the job history. The history is a JSONL file the model appends
+    every finished job to, and the model is retrained in the background as it grows.
+    """
+
+    def __init__(self, history_file: str, method_count: int, min_samples: int = 50, retrain_every: int = 25,
+                 max_samples: int = 5000, ridge: float = 0.1):
+        """
+        Initializes the model and trains it on the existing history.
+
+        Args:
+            history_file: Path of the JSONL job history.
+            method_count: Number of obfuscation methods, i.e. bits of the bitkey.
+            min_samples: Jobs needed before the model predicts anything.
+            retrain_every: Jobs recorded between two trainings.
+            max_samples: Newest jobs used for training. The history is cut back to them when it grows past twice as many.
+            ridge: Regularisation strength.
+        """
+        self._history_file = history_file
+        self.method_count = method_count
+        self.min_samples = min_samples
+        self.retrain_every = retrain_every
+        self.max_samples = max_samples
+        self.ridge = ridge
+        self._lock = threading.Lock()
+        self._coefficients: Optional[tuple[list[float], list[float]]] = None
+        self._recorded = 0
+        self._history_lines = 0
+        self.samples = 0
+        os.makedirs(os.path.dirname(os.path.abspath(history_file)), exist_ok=True)
+        self.train()
+
+    @property
+    def trained(self) -> bool:
+        return self._coefficients is not None
+
+    def _features(self, input_bytes: int, tokens: int, bitkey: int, preset: Optional[str]) -> list[float]:
+        features = [1.0, math.log1p(input_bytes), math.log1p(tokens)]
+        features += [float(bitkey >> bit & 1) for bit in range(self.method_count)]
+        features += [float(preset == p) for p in PRESETS]
+        return features
+
+    def predict(self, source: bytes, bitkey: int, preset: Optional[str]) -> Optional[Estimate]:
+        """
+        Estimates a job.
+
+        Args:
+            source: LUA code as bytes.
+            bitkey: Bitkey representing the obfuscation methods to use.
+            preset: Optional preset for obfuscation level ("min", "mid", "max").
+
+        Returns:
+            The estimate, or None while there is not enough history.
+        """
+        coefficients = self._coefficients
+        if not coefficients:
+            return None
+        features = self._features(len(source), count_tokens(source), bitkey, preset)
+        time_coefficients, size_coefficients = coefficients
+        seconds = math.expm1(sum(f * c for f, c in zip(features, time_coefficients)))
+        output_bytes = math.expm1(sum(f * c for f, c in zip(features, size_coefficients)))
+        return Estimate(max(seconds, 0.0), max(output_bytes, 0.0))
+
+    def record(self, source: bytes, bitkey: int, preset: Optional[str], seconds: float, output_bytes: Optional[int]):
+        """
+        Appends a finished job to the history and retrains the model every retrain_every jobs. This blocks, so call it in a thread.
+        Jobs that failed or were killed are recorded without an output size, so they only train the time model.
+
+        Args:
+            source: LUA code as bytes.
+            bitkey: Bitkey representing the obfuscation methods used.
+            preset: Optional preset used.
+            seconds: Seconds the obfuscator ran.
+            output_bytes: Size of the obfuscated code, None if there is none.
+        """
+        entry = {
+            'time': time.time(),
+            'input_bytes': len(source),
+            'tokens': count_tokens(source),
+            'bitkey': bitkey,
+            'preset': preset,
+            'seconds': round(seconds, 4),
+            'output_bytes': output_bytes,
+        }
+        with self._lock:
+            with open(self._history_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+            self._recorded += 1
+            self._history_lines += 1
+            if self._history_lines > 2 * self.max_samples:
+                self._truncate()
+            retrain = self._recorded % self.retrain_every == 0
+        if retrain:
+            self.train()
+
+    def _read_tail(self) -> tuple[deque, int]:
+        """
+        Reads the newest max_samples lines of the history and counts all of them.
+
+        Raises:
+            OSError: If the history can't be read.
+        """
+        lines = deque(maxlen=self.max_samples)
+        count = 0
+        with open(self._history_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                lines.append(line)
+                count += 1
+        return lines, count
+
+    def _truncate(self):
+        """
+        Cuts the history back to its newest max_samples lines. Called with the lock held.
+        """
+        try:
+            lines, _ = self._read_tail()
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self._history_file)), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    f.writelines(lines)
+                os.replace(temp_path, self._history_file)
+            except OSError:
+                os.remove(temp_path)
+                raise
+        except OSError:
+            return
+        self._history_lines = len(lines)
+
+    def train(self):
+        """
+        Fits the model on the newest max_samples jobs of the history. This blocks, so call it in a thread.
+        """
+        try:
+            lines, count = self._read_tail()
+        except OSError:
+            return
+        with self._lock:
+            self._history_lines = count
+
+        samples, times, size_samples, sizes = [], [], [], []
+        for line in lines:
+            try:
+                entry = json.loads(line)
+                features = self._features(entry['input_bytes'], entry['tokens'], entry['bitkey'], entry['preset'])
+                seconds = math.log1p(entry['seconds'])
+                output_bytes = entry['output_bytes']
+                size = math.log1p(output_bytes) if output_bytes is not None else None
+            except (ValueError, KeyError, TypeError):
+                continue
+            samples.append(features)
+            times.append(seconds)
+            if size is not None:
+                size_samples.append(features)
+                sizes.append(size)
+        if len(samples) < self.min_samples or not size_samples:
+            return
+
+        coefficients = (_fit(samples, times, self.ridge), _fit(size_samples, sizes, self.ridge))
+        self._coefficients = coefficients
+        self.samples = len(samples)
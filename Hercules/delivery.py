@@ -0,0 +1,95 @@
+import io
+import os
+from typing import Optional
+from zipfile import ZIP_BZIP2, ZIP_DEFLATED, ZIP_LZMA, ZipFile
+
+ALGORITHMS = {
+    'deflate': ZIP_DEFLATED,
+    'bzip2': ZIP_BZIP2,
+    'lzma': ZIP_LZMA,
+}
+DEFAULT_UPLOAD_LIMIT = 10 * 1024 * 1024
+# Room for the multipart envelope and the message itself.
+UPLOAD_MARGIN = 64 * 1024
+
+
+def upload_limit(guild) -> int:
+    """
+    Returns the effective upload limit of a channel.
+
+    Args:
+        guild: The discord.Guild of the channel, or None for DMs.
+
+    Returns:
+        The maximum number of bytes a single upload may have.
+    """
+    limit = getattr(guild, 'filesize_limit', None) or DEFAULT_UPLOAD_LIMIT
+    return max(limit - UPLOAD_MARGIN, 1)
+
+
+def compress(filename: str, data: bytes, algorithm: str = 'deflate', level: Optional[int] = 9) -> bytes:
+    """
+    Packs a single file into a zip archive.
+
+    Args:
+        filename: Name of the file inside the archive.
+        data: Content of the file.
+        algorithm: 'deflate', 'bzip2' or 'lzma'.
+        level: Compression level. Ignored for lzma.
+
+    Returns:
+        The archive as bytes.
+    """
+    return pack([(filename, data)], algorithm, level)
+
+
+def pack(files: list[tuple[str, bytes]], algorithm: str = 'deflate', level: Optional[int] = 9) -> bytes:
+    """
+    Packs files into a zip archive.
+
+    Args:
+        files: (path inside the archive, content) tuples.
+        algorithm: 'deflate', 'bzip2' or 'lzma'.
+        level: Compression level. Ignored for lzma.
+
+    Returns:
+        The archive as bytes.
+    """
+    compression = ALGORITHMS.get(algorithm, ZIP_DEFLATED)
+    buffer = io.BytesIO()
+    with ZipFile(buffer, mode='w', compression=compression, compresslevel=None if compression == ZIP_LZMA else level, allowZip64=True) as zip_file:
+        for filename, data in files:
+            zip_file.writestr(filename, data)
+    return buffer.getvalue()
+
+
+def prepare(filename: str, data: bytes, limit: int, algorithm: str = 'deflate', level: Optional[int] = 9) -> list[tuple[str, bytes]]:
+    """
+    Decides up front how a result is delivered. Files below the limit are sent as they are,
+    bigger ones compressed, and archives that are still too big are split into numbered parts.
+    Zip files are split without being compressed again.
+    Compression is CPU-bound, so call this in a thread.
+
+    Args:
+        filename: Name of the file.
+        data: Content of the file.
+        limit: Upload limit in bytes.
+        algorithm: Compression algorithm, see compress().
+        level: Compression level, see compress().
+
+    Returns:
+        A list of (filename, data) tuples to upload, in order.
+    """
+    if len(data) <= limit:
+        return [(filename, data)]
+
+    if filename.endswith('.zip'):
+        archive_name, archive = filename, data
+    else:
+        archive_name = f'{os.path.splitext(filename)[0]}.zip'
+        archive = compress(filename, data, algorithm, level)
+        if len(archive) <= limit:
+            return [(archive_name, archive)]
+
+    return [(f'{archive_name}.{index:03d}', archive[offset:offset + limit])
+            for index, offset in enumerate(range(0, len(archive), limit), start=1)]
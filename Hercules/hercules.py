@@ -1,10 +1,25 @@
+import asyncio
+import hashlib
+import limits
+import metrics
 import os
 import shutil
 import subprocess
 import sys
 import tempfile
+import time
+import tracing
 from functools import lru_cache
-from typing import Literal, Optional
+from typing import Callable, Literal, Optional
+from cache import ObfuscationCache, ValidationCache
+from costmodel import CostModel, Estimate
+from limits import ResourceLimitExceeded, ResourceLimits
+from luacheckbatch import LuacheckBatcher
+from luacheckdaemon import DaemonError, LuacheckDaemonPool
+from scratch import ScratchFile
+from workerpool import LuaWorkerPool, NoWorkersError, WorkerError
+
+REVISION_CHECK_INTERVAL = 60
 
 
 class Hercules:
@@ -13,20 +28,62 @@ class Hercules:
     It also validates LUA syntax and manages the LUA interpreter and obfuscator detection.
     """
 
-    def __init__(self, program_logger):
+    def __init__(self, program_logger, worker_pool_size: Optional[int] = None, worker_max_jobs: int = 100,
+                 cache_folder: Optional[str] = None, cache_max_bytes: int = 256 * 1024 * 1024, deterministic_seed: bool = False,
+                 validation_cache_size: int = 1024, validation_cache_ttl: float = 3600, validation_cache_folder: Optional[str] = None,
+                 luacheck_daemon: bool = True, luacheck_batch_folder: Optional[str] = None, luacheck_batch_window: float = 0, luacheck_batch_size: int = 32,
+                 in_memory: bool = True, job_history_file: Optional[str] = None,
+                 resource_limits: Optional[ResourceLimits] = None):
         """
         Initializes the Hercules class with a program logger.
 
         Args:
             program_logger: Logger object to log messages.
+            worker_pool_size: Number of persistent obfuscation workers. None uses the CPU count, 0 disables the pool.
+            worker_max_jobs: Jobs after which a persistent worker is restarted.
+            cache_folder: Folder for cached obfuscation results. None disables the cache.
+            cache_max_bytes: Maximum size of the result cache.
+            deterministic_seed: Seed the obfuscator from the job's cache key, so equal jobs give equal results.
+            validation_cache_size: Number of luacheck results kept in memory. 0 disables the validation cache.
+            validation_cache_ttl: Seconds a cached luacheck result stays valid.
+            validation_cache_folder: Optional folder to persist luacheck results in.
+            luacheck_daemon: Validate through a resident luacheck process instead of one luacheck CLI run per check.
+            luacheck_batch_folder: Folder for batched luacheck runs. Batching is used when the daemon is not running.
+            luacheck_batch_window: Seconds to collect checks into one luacheck run. 0 disables batching.
+            luacheck_batch_size: Number of files that starts a batched luacheck run before the window ends.
+            in_memory: Pass code to the obfuscator through memfd or tmpfs instead of a file in the temp folder.
+            job_history_file: JSONL file to record finished jobs in and train the cost model on. None disables the cost model.
+            resource_limits: Limits for obfuscator processes and workers. None runs them unlimited.
         """
         self._program_logger = program_logger
+        self._worker_pool_size = worker_pool_size
+        self._worker_max_jobs = worker_max_jobs
+        self._worker_pool: Optional[LuaWorkerPool] = None
         self._lua = self._getLuaInterpreter()
         if not self._lua:
             self._log_and_exit("Shutting down due to missing LUA 5.4")
         self._obfuscator_folder, self.obfuscator_file = self._detectObfuscator()
         if not self._obfuscator_folder:
             self._log_and_exit("Shutting down due to missing Obfuscator")
+        self._deterministic_seed = deterministic_seed
+        self._in_memory = in_memory
+        self._limits = resource_limits or ResourceLimits()
+        self._scratch_folder = '/dev/shm' if in_memory and os.access('/dev/shm', os.W_OK) else tempfile.gettempdir()
+        self._result_cache = ObfuscationCache(cache_folder, cache_max_bytes) if cache_folder and cache_max_bytes > 0 else None
+        self._revision = None
+        self._revision_checked = 0.0
+        if self._result_cache:
+            self._refresh_revision()
+        self._luacheck_version = self._getLuacheckVersion()
+        self._validation_cache = ValidationCache(validation_cache_size, validation_cache_ttl, validation_cache_folder) if validation_cache_size > 0 else None
+        self._use_luacheck_daemon = luacheck_daemon
+        self._luacheck_daemon: Optional[LuacheckDaemonPool] = None
+        self._luacheck_batcher = None
+        if luacheck_batch_folder and luacheck_batch_window > 0:
+            self._luacheck_batcher = LuacheckBatcher(luacheck_batch_folder, program_logger,
+                                                     window=luacheck_batch_window,
+                                                     max_batch=luacheck_batch_size,
+                                                     timeout=8)
         self.methods = [
             {
                 'key': 'control_flow',
@@ -120,6 +177,7 @@ class Hercules:
                 'explanation': "Incorporates checks to detect modifications to the code, preventing unauthorized changes."
             },
         ]
+        self.cost_model = CostModel(job_history_file, len(self.methods)) if job_history_file else None
 
     def _log_and_exit(self, msg):
         """
@@ -131,6 +189,63 @@ class Hercules:
         self._program_logger.error(msg)
         sys.exit(1)
 
+    @property
+    def scratch_folder(self) -> str:
+        """
+        Folder the obfuscator's input and output files are kept in when no memfd can be used.
+        """
+        return self._scratch_folder
+
+    async def start_worker_pool(self):
+        """
+        Starts the persistent obfuscation workers. Needs a running event loop.
+        If the workers can't be started, obfuscate_async keeps spawning one process per job.
+        """
+        if self._worker_pool_size == 0 or self._worker_pool:
+            return
+        pool = LuaWorkerPool(self._lua, self._obfuscator_folder, self._program_logger,
+                             size=self._worker_pool_size,
+                             max_jobs=self._worker_max_jobs,
+                             limits=self._limits)
+        try:
+            await pool.start()
+        except (OSError, WorkerError) as e:
+            self._program_logger.error(f"Could not start obfuscation workers, falling back to one process per job: {e}")
+            await pool.stop()
+            return
+        self._worker_pool = pool
+
+    async def stop_worker_pool(self):
+        """
+        Stops the persistent obfuscation workers.
+        """
+        if self._worker_pool:
+            await self._worker_pool.stop()
+            self._worker_pool = None
+
+    async def start_luacheck_daemon(self):
+        """
+        Starts the resident luacheck daemons, one per CPU. Needs a running event loop.
+        If they can't be started, isValidLUASyntax_async keeps running the luacheck CLI.
+        """
+        if not self._use_luacheck_daemon or self._luacheck_daemon:
+            return
+        daemon = LuacheckDaemonPool(self._lua, self._program_logger, timeout=8)
+        try:
+            await daemon.start()
+        except (OSError, DaemonError) as e:
+            self._program_logger.error(f"Could not start luacheck daemon, falling back to the luacheck CLI: {e}")
+            return
+        self._luacheck_daemon = daemon
+
+    async def stop_luacheck_daemon(self):
+        """
+        Stops the resident luacheck daemons.
+        """
+        if self._luacheck_daemon:
+            await self._luacheck_daemon.stop()
+            self._luacheck_daemon = None
+
     def isValidLUASyntax(self, lua_code: str, isFile: bool = False) -> tuple[bool, str]:
         """
         Validates the syntax of the given LUA code.
@@ -142,26 +257,124 @@ class Hercules:
         Returns:
             A tuple containing a boolean indicating if the syntax is valid and the output message.
         """
-        if not isFile:
-            with tempfile.NamedTemporaryFile(suffix=".lua", delete=False, encoding='utf-8', mode='w') as temp_file:
-                temp_file.write(lua_code)
-                temp_file_path = temp_file.name
+        key = self._validation_key(lua_code, isFile)
+        cached = self._validation_cache.get(key) if key else None
+        if cached:
+            return cached
+
+        try:
+            if isFile:
+                result = subprocess.run(['luacheck', lua_code], capture_output=True, text=True, timeout=8)
+            else:
+                with ScratchFile() as temp_file:
+                    self._write_fd(temp_file.fd, lua_code.encode('utf-8'))
+                    result = subprocess.run(['luacheck', temp_file.path], capture_output=True, text=True, timeout=8)
+        except subprocess.TimeoutExpired:
+            return False, "Validation aborted: Process exceeded 8 seconds timeout."
+
+        valid = result.returncode in [0, 1]
+        if key:
+            self._validation_cache.put(key, valid, result.stdout)
+        return valid, result.stdout
+
+    async def isValidLUASyntax_async(self, lua_code: str, isFile: bool = False) -> tuple[bool, str]:
+        """
+        Validates the syntax of the given LUA code without blocking the event loop.
+
+        Args:
+            lua_code: LUA code as a string or file path.
+            isFile: Boolean indicating if lua_code is a file path.
+
+        Returns:
+            A tuple containing a boolean indicating if the syntax is valid and the output message.
+        """
+        if isFile:
+            key = await asyncio.to_thread(self._validation_key, lua_code, isFile)
         else:
-            temp_file_path = lua_code
-
-        try:  
-            result = subprocess.run(['luacheck', temp_file_path], capture_output=True, text=True, timeout=8)  
-        except subprocess.TimeoutExpired:  
-            if not isFile:  
-                os.remove(temp_file_path)  
-            return False, "Validation aborted: Process exceeded 8 seconds timeout."  
-
-        if result.returncode in [0, 1]:  
-            return True, result.stdout  
-        else:  
-            if not isFile:  
-                os.remove(temp_file_path)  
-            return False, result.stdout
+            key = self._validation_key(lua_code, isFile)
+        if key:
+            cached = self._validation_cache.get(key, disk=False) or await asyncio.to_thread(self._validation_cache.get, key)
+            metrics.cache_requests.inc(cache='validation', result='hit' if cached else 'miss')
+            if cached:
+                return cached
+
+        metrics.subprocesses.inc(kind='luacheck')
+        try:
+            with tracing.stage('validation'):
+                isValid, conout = await self._luacheck_async(lua_code, isFile)
+        except asyncio.TimeoutError:
+            metrics.subprocess_failures.inc(kind='luacheck')
+            return False, "Validation aborted: Process exceeded 8 seconds timeout."
+
+        if key:
+            await asyncio.to_thread(self._validation_cache.put, key, isValid, conout)
+        return isValid, conout
+
+    async def _luacheck_async(self, lua_code: str, isFile: bool) -> tuple[bool, str]:
+        """
+        Runs luacheck on the given LUA code, through the daemon if it is running, otherwise through a batched
+        or a single luacheck CLI run.
+
+        Args:
+            lua_code: LUA code as a string or file path.
+            isFile: Boolean indicating if lua_code is a file path.
+
+        Returns:
+            A tuple containing a boolean indicating if the syntax is valid and the output message.
+
+        Raises:
+            asyncio.TimeoutError: If the check exceeded 8 seconds.
+        """
+        if self._luacheck_daemon and self._luacheck_daemon.alive:
+            source = lua_code
+            if isFile:
+                source = await asyncio.to_thread(self._read_text, lua_code)
+            try:
+                return await self._luacheck_daemon.check(source)
+            except DaemonError as e:
+                self._program_logger.warning(f"luacheck daemon failed, using the luacheck CLI: {e}")
+
+        if self._luacheck_batcher:
+            source = lua_code
+            if isFile:
+                source = await asyncio.to_thread(self._read_text, lua_code)
+            try:
+                return await self._luacheck_batcher.check(source)
+            except OSError as e:
+                self._program_logger.warning(f"Batched luacheck run failed, using a single luacheck run: {e}")
+
+        if isFile:
+            returncode, output = await self._run_async(['luacheck', lua_code], timeout=8)
+        else:
+            returncode, output = await self._run_async(['luacheck', '-'], timeout=8, input=lua_code.encode('utf-8', errors='surrogatepass'))
+
+        return returncode in [0, 1], output.decode(errors='replace')
+
+    @staticmethod
+    def _read_text(file_path: str) -> str:
+        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+            return f.read()
+
+    def _validation_key(self, lua_code: str, isFile: bool) -> Optional[str]:
+        """
+        Builds the validation cache key for the given LUA code.
+
+        Args:
+            lua_code: LUA code as a string or file path.
+            isFile: Boolean indicating if lua_code is a file path.
+
+        Returns:
+            The cache key, or None if the validation cache is disabled or the file can't be read.
+        """
+        if not self._validation_cache:
+            return None
+        if not isFile:
+            return ValidationCache.make_key(lua_code.encode('utf-8', errors='surrogatepass'), self._luacheck_version)
+        try:
+            with open(lua_code, 'rb') as f:
+                return ValidationCache.make_key(f.read(), self._luacheck_version)
+        except OSError:
+            return None
 
     def obfuscate(self, file_path: str, bitkey: int, optional_preset: Optional[Literal["min", "mid", "max"]]) -> tuple[bool, str]:
         """
@@ -174,37 +387,373 @@ class Hercules:
 
         Returns:
             A tuple containing a boolean indicating if the obfuscation was successful and the output message.
-        """
-        old_wd = os.getcwd()
-        os.chdir(self._obfuscator_folder)
-        enabled_features = self._get_active_keys(bitkey)
 
-        flags = [f"--{feature}" for feature in enabled_features]
-        if optional_preset:
-            flags.append(f"--{optional_preset}")
-        self._program_logger.info(f"Obfuscating file: {file_path} with flags: {flags}")
+        Raises:
+            ResourceLimitExceeded: If the obfuscator was killed for breaching its resource limits.
+        """
+        key, cached = self._cache_lookup(file_path, bitkey, optional_preset)
+        if cached is not None:
+            return True, cached
+        seed = ObfuscationCache.seed_for(key) if key and self._deterministic_seed else None
+        command = self._lua_command(seed) + self._build_obfuscate_args(file_path, bitkey, optional_preset)
 
-        try:
-            result = subprocess.run([self._lua, "hercules.lua", file_path] + flags + ["--overwrite"],
-                                    check=True,
-                                    stdout=subprocess.PIPE,
-                                    stderr=subprocess.STDOUT)
-        except subprocess.CalledProcessError as e:
-            self._program_logger.error(f"Error occurred: {e.output.decode()}\nFile: {file_path}")
-            return False, e.output.decode()
-        finally:
-            os.chdir(old_wd)
-
-        if result.returncode != 0:
-            return False, result.stdout.decode()
+        returncode, output = limits.run_sync(command, self._limits, cwd=self._obfuscator_folder)
+        if returncode != 0:
+            self._program_logger.error(f"Error occurred: {output.decode(errors='replace')}\nFile: {file_path}")
+            return False, output.decode(errors='replace')
         else:
             isValid, conout = self.isValidLUASyntax(file_path, True)
             if isValid:
+                self._cache_store(key, file_path, conout)
                 return True, conout
             else:
                 self._program_logger.error(f"Obfuscation failed. Invalid LUA syntax in file: {file_path}")
                 return False, conout
 
+    async def obfuscate_async(self, file_path: str, bitkey: int, optional_preset: Optional[Literal["min", "mid", "max"]]) -> tuple[bool, str]:
+        """
+        Obfuscates the given LUA file like obfuscate, but without blocking the event loop.
+        The file is overwritten with the result, see obfuscate_code_async.
+
+        Args:
+            file_path: Path to the LUA file to be obfuscated.
+            bitkey: Bitkey representing the obfuscation methods to use.
+            optional_preset: Optional preset for obfuscation level ("min", "mid", "max").
+
+        Returns:
+            A tuple containing a boolean indicating if the obfuscation was successful and the output message.
+
+        Raises:
+            ResourceLimitExceeded: If the obfuscator was killed for breaching its resource limits.
+        """
+        source = await asyncio.to_thread(self._read_text, file_path)
+        success, conout, output = await self.obfuscate_code_async(source, bitkey, optional_preset)
+        if output is not None:
+            await asyncio.to_thread(self._write_bytes, file_path, output)
+        return success, conout
+
+    async def obfuscate_code_async(self, lua_code: str, bitkey: int, optional_preset: Optional[Literal["min", "mid", "max"]]) -> tuple[bool, str, Optional[bytes]]:
+        """
+        Obfuscates the given LUA code without blocking the event loop and validates the result.
+        The job runs on a persistent worker if the pool is running, otherwise in its own asyncio subprocess
+        with the obfuscator folder as cwd, so concurrent jobs never touch the process-wide working directory.
+        In memory mode the code is handed to the obfuscator through an anonymous memfd (or a tmpfs file for
+        the worker pool) and the result is validated through luacheck's stdin.
+
+        Args:
+            lua_code: LUA code as a string.
+            bitkey: Bitkey representing the obfuscation methods to use.
+            optional_preset: Optional preset for obfuscation level ("min", "mid", "max").
+
+        Returns:
+            A tuple containing a boolean indicating if the obfuscation was successful, the output message and
+            the obfuscated code. The code is None if the obfuscator itself failed.
+
+        Raises:
+            ResourceLimitExceeded: If the obfuscator was killed for breaching its resource limits.
+        """
+        source = lua_code.encode('utf-8', errors='surrogatepass')
+        metrics.input_bytes.observe(len(source))
+        if self._result_cache and time.monotonic() - self._revision_checked > REVISION_CHECK_INTERVAL:
+            await asyncio.to_thread(self._refresh_revision)
+        key = self._cache_key(source, bitkey, optional_preset)
+        if key:
+            cached = await asyncio.to_thread(self._result_cache.get, key)
+            metrics.cache_requests.inc(cache='obfuscation', result='hit' if cached is not None else 'miss')
+            if cached is not None:
+                self._program_logger.info("Obfuscation cache hit.")
+                output, conout = cached
+                return True, conout, output
+        seed = ObfuscationCache.seed_for(key) if key and self._deterministic_seed else None
+
+        metrics.subprocesses.inc(kind='obfuscator')
+        start = time.perf_counter()
+
+        def __started():
+            nonlocal start
+            start = time.perf_counter()
+
+        try:
+            with tracing.stage('obfuscation'):
+                returncode, conout, output = await self._run_obfuscator(source, bitkey, optional_preset, seed, __started)
+        except ResourceLimitExceeded as e:
+            metrics.subprocess_failures.inc(kind='obfuscator')
+            metrics.resource_limit_breaches.inc(limit=e.limit)
+            self._program_logger.warning(f"Obfuscator stopped: {e}")
+            # Killed jobs are the most expensive ones, the model has to learn about them too.
+            elapsed = time.perf_counter() - start
+            if e.limit == 'wall time' and self._limits.wall_seconds:
+                elapsed = max(elapsed, self._limits.wall_seconds)
+            elif e.limit == 'CPU time' and self._limits.cpu_seconds:
+                elapsed = max(elapsed, self._limits.cpu_seconds)
+            if self.cost_model:
+                await asyncio.to_thread(self.cost_model.record, source, bitkey, optional_preset, elapsed, None)
+            raise
+        elapsed = time.perf_counter() - start
+        if returncode != 0:
+            metrics.subprocess_failures.inc(kind='obfuscator')
+            self._program_logger.error(f"Error occurred: {conout}")
+            if self.cost_model:
+                await asyncio.to_thread(self.cost_model.record, source, bitkey, optional_preset, elapsed, None)
+            return False, conout, None
+        metrics.output_bytes.observe(len(output))
+        if self.cost_model:
+            await asyncio.to_thread(self.cost_model.record, source, bitkey, optional_preset, elapsed, len(output))
+
+        with tracing.span('revalidate'):
+            isValid, conout = await self.isValidLUASyntax_async(output.decode('utf-8', errors='replace'))
+        if isValid:
+            if key:
+                await asyncio.to_thread(self._result_cache.put, key, output, conout)
+            return True, conout, output
+        else:
+            self._program_logger.error("Obfuscation failed. Invalid LUA syntax in obfuscated code.")
+            return False, conout, output
+
+    async def estimate_async(self, lua_code: str, bitkey: int, optional_preset: Optional[Literal["min", "mid", "max"]]) -> Optional[Estimate]:
+        """
+        Estimates the obfuscation time and output size of a job with the cost model.
+
+        Args:
+            lua_code: LUA code as a string.
+            bitkey: Bitkey representing the obfuscation methods to use.
+            optional_preset: Optional preset for obfuscation level ("min", "mid", "max").
+
+        Returns:
+            The estimate, or None if the cost model is disabled or has not seen enough jobs yet.
+        """
+        if not self.cost_model or not self.cost_model.trained:
+            return None
+        source = lua_code.encode('utf-8', errors='surrogatepass')
+        return await asyncio.to_thread(self.cost_model.predict, source, bitkey, optional_preset)
+
+    async def _run_obfuscator(self, source: bytes, bitkey: int, optional_preset: Optional[str], seed: Optional[int],
+                              on_start: Optional[Callable[[], None]] = None) -> tuple[int, str, bytes]:
+        """
+        Runs the obfuscator on the given source.
+
+        Args:
+            source: LUA code as bytes.
+            bitkey: Bitkey representing the obfuscation methods to use.
+            optional_preset: Optional preset for obfuscation level ("min", "mid", "max").
+            seed: Optional seed for math.randomseed.
+            on_start: Called when the job got a worker of the pool, so the time waiting for one can be left out.
+
+        Returns:
+            A tuple containing the return code, the console output and the obfuscated code.
+
+        Raises:
+            ResourceLimitExceeded: If the obfuscator was killed for breaching its resource limits.
+        """
+        use_pool = self._worker_pool and self._worker_pool.available
+        if self._in_memory and not use_pool and hasattr(os, 'memfd_create'):
+            fd = os.memfd_create('hercules-job')
+            try:
+                await asyncio.to_thread(self._write_fd, fd, source)
+                args = self._build_obfuscate_args(f'/proc/self/fd/{fd}', bitkey, optional_preset)
+                returncode, console = await self._run_async(self._lua_command(seed) + args, cwd=self._obfuscator_folder, pass_fds=(fd,),
+                                                            resource_limits=self._limits)
+                output = await asyncio.to_thread(self._read_fd, fd)
+            finally:
+                os.close(fd)
+            return returncode, console.decode(errors='replace'), output
+
+        with ScratchFile(self._scratch_folder) as scratch_file:
+            await asyncio.to_thread(self._write_fd, scratch_file.fd, source)
+            args = self._build_obfuscate_args(scratch_file.path, bitkey, optional_preset)
+            if use_pool:
+                try:
+                    returncode, console = await self._worker_pool.run(args, seed, on_start)
+                except NoWorkersError as e:
+                    self._program_logger.warning(f"{e}, running the obfuscator in its own process.")
+                    if on_start:
+                        on_start()
+                    returncode, console = await self._run_async(self._lua_command(seed) + args, cwd=self._obfuscator_folder,
+                                                                resource_limits=self._limits)
+                except WorkerError as e:
+                    returncode, console = 1, str(e).encode()
+            else:
+                returncode, console = await self._run_async(self._lua_command(seed) + args, cwd=self._obfuscator_folder,
+                                                            resource_limits=self._limits)
+            output = await asyncio.to_thread(self._read_bytes, scratch_file.path)
+        return returncode, console.decode(errors='replace'), output
+
+    @staticmethod
+    def _write_fd(fd: int, data: bytes):
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+
+    @staticmethod
+    def _read_fd(fd: int) -> bytes:
+        os.lseek(fd, 0, os.SEEK_SET)
+        chunks = []
+        while chunk := os.read(fd, 1024 * 1024):
+            chunks.append(chunk)
+        return b''.join(chunks)
+
+    @staticmethod
+    def _read_bytes(file_path: str) -> bytes:
+        with open(file_path, 'rb') as f:
+            return f.read()
+
+    @staticmethod
+    def _write_bytes(file_path: str, data: bytes):
+        with open(file_path, 'wb') as f:
+            f.write(data)
+
+    def _cache_key(self, source: bytes, bitkey: int, optional_preset: Optional[str]) -> Optional[str]:
+        """
+        Builds the result cache key of a job for the last known obfuscator revision.
+
+        Args:
+            source: LUA code as bytes.
+            bitkey: Bitkey representing the obfuscation methods to use.
+            optional_preset: Optional preset for obfuscation level ("min", "mid", "max").
+
+        Returns:
+            The cache key, or None if the result cache is disabled.
+        """
+        if not self._result_cache:
+            return None
+        return ObfuscationCache.make_key(source, bitkey, optional_preset, self._revision)
+
+    def _cache_lookup(self, file_path: str, bitkey: int, optional_preset: Optional[str]) -> tuple[Optional[str], Optional[str]]:
+        """
+        Looks up a job in the result cache. On a hit the cached result is written to file_path.
+
+        Args:
+            file_path: Path to the LUA file to be obfuscated.
+            bitkey: Bitkey representing the obfuscation methods to use.
+            optional_preset: Optional preset for obfuscation level ("min", "mid", "max").
+
+        Returns:
+            A tuple of the cache key and the cached validation output. Both are None if the cache is disabled,
+            the output is None on a miss.
+        """
+        if not self._result_cache:
+            return None, None
+        if time.monotonic() - self._revision_checked > REVISION_CHECK_INTERVAL:
+            self._refresh_revision()
+        with open(file_path, 'rb') as f:
+            key = self._cache_key(f.read(), bitkey, optional_preset)
+        cached = self._result_cache.get(key)
+        if not cached:
+            return key, None
+        output, conout = cached
+        with open(file_path, 'wb') as f:
+            f.write(output)
+        self._program_logger.info(f"Obfuscation cache hit for file: {file_path}")
+        return key, conout
+
+    def _cache_store(self, key: Optional[str], file_path: str, conout: str):
+        """
+        Stores the obfuscated file in the result cache.
+
+        Args:
+            key: The cache key returned by _cache_lookup.
+            file_path: Path to the obfuscated LUA file.
+            conout: The validation output of the obfuscated file.
+        """
+        if not key:
+            return
+        with open(file_path, 'rb') as f:
+            self._result_cache.put(key, f.read(), conout)
+
+    def _refresh_revision(self):
+        """
+        Fingerprints the obfuscator checkout again and drops result cache entries of other revisions.
+        Called at startup and then at most every REVISION_CHECK_INTERVAL seconds, as it walks the whole checkout.
+        """
+        self._revision = self._obfuscator_revision()
+        self._revision_checked = time.monotonic()
+        self._result_cache.set_revision(self._revision)
+
+    def _obfuscator_revision(self) -> str:
+        """
+        Fingerprints the obfuscator checkout from its git HEAD and the size and modification time of its LUA files.
+
+        Returns:
+            The revision as a hex string.
+        """
+        digest = hashlib.sha256()
+        git_folder = os.path.join(os.path.dirname(self._obfuscator_folder), '.git')
+        try:
+            with open(os.path.join(git_folder, 'HEAD'), 'r') as f:
+                head = f.read().strip()
+            if head.startswith('ref: ') and os.path.exists(os.path.join(git_folder, head[5:])):
+                with open(os.path.join(git_folder, head[5:]), 'r') as f:
+                    head = f.read().strip()
+            digest.update(head.encode())
+        except OSError:
+            pass
+
+        files = []
+        for root, _, names in os.walk(self._obfuscator_folder):
+            files.extend(os.path.join(root, name) for name in names if name.endswith('.lua'))
+        for path in sorted(files):
+            stat = os.stat(path)
+            digest.update(f"{os.path.relpath(path, self._obfuscator_folder)}:{stat.st_size}:{stat.st_mtime_ns}\0".encode())
+        return digest.hexdigest()[:16]
+
+    def _lua_command(self, seed: Optional[int] = None) -> list[str]:
+        """
+        Builds the interpreter part of the obfuscator command line.
+
+        Args:
+            seed: Optional seed for math.randomseed. Later calls to math.randomseed by the obfuscator are ignored.
+
+        Returns:
+            The command as a list of arguments.
+        """
+        if seed is None:
+            return [self._lua, "hercules.lua"]
+        return [self._lua, "-e", f"math.randomseed({seed}) math.randomseed = function() end", "hercules.lua"]
+
+    def _build_obfuscate_args(self, file_path: str, bitkey: int, optional_preset: Optional[str]) -> list[str]:
+        """
+        Builds the arguments passed to hercules.lua to obfuscate a file.
+
+        Args:
+            file_path: Path to the LUA file to be obfuscated.
+            bitkey: Bitkey representing the obfuscation methods to use.
+            optional_preset: Optional preset for obfuscation level ("min", "mid", "max").
+
+        Returns:
+            The arguments as a list.
+        """
+        enabled_features = self._get_active_keys(bitkey)
+
+        flags = [f"--{feature}" for feature in enabled_features]
+        if optional_preset:
+            flags.append(f"--{optional_preset}")
+        self._program_logger.info(f"Obfuscating file: {file_path} with flags: {flags}")
+
+        return [file_path] + flags + ["--overwrite"]
+
+    async def _run_async(self, command: list[str], cwd: Optional[str] = None, timeout: Optional[float] = None,
+                         input: Optional[bytes] = None, pass_fds: tuple[int, ...] = (),
+                         resource_limits: Optional[ResourceLimits] = None) -> tuple[int, bytes]:
+        """
+        Runs a command as an asyncio subprocess in its own session and collects the tail of its combined output.
+
+        Args:
+            command: The command as a list of arguments.
+            cwd: Working directory for the child process.
+            timeout: Optional timeout in seconds. The child's process group is killed when it is exceeded.
+            input: Optional data written to the child's stdin.
+            pass_fds: File descriptors the child inherits.
+            resource_limits: Optional resource limits for the child.
+
+        Returns:
+            A tuple containing the return code and the combined stdout/stderr output.
+
+        Raises:
+            asyncio.TimeoutError: If the timeout was exceeded.
+            ResourceLimitExceeded: If the child breached one of its resource limits.
+        """
+        return await limits.run(command, resource_limits, cwd=cwd, timeout=timeout, input=input, pass_fds=pass_fds)
+
     @lru_cache(maxsize=None)
     def find_method(self, method_name):
         """
@@ -252,6 +801,19 @@ class Hercules:
                 return lua_version
         return None
 
+    def _getLuacheckVersion(self) -> str:
+        """
+        Detects the luacheck version.
+
+        Returns:
+            The version output of luacheck, or "unknown" if it can't be determined.
+        """
+        try:
+            result = subprocess.run(['luacheck', '--version'], capture_output=True, text=True, timeout=8)
+        except (OSError, subprocess.TimeoutExpired):
+            return "unknown"
+        return result.stdout.strip() or "unknown"
+
     def _detectObfuscator(self):
         """
         Detects the obfuscator folder and file.
@@ -262,3 +824,39 @@ class Hercules:
         folder = os.path.abspath(os.path.join(os.path.dirname(__file__), 'Obfuscator', 'src')).replace('\\', '/')
         file = os.path.join(folder, 'hercules.lua').replace('\\', '/')
         return (folder, file) if os.path.exists(file) else (None, None)
+
+
+def from_env(program_logger, cache_folder: str) -> Hercules:
+    """
+    Creates a Hercules instance from the pipeline settings in the environment.
+    The bot and the queue workers both use it, so they always run the pipeline with the same configuration.
+
+    Args:
+        program_logger: Logger object to log messages.
+        cache_folder: Folder the result, validation and luacheck caches and the job history are kept in.
+
+    Returns:
+        The configured Hercules instance.
+    """
+    return Hercules(program_logger,
+                    worker_pool_size=int(os.getenv('WORKER_POOL_SIZE')) if os.getenv('WORKER_POOL_SIZE') else None,
+                    worker_max_jobs=int(os.getenv('WORKER_MAX_JOBS', '100')),
+                    cache_folder=f'{cache_folder}Obfuscation',
+                    cache_max_bytes=int(os.getenv('RESULT_CACHE_SIZE_MB', '256')) * 1024 * 1024,
+                    deterministic_seed=os.getenv('DETERMINISTIC_SEED', 'False').lower() == 'true',
+                    validation_cache_size=int(os.getenv('VALIDATION_CACHE_SIZE', '1024')),
+                    validation_cache_ttl=int(os.getenv('VALIDATION_CACHE_TTL', '3600')),
+                    validation_cache_folder=f'{cache_folder}Validation' if os.getenv('VALIDATION_CACHE_ON_DISK', 'False').lower() == 'true' else None,
+                    luacheck_daemon=os.getenv('LUACHECK_DAEMON', 'True').lower() == 'true',
+                    luacheck_batch_folder=f'{cache_folder}Luacheck',
+                    luacheck_batch_window=int(os.getenv('LUACHECK_BATCH_WINDOW_MS', '10')) / 1000,
+                    luacheck_batch_size=int(os.getenv('LUACHECK_BATCH_SIZE', '32')),
+                    in_memory=os.getenv('IN_MEMORY_PIPELINE', 'True').lower() == 'true',
+                    job_history_file=f'{cache_folder}job_history.jsonl' if os.getenv('COST_MODEL', 'True').lower() == 'true' else None,
+                    resource_limits=ResourceLimits(wall_seconds=float(os.getenv('OBFUSCATOR_WALL_SECONDS', '600')) or None,
+                                                   cpu_seconds=int(os.getenv('OBFUSCATOR_CPU_SECONDS', '600')) or None,
+                                                   memory_bytes=int(os.getenv('OBFUSCATOR_MEMORY_MB', '2048')) * 1024 * 1024 or None,
+                                                   file_bytes=int(os.getenv('OBFUSCATOR_FILE_MB', '256')) * 1024 * 1024 or None,
+                                                   output_bytes=int(os.getenv('OBFUSCATOR_OUTPUT_KB', '1024')) * 1024
+                                                   )
+                    )
@@ -0,0 +1,168 @@
+import aiohttp
+import metrics
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+
+class DownloadTooLarge(Exception):
+    """
+    Raised when a response body exceeds the download limit.
+    """
+
+
+class UrlCache:
+    """
+    Bounded in-memory LRU of downloaded bodies with their validators (ETag, Last-Modified).
+    Only responses with at least one validator are stored, as others can't be revalidated.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        """
+        Initializes the cache.
+
+        Args:
+            max_bytes: Maximum total size of all stored bodies.
+        """
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[bytes, Optional[str], Optional[str], Optional[str]]] = OrderedDict()
+        self._size = 0
+
+    def get(self, url: str) -> Optional[tuple[bytes, Optional[str], Optional[str], Optional[str]]]:
+        """
+        Looks up a URL and marks it as recently used.
+
+        Args:
+            url: The URL.
+
+        Returns:
+            A tuple of the body, the charset, the ETag and the Last-Modified header, or None on a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry:
+                self._entries.move_to_end(url)
+            return entry
+
+    def put(self, url: str, body: bytes, charset: Optional[str], etag: Optional[str], last_modified: Optional[str]):
+        """
+        Stores a response and evicts the least recently used entries if the cache is too big.
+
+        Args:
+            url: The URL.
+            body: The response body.
+            charset: The charset announced by the server.
+            etag: The ETag header.
+            last_modified: The Last-Modified header.
+        """
+        with self._lock:
+            self._remove(url)
+            if not (etag or last_modified) or len(body) > self.max_bytes:
+                return
+            self._entries[url] = (body, charset, etag, last_modified)
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, url: str):
+        entry = self._entries.pop(url, None)
+        if entry:
+            self._size -= len(entry[0])
+
+
+class HttpClient:
+    """
+    Application-wide HTTP client. A single aiohttp session is shared by all downloads, so connections,
+    keep-alive and resolved DNS entries are reused between requests.
+    Bodies are streamed and aborted as soon as they exceed the limit, whether or not the server sends Content-Length.
+    With a UrlCache, known URLs are revalidated with a conditional GET and a 304 is served from the cache.
+    """
+
+    def __init__(self, max_bytes: int = 5 * 1024 * 1024, connect_timeout: float = 5, read_timeout: float = 15,
+                 pool_size: int = 100, dns_cache_ttl: int = 300, keepalive_timeout: float = 30, cache: Optional[UrlCache] = None):
+        """
+        Initializes the client. The session is created by start() or on the first request.
+
+        Args:
+            max_bytes: Default maximum size of a response body.
+            connect_timeout: Seconds to wait for a connection.
+            read_timeout: Seconds to wait for data on an open connection.
+            pool_size: Maximum number of open connections.
+            dns_cache_ttl: Seconds resolved host names are cached.
+            keepalive_timeout: Seconds idle connections are kept open.
+            cache: Optional cache for conditional GETs.
+        """
+        self.max_bytes = max_bytes
+        self._timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self._pool_size = pool_size
+        self._dns_cache_ttl = dns_cache_ttl
+        self._keepalive_timeout = keepalive_timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._cache = cache
+
+    async def start(self):
+        """
+        Creates the shared session.
+        """
+        if self._session and not self._session.closed:
+            return
+        connector = aiohttp.TCPConnector(limit=self._pool_size,
+                                         ttl_dns_cache=self._dns_cache_ttl,
+                                         keepalive_timeout=self._keepalive_timeout)
+        self._session = aiohttp.ClientSession(connector=connector, timeout=self._timeout)
+
+    async def stop(self):
+        """
+        Closes the shared session and all pooled connections.
+        """
+        if self._session:
+            await self._session.close()
+            self._session = None
+
+    async def fetch(self, url: str, max_bytes: Optional[int] = None) -> tuple[int, bytes, Optional[str]]:
+        """
+        Downloads a URL with a single GET request.
+
+        Args:
+            url: The URL to download.
+            max_bytes: Maximum size of the body. Defaults to the client's limit.
+
+        Returns:
+            A tuple of the HTTP status, the body and the charset announced by the server.
+
+        Raises:
+            DownloadTooLarge: If the body exceeds the limit.
+            aiohttp.ClientError: If the request failed.
+            asyncio.TimeoutError: If connecting or reading timed out.
+        """
+        await self.start()
+        limit = max_bytes or self.max_bytes
+        cached = self._cache.get(url) if self._cache else None
+        headers = {}
+        if cached:
+            _, _, etag, last_modified = cached
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+
+        async with self._session.get(url, headers=headers) as response:
+            if cached:
+                metrics.cache_requests.inc(cache='url', result='hit' if response.status == 304 else 'miss')
+            if response.status == 304 and cached:
+                body, charset, _, _ = cached
+                if len(body) > limit:
+                    raise DownloadTooLarge(f"Response exceeds the limit of {limit} bytes.")
+                return 200, body, charset
+            if response.content_length is not None and response.content_length > limit:
+                raise DownloadTooLarge(f"Response has {response.content_length} bytes, the limit is {limit}.")
+            body = bytearray()
+            async for chunk in response.content.iter_chunked(64 * 1024):
+                body += chunk
+                if len(body) > limit:
+                    raise DownloadTooLarge(f"Response exceeds the limit of {limit} bytes.")
+            body = bytes(body)
+            if self._cache and response.status == 200:
+                self._cache.put(url, body, response.charset, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+            return response.status, body, response.charset
@@ -0,0 +1,92 @@
+import asyncio
+import codecs
+import tracing
+from typing import Optional
+
+BOMS = [
+    (codecs.BOM_UTF32_LE, 'utf-32-le'),
+    (codecs.BOM_UTF32_BE, 'utf-32-be'),
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+]
+FALLBACK_ENCODINGS = ['utf-8', 'cp1252', 'latin-1']
+CHUNK_SIZE = 1024 * 1024
+
+
+def detect_bom(raw: bytes) -> tuple[Optional[str], int]:
+    """
+    Detects a byte order mark. UTF-32 is checked before UTF-16, as the UTF-32-LE BOM starts with the UTF-16-LE one.
+
+    Args:
+        raw: The raw bytes, at least the first four.
+
+    Returns:
+        A tuple of the encoding and the length of the BOM, or (None, 0) if there is none.
+    """
+    for bom, encoding in BOMS:
+        if raw.startswith(bom):
+            return encoding, len(bom)
+    return None, 0
+
+
+def _decode(raw: bytes, encoding: str, start: int = 0) -> str:
+    """
+    Decodes strictly. Large inputs are decoded chunk by chunk with an incremental decoder,
+    so a failing encoding is rejected without first copying the whole input.
+
+    Raises:
+        UnicodeDecodeError: If the input is not valid in the encoding.
+    """
+    if len(raw) - start <= CHUNK_SIZE:
+        return raw[start:].decode(encoding)
+    decoder = codecs.getincrementaldecoder(encoding)()
+    view = memoryview(raw)
+    parts = []
+    for offset in range(start, len(raw), CHUNK_SIZE):
+        parts.append(decoder.decode(view[offset:offset + CHUNK_SIZE], final=offset + CHUNK_SIZE >= len(raw)))
+    return ''.join(parts)
+
+
+def decode_source(raw: bytes, encoding: Optional[str] = None) -> str:
+    """
+    Decodes uploaded or downloaded LUA code in a single pass over memory.
+    A BOM wins, then the given encoding, then UTF-8, CP1252 and Latin-1. If all fail, UTF-8 is decoded with replacement characters.
+
+    Args:
+        raw: The raw bytes.
+        encoding: Optional encoding announced by the source, e.g. an HTTP charset.
+
+    Returns:
+        The code as a string without BOM.
+    """
+    bom_encoding, bom_length = detect_bom(raw[:4])
+    if bom_encoding:
+        return _decode(raw, bom_encoding, bom_length)
+
+    candidates = [encoding] if encoding else []
+    candidates += [e for e in FALLBACK_ENCODINGS if e != encoding]
+    for candidate in candidates:
+        try:
+            return _decode(raw, candidate)
+        except (LookupError, UnicodeDecodeError):
+            continue
+    return raw.decode('utf-8', errors='replace')
+
+
+async def read_attachment(attachment) -> str:
+    """
+    Reads a Discord attachment once and decodes it. Large attachments are decoded in a thread.
+
+    Args:
+        attachment: The discord.Attachment.
+
+    Returns:
+        The code as a string.
+    """
+    with tracing.stage('download'):
+        raw = await attachment.read()
+    with tracing.stage('decode'):
+        if len(raw) > CHUNK_SIZE:
+            return await asyncio.to_thread(decode_source, raw)
+        return decode_source(raw)
@@ -0,0 +1,266 @@
+import asyncio
+import hmac
+import ingest
+import secrets
+import time
+import tracing
+from aiohttp import web
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+PRESETS = ['min', 'mid', 'max']
+STREAM_CHUNK_SIZE = 64 * 1024
+
+Pipeline = Callable[[Optional[str], Optional[str], int, Optional[str], Callable[[], None]], Awaitable[tuple[bool, str, Optional[bytes]]]]
+
+
+class Job:
+    """
+    An obfuscation job submitted through the API.
+    """
+
+    def __init__(self, bitkey: int, preset: Optional[str]):
+        self.id = secrets.token_urlsafe(16)
+        self.bitkey = bitkey
+        self.preset = preset
+        self.status = 'queued'
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.error: Optional[str] = None
+        self.output: Optional[bytes] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ('done', 'failed')
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'status': self.status,
+            'bitkey': self.bitkey,
+            'preset': self.preset,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'error': self.error,
+            'output_bytes': len(self.output) if self.output is not None else None,
+        }
+
+
+class JobStore:
+    """
+    Keeps API jobs and their results in memory. Finished jobs are dropped after a while, oldest first
+    when there are too many or their results take up too much memory.
+    """
+
+    def __init__(self, max_jobs: int = 1000, ttl: float = 3600, max_result_bytes: int = 256 * 1024 * 1024):
+        """
+        Args:
+            max_jobs: Number of jobs kept.
+            ttl: Seconds a finished job is kept.
+            max_result_bytes: Total size of the results kept.
+        """
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self.max_result_bytes = max_result_bytes
+        self._jobs: OrderedDict[str, Job] = OrderedDict()
+
+    @property
+    def pending(self) -> int:
+        return sum(1 for job in self._jobs.values() if not job.done)
+
+    def add(self, job: Job):
+        self._jobs[job.id] = job
+        self.prune()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def prune(self):
+        """
+        Drops expired finished jobs, then the oldest finished ones until the limits are met.
+        """
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job.done and now - job.finished > self.ttl:
+                del self._jobs[job_id]
+        result_bytes = sum(len(job.output) for job in self._jobs.values() if job.output)
+        for job_id, job in list(self._jobs.items()):
+            if len(self._jobs) <= self.max_jobs and result_bytes <= self.max_result_bytes:
+                break
+            if job.done:
+                result_bytes -= len(job.output) if job.output else 0
+                del self._jobs[job_id]
+
+
+class JobApi:
+    """
+    Authenticated HTTP API to run obfuscation jobs without Discord.
+
+        POST /jobs                 {"source": "...", "bitkey": 4103, "preset": "max"} or {"url": "...", "methods": ["control_flow"]}
+                                   or the raw code with ?bitkey=...&preset=... -> 202 {"id": ..., "status": "queued"}
+        GET  /jobs/{id}            -> status of the job
+        GET  /jobs/{id}/result     -> the obfuscated code, streamed
+
+    Every request needs an "Authorization: Bearer <token>" header.
+    """
+
+    def __init__(self, program_logger, token: str, pipeline: Pipeline, methods: list[dict], max_source_bytes: int = 5 * 1024 * 1024,
+                 max_pending: int = 50, store: Optional[JobStore] = None):
+        """
+        Args:
+            program_logger: Logger object to log messages.
+            token: The bearer token clients have to send.
+            pipeline: Runs a job: called with the source, the URL, the bitkey, the preset and a callback to call
+                once the job leaves the queue, returns the success, the console output and the obfuscated code.
+            methods: Hercules.methods, for method keys and the default bitkey.
+            max_source_bytes: Largest accepted source.
+            max_pending: Jobs queued or running at once, further submissions get 429.
+            store: Where jobs are kept.
+        """
+        self._program_logger = program_logger
+        self._token = token.encode()
+        self._pipeline = pipeline
+        self._methods = {method['key']: method['bitkey'] for method in methods}
+        self._default_bitkey = sum(1 << method['bitkey'] for method in methods if method['enabled'])
+        self.max_source_bytes = max_source_bytes
+        self.max_pending = max_pending
+        self.store = store or JobStore()
+        self._tasks: set[asyncio.Task] = set()
+
+    def register(self, app: web.Application):
+        """
+        Adds the routes to an aiohttp application.
+        """
+        app.router.add_post('/jobs', self._submit)
+        app.router.add_get('/jobs/{id}', self._status)
+        app.router.add_get('/jobs/{id}/result', self._result)
+
+    def _authorized(self, request: web.Request) -> bool:
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        return scheme.lower() == 'bearer' and hmac.compare_digest(token.strip().encode(), self._token)
+
+    @staticmethod
+    def _error(status: int, message: str) -> web.Response:
+        return web.json_response({'error': message}, status=status)
+
+    def _parse_bitkey(self, bitkey, methods) -> int:
+        """
+        Raises:
+            ValueError: If the bitkey or a method key is invalid.
+        """
+        if bitkey is not None:
+            bitkey = int(bitkey)
+            if not 0 <= bitkey < 1 << len(self._methods):
+                raise ValueError(f"bitkey must be between 0 and {(1 << len(self._methods)) - 1}")
+            return bitkey
+        if methods is None:
+            return self._default_bitkey
+        if isinstance(methods, str):
+            methods = methods.split(',')
+        result = 0
+        for key in methods:
+            if key not in self._methods:
+                raise ValueError(f"Unknown method '{key}'. Known methods: {', '.join(self._methods)}")
+            result |= 1 << self._methods[key]
+        return result
+
+    async def _submit(self, request: web.Request) -> web.Response:
+        if not self._authorized(request):
+            return self._error(401, "Unauthorized")
+        if self.store.pending >= self.max_pending:
+            return self._error(429, "Too many pending jobs")
+        if request.content_length and request.content_length > self.max_source_bytes * 2:
+            return self._error(413, "Request too large")
+
+        try:
+            if request.content_type == 'application/json':
+                body = await request.json()
+                if not isinstance(body, dict):
+                    raise ValueError("Expected a JSON object")
+                source, url = body.get('source'), body.get('url')
+                bitkey = self._parse_bitkey(body.get('bitkey'), body.get('methods'))
+                preset = body.get('preset')
+            else:
+                raw = await request.read()
+                source, url = ingest.decode_source(raw, request.charset), None
+                bitkey = self._parse_bitkey(request.query.get('bitkey'), request.query.get('methods'))
+                preset = request.query.get('preset')
+        except (ValueError, TypeError) as e:
+            return self._error(400, str(e))
+
+        if (source is None) == (url is None):
+            return self._error(400, "Send either source or url")
+        if source is not None and (not isinstance(source, str) or len(source.encode('utf-8', errors='surrogatepass')) > self.max_source_bytes):
+            return self._error(413 if isinstance(source, str) else 400, f"source must be a string of at most {self.max_source_bytes} bytes")
+        if url is not None and not isinstance(url, str):
+            return self._error(400, "url must be a string")
+        if preset is not None and preset not in PRESETS:
+            return self._error(400, f"preset must be one of {', '.join(PRESETS)}")
+        if bitkey == 0 and preset is None:
+            return self._error(400, "Select at least one method or a preset")
+
+        job = Job(bitkey, preset)
+        self.store.add(job)
+        task = asyncio.create_task(self._run(job, source, url))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.json_response(job.to_dict(), status=202, headers={'Location': f'/jobs/{job.id}'})
+
+    @tracing.job('api_job')
+    async def _run(self, job: Job, source: Optional[str], url: Optional[str]):
+        def __started():
+            job.status = 'running'
+            job.started = time.time()
+
+        try:
+            success, conout, output = await self._pipeline(source, url, job.bitkey, job.preset, __started)
+        except Exception as e:
+            self._program_logger.warning(f"API job {job.id} failed: {e}")
+            success, conout, output = False, str(e), None
+        job.finished = time.time()
+        if success:
+            job.status, job.output = 'done', output
+        else:
+            tracing.mark_failed()
+            job.status, job.error = 'failed', conout
+        self.store.prune()
+
+    async def _status(self, request: web.Request) -> web.Response:
+        if not self._authorized(request):
+            return self._error(401, "Unauthorized")
+        job = self.store.get(request.match_info['id'])
+        if not job:
+            return self._error(404, "Unknown job")
+        return web.json_response(job.to_dict())
+
+    async def _result(self, request: web.Request) -> web.StreamResponse:
+        if not self._authorized(request):
+            return self._error(401, "Unauthorized")
+        job = self.store.get(request.match_info['id'])
+        if not job:
+            return self._error(404, "Unknown job")
+        if job.status == 'failed':
+            return self._error(422, job.error or "Job failed")
+        if not job.done:
+            return self._error(409, f"Job is {job.status}")
+
+        output = job.output
+        response = web.StreamResponse(headers={'Content-Type': 'text/x-lua',
+                                               'Content-Disposition': f'attachment; filename="{job.id}.lua"'})
+        response.content_length = len(output)
+        await response.prepare(request)
+        view = memoryview(output)
+        for offset in range(0, len(output), STREAM_CHUNK_SIZE):
+            await response.write(view[offset:offset + STREAM_CHUNK_SIZE])
+        await response.write_eof()
+        return response
+
+    async def stop(self):
+        """
+        Cancels the jobs still running.
+        """
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
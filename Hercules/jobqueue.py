@@ -0,0 +1,283 @@
+import abc
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, NamedTuple, Optional
+from urllib.parse import urlparse
+
+KINDS = ('validate', 'obfuscate')
+
+
+class QueueError(Exception):
+    """
+    Raised when the queue backend fails, or when a job does not exist.
+    """
+
+
+class QueuedJob(NamedTuple):
+    id: str
+    kind: str
+    source: bytes
+    bitkey: int
+    preset: Optional[str]
+    attempts: int
+
+
+class JobResult(NamedTuple):
+    success: bool
+    conout: str
+    output: Optional[bytes]
+    limit: Optional[str]
+
+
+class JobQueue(abc.ABC):
+    """
+    Queue between the bot, which submits jobs and delivers their results, and obfuscation workers, which run them.
+    Workers lease a job and have to finish it before the lease ends; jobs of workers that died are handed out again.
+    The methods block, except wait(), so the bot calls them through asyncio.to_thread.
+    Backend failures are raised as QueueError from every method.
+    """
+
+    @abc.abstractmethod
+    def submit(self, kind: str, source: bytes, bitkey: int = 0, preset: Optional[str] = None, lane: str = 'slow') -> str:
+        """
+        Adds a job.
+
+        Args:
+            kind: 'validate' or 'obfuscate'.
+            source: LUA code as bytes.
+            bitkey: Bitkey representing the obfuscation methods to use.
+            preset: Optional preset for obfuscation level.
+            lane: 'fast' jobs are handed out before 'slow' ones.
+
+        Returns:
+            The id of the job.
+        """
+
+    @abc.abstractmethod
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[QueuedJob]:
+        """
+        Leases the next job to a worker.
+
+        Returns:
+            The job, or None if the queue is empty.
+        """
+
+    @abc.abstractmethod
+    def extend(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+        """
+        Extends the lease of a running job.
+
+        Returns:
+            False if the worker lost the job, e.g. because it was cancelled.
+        """
+
+    @abc.abstractmethod
+    def complete(self, job_id: str, worker_id: str, result: JobResult):
+        """
+        Stores the result of a job. Results of workers that lost the lease are dropped.
+        """
+
+    @abc.abstractmethod
+    def result(self, job_id: str) -> Optional[JobResult]:
+        """
+        Returns the result of a finished job, or None while it is pending.
+
+        Raises:
+            QueueError: If the job does not exist.
+        """
+
+    @abc.abstractmethod
+    def cancel(self, job_id: str):
+        """
+        Removes a job and its result.
+        """
+
+    @abc.abstractmethod
+    def purge(self, max_age: float) -> int:
+        """
+        Removes jobs older than max_age seconds, e.g. results nobody picked up.
+
+        Returns:
+            The number of removed jobs.
+        """
+
+    def close(self):
+        pass
+
+    async def wait(self, job_id: str, timeout: Optional[float] = None, poll_interval: float = 0.25) -> Optional[JobResult]:
+        """
+        Waits for the result of a job and removes the job. Backends that can push results should override this.
+
+        Args:
+            job_id: The job.
+            timeout: Seconds to wait. The job is cancelled when they run out.
+            poll_interval: Seconds between two polls.
+
+        Returns:
+            The result, or None after the timeout.
+        """
+        deadline = time.monotonic() + timeout if timeout else None
+        try:
+            while True:
+                result = await asyncio.to_thread(self.result, job_id)
+                if result is not None:
+                    return result
+                if deadline and time.monotonic() > deadline:
+                    return None
+                await asyncio.sleep(poll_interval)
+        finally:
+            await asyncio.to_thread(self.cancel, job_id)
+
+
+class SQLiteJobQueue(JobQueue):
+    """
+    Job queue in an SQLite database. Any number of bot and worker processes on one host, or on hosts that share
+    a local volume, can use the same file. Network file systems are not safe for SQLite; use a broker backend there.
+    """
+
+    def __init__(self, path: str, max_attempts: int = 3):
+        """
+        Args:
+            path: Path of the database file.
+            max_attempts: Leases after which a job whose workers keep dying fails.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        with self._connect() as connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('''CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                lane INTEGER NOT NULL,
+                source BLOB NOT NULL,
+                bitkey INTEGER NOT NULL,
+                preset TEXT,
+                created REAL NOT NULL,
+                worker TEXT,
+                lease_until REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                result TEXT,
+                output BLOB
+            )''')
+            connection.execute('CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (status, lane, created)')
+
+    def _execute(self, sql: str, parameters: tuple = ()) -> sqlite3.Cursor:
+        try:
+            return self._connect().execute(sql, parameters)
+        except sqlite3.Error as e:
+            raise QueueError(f"Job queue database error: {e}") from e
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA busy_timeout=30000')
+            self._local.connection = connection
+        return connection
+
+    def submit(self, kind: str, source: bytes, bitkey: int = 0, preset: Optional[str] = None, lane: str = 'slow') -> str:
+        if kind not in KINDS:
+            raise QueueError(f"Unknown job kind: {kind}")
+        job_id = uuid.uuid4().hex
+        self._execute('INSERT INTO jobs (id, kind, status, lane, source, bitkey, preset, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                      (job_id, kind, 'queued', 0 if lane == 'fast' else 1, source, bitkey, preset, time.time()))
+        return job_id
+
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[QueuedJob]:
+        try:
+            return self._claim(worker_id, lease_seconds)
+        except sqlite3.Error as e:
+            raise QueueError(f"Job queue database error: {e}") from e
+
+    def _claim(self, worker_id: str, lease_seconds: float) -> Optional[QueuedJob]:
+        connection = self._connect()
+        now = time.time()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute("UPDATE jobs SET status = 'done', result = ? WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+                               (json.dumps([False, 'The job failed on every worker it was given to.', None]), now, self.max_attempts))
+            row = connection.execute("""SELECT id, kind, source, bitkey, preset, attempts FROM jobs
+                                        WHERE status = 'queued' OR (status = 'running' AND lease_until < ?)
+                                        ORDER BY lane, created LIMIT 1""", (now,)).fetchone()
+            if row:
+                connection.execute("UPDATE jobs SET status = 'running', worker = ?, lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                                   (worker_id, now + lease_seconds, row[0]))
+            connection.execute('COMMIT')
+        except BaseException:
+            if connection.in_transaction:
+                connection.execute('ROLLBACK')
+            raise
+        if not row:
+            return None
+        return QueuedJob(row[0], row[1], row[2], row[3], row[4], row[5] + 1)
+
+    def extend(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+        cursor = self._execute("UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                               (time.time() + lease_seconds, job_id, worker_id))
+        return cursor.rowcount == 1
+
+    def complete(self, job_id: str, worker_id: str, result: JobResult):
+        self._execute("UPDATE jobs SET status = 'done', result = ?, output = ?, source = x'' WHERE id = ? AND worker = ? AND status = 'running'",
+                      (json.dumps([result.success, result.conout, result.limit]), result.output, job_id, worker_id))
+
+    def result(self, job_id: str) -> Optional[JobResult]:
+        row = self._execute('SELECT status, result, output FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            raise QueueError(f"Unknown job: {job_id}")
+        if row[0] != 'done':
+            return None
+        success, conout, limit = json.loads(row[1])
+        return JobResult(success, conout, row[2], limit)
+
+    def cancel(self, job_id: str):
+        self._execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+
+    def purge(self, max_age: float) -> int:
+        return self._execute('DELETE FROM jobs WHERE created < ?', (time.time() - max_age,)).rowcount
+
+    def close(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+def _sqlite_queue(url: str) -> SQLiteJobQueue:
+    return SQLiteJobQueue(url[len('sqlite:///'):] if url.startswith('sqlite:///') else urlparse(url).path)
+
+
+BACKENDS: dict[str, Callable[[str], JobQueue]] = {
+    'sqlite': _sqlite_queue,
+}
+
+
+def register_backend(scheme: str, factory: Callable[[str], JobQueue]):
+    """
+    Registers a queue backend, e.g. for a network broker.
+
+    Args:
+        scheme: URL scheme of the backend.
+        factory: Creates the queue from the URL.
+    """
+    BACKENDS[scheme] = factory
+
+
+def create_queue(url: str) -> JobQueue:
+    """
+    Creates a job queue from a URL, e.g. sqlite:///Hercules-Bot/queue.db for a relative or sqlite:////data/queue.db for an absolute path.
+
+    Raises:
+        ValueError: If there is no backend for the scheme.
+    """
+    scheme = urlparse(url).scheme
+    if scheme not in BACKENDS:
+        raise ValueError(f"No job queue backend for '{scheme}'. Available: {', '.join(BACKENDS)}")
+    return BACKENDS[scheme](url)
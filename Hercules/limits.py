@@ -0,0 +1,253 @@
+import asyncio
+import os
+import signal
+import subprocess
+import threading
+from typing import Optional
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+CHUNK_SIZE = 64 * 1024
+MEMORY_ERRORS = (b'not enough memory', b'MemoryError')
+FILE_SIZE_ERRORS = (b'File too large',)
+
+
+class ResourceLimitExceeded(Exception):
+    """
+    Raised when a child process was killed for breaching one of its resource limits.
+    """
+
+    def __init__(self, limit: str, output: bytes = b''):
+        """
+        Args:
+            limit: Name of the breached limit, e.g. "wall time" or "memory".
+            output: The tail of the child's output.
+        """
+        super().__init__(f"Resource limit exceeded: {limit}")
+        self.limit = limit
+        self.output = output
+
+
+class RingBuffer:
+    """
+    Keeps the last max_bytes bytes written to it.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._buffer = bytearray()
+        self.truncated = False
+
+    def write(self, data: bytes):
+        self._buffer += data
+        if len(self._buffer) > self.max_bytes:
+            del self._buffer[:len(self._buffer) - self.max_bytes]
+            self.truncated = True
+
+    def getvalue(self) -> bytes:
+        if self.truncated:
+            return b'[output truncated]\n' + bytes(self._buffer)
+        return bytes(self._buffer)
+
+
+class ResourceLimits:
+    """
+    Hard limits for a child process. CPU time, address space and file size are enforced by the kernel through rlimits,
+    wall time and captured output by the parent. The child runs in its own session, so a breach kills its whole process group.
+    On Windows there are no rlimits or process groups; only the wall time and output limits apply there, and a breach
+    kills the child itself.
+    """
+
+    def __init__(self, wall_seconds: Optional[float] = None, cpu_seconds: Optional[int] = None, memory_bytes: Optional[int] = None,
+                 file_bytes: Optional[int] = None, output_bytes: int = 1024 * 1024):
+        """
+        Initializes the limits. None disables a limit.
+
+        Args:
+            wall_seconds: Seconds the child may run.
+            cpu_seconds: CPU seconds the child may use.
+            memory_bytes: Address space of the child.
+            file_bytes: Largest file the child may write.
+            output_bytes: Captured stdout/stderr. Only the tail is kept.
+        """
+        self.wall_seconds = wall_seconds
+        self.cpu_seconds = cpu_seconds
+        self.memory_bytes = memory_bytes
+        self.file_bytes = file_bytes
+        self.output_bytes = output_bytes
+
+    def rlimits(self) -> list[tuple[int, tuple[int, int]]]:
+        """
+        Returns the rlimits to set as (resource, (soft, hard)) tuples. Empty where rlimits are not supported.
+        SIGXCPU is sent at the CPU limit (SIGKILL a second later if it is ignored), SIGXFSZ when the file size limit is hit.
+        """
+        rlimits = []
+        if resource is None:
+            return rlimits
+        if self.cpu_seconds:
+            rlimits.append((resource.RLIMIT_CPU, (self.cpu_seconds, self.cpu_seconds + 1)))
+        if self.memory_bytes:
+            rlimits.append((resource.RLIMIT_AS, (self.memory_bytes, self.memory_bytes)))
+        if self.file_bytes:
+            rlimits.append((resource.RLIMIT_FSIZE, (self.file_bytes, self.file_bytes)))
+        return rlimits
+
+    def apply(self, pid: int):
+        """
+        Sets the rlimits of a child right after it was spawned. This avoids preexec_fn, which is not safe in a process
+        with threads, at the price of the child running unlimited for the moment between its exec and this call.
+
+        Args:
+            pid: The child.
+        """
+        for limit, value in self.rlimits():
+            try:
+                resource.prlimit(pid, limit, value)
+            except ProcessLookupError:
+                return
+
+    def breached(self, returncode: int, output: bytes) -> Optional[str]:
+        """
+        Tells from how a child ended whether it hit one of the rlimits.
+
+        Args:
+            returncode: Return code of the child.
+            output: Captured output of the child.
+
+        Returns:
+            The name of the breached limit, or None.
+        """
+        if resource is None:
+            return None
+        if self.cpu_seconds and returncode == -signal.SIGXCPU:
+            return 'CPU time'
+        if self.file_bytes and (returncode == -signal.SIGXFSZ or returncode != 0 and any(error in output[-4096:] for error in FILE_SIZE_ERRORS)):
+            return 'file size'
+        if self.memory_bytes and returncode != 0 and any(error in output[-4096:] for error in MEMORY_ERRORS):
+            return 'memory'
+        return None
+
+
+def kill_group(pid: int):
+    """
+    Kills the process group led by pid, i.e. a child started in a new session and everything it spawned.
+    On Windows only the child itself is killed.
+    """
+    try:
+        if os.name == 'nt':
+            os.kill(pid, signal.SIGTERM)
+        else:
+            os.killpg(pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+
+async def run(command: list[str], limits: Optional[ResourceLimits] = None, cwd: Optional[str] = None, timeout: Optional[float] = None,
+              input: Optional[bytes] = None, pass_fds: tuple[int, ...] = ()) -> tuple[int, bytes]:
+    """
+    Runs a command as an asyncio subprocess in its own session and collects the tail of its combined output.
+
+    Args:
+        command: The command as a list of arguments.
+        limits: Optional resource limits for the child.
+        cwd: Working directory for the child process.
+        timeout: Optional timeout in seconds. Unlike the wall time limit it raises asyncio.TimeoutError.
+        input: Optional data written to the child's stdin.
+        pass_fds: File descriptors the child inherits.
+
+    Returns:
+        A tuple containing the return code and the combined stdout/stderr output.
+
+    Raises:
+        ResourceLimitExceeded: If the child breached one of the limits.
+        asyncio.TimeoutError: If the timeout was exceeded.
+    """
+    limits = limits or ResourceLimits()
+    process = await asyncio.create_subprocess_exec(*command,
+                                                   cwd=cwd,
+                                                   stdin=asyncio.subprocess.PIPE if input is not None else asyncio.subprocess.DEVNULL,
+                                                   stdout=asyncio.subprocess.PIPE,
+                                                   stderr=asyncio.subprocess.STDOUT,
+                                                   pass_fds=pass_fds,
+                                                   start_new_session=True)
+    limits.apply(process.pid)
+    buffer = RingBuffer(limits.output_bytes)
+
+    async def __collect():
+        if input is not None:
+            try:
+                process.stdin.write(input)
+                await process.stdin.drain()
+            except ConnectionError:
+                pass
+            process.stdin.close()
+        while chunk := await process.stdout.read(CHUNK_SIZE):
+            buffer.write(chunk)
+        await process.wait()
+
+    deadlines = [t for t in (timeout, limits.wall_seconds) if t]
+    try:
+        await asyncio.wait_for(__collect(), timeout=min(deadlines) if deadlines else None)
+    except asyncio.TimeoutError:
+        kill_group(process.pid)
+        await process.wait()
+        if limits.wall_seconds and (not timeout or limits.wall_seconds <= timeout):
+            raise ResourceLimitExceeded('wall time', buffer.getvalue())
+        raise
+    except asyncio.CancelledError:
+        kill_group(process.pid)
+        await process.wait()
+        raise
+    finally:
+        kill_group(process.pid)
+
+    output = buffer.getvalue()
+    limit = limits.breached(process.returncode, output)
+    if limit:
+        raise ResourceLimitExceeded(limit, output)
+    return process.returncode, output
+
+
+def run_sync(command: list[str], limits: Optional[ResourceLimits] = None, cwd: Optional[str] = None) -> tuple[int, bytes]:
+    """
+    Blocking version of run().
+
+    Raises:
+        ResourceLimitExceeded: If the child breached one of the limits.
+    """
+    limits = limits or ResourceLimits()
+    process = subprocess.Popen(command,
+                               cwd=cwd,
+                               stdin=subprocess.DEVNULL,
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT,
+                               start_new_session=True)
+    limits.apply(process.pid)
+    buffer = RingBuffer(limits.output_bytes)
+
+    def __collect():
+        while chunk := process.stdout.read1(CHUNK_SIZE):
+            buffer.write(chunk)
+
+    reader = threading.Thread(target=__collect, daemon=True)
+    reader.start()
+    try:
+        process.wait(timeout=limits.wall_seconds)
+    except subprocess.TimeoutExpired:
+        kill_group(process.pid)
+        process.wait()
+        reader.join()
+        raise ResourceLimitExceeded('wall time', buffer.getvalue())
+    finally:
+        kill_group(process.pid)
+    reader.join()
+    process.stdout.close()
+
+    output = buffer.getvalue()
+    limit = limits.breached(process.returncode, output)
+    if limit:
+        raise ResourceLimitExceeded(limit, output)
+    return process.returncode, output
@@ -0,0 +1,75 @@
+import os
+import time
+from typing import Optional
+from zipfile import ZIP_DEFLATED, ZipFile
+
+
+def tail(path: str, lines: int, block_size: int = 64 * 1024, encoding: str = 'utf8') -> list[str]:
+    """
+    Returns the last lines of a file. The file is read backwards block by block,
+    so only the blocks holding the requested lines are read.
+
+    Args:
+        path: Path of the file.
+        lines: Number of lines to return.
+        block_size: Bytes read per step.
+        encoding: Encoding of the file.
+
+    Returns:
+        The lines, including their line endings.
+    """
+    if lines < 1:
+        return []
+    with open(path, 'rb') as f:
+        position = f.seek(0, os.SEEK_END)
+        blocks = []
+        newlines = 0
+        # A trailing newline ends the last line and doesn't start a new one.
+        needed = lines + 1
+        while position > 0 and newlines < needed:
+            size = min(block_size, position)
+            position -= size
+            f.seek(position)
+            block = f.read(size)
+            blocks.append(block)
+            newlines += block.count(b'\n')
+    data = b''.join(reversed(blocks))
+    return data.decode(encoding, errors='replace').splitlines(keepends=True)[-lines:]
+
+
+def archive(folder: str, zip_path: str, since: Optional[float] = None, until: Optional[float] = None,
+            level: int = 6, names: Optional[list[str]] = None) -> int:
+    """
+    Packs the files of a folder into a zip archive. Files are streamed into the archive chunk by chunk,
+    so memory use does not depend on their size. This blocks, so call it in a thread.
+
+    Args:
+        folder: The folder to pack.
+        zip_path: Path of the archive to create.
+        since: Only pack files modified at or after this UNIX timestamp.
+        until: Only pack files modified at or before this UNIX timestamp.
+        level: Deflate compression level.
+        names: Only pack these files. Defaults to all files except zip archives.
+
+    Returns:
+        The number of packed files.
+    """
+    count = 0
+    with ZipFile(zip_path, mode='w', compression=ZIP_DEFLATED, compresslevel=level, allowZip64=True) as zip_file:
+        for name in names if names is not None else sorted(os.listdir(folder)):
+            path = os.path.join(folder, name)
+            if (names is None and name.endswith('.zip')) or not os.path.isfile(path):
+                continue
+            mtime = os.path.getmtime(path)
+            if (since is not None and mtime < since) or (until is not None and mtime > until):
+                continue
+            zip_file.write(path, arcname=name)
+            count += 1
+    return count
+
+
+def since_hours(hours: float) -> float:
+    """
+    Returns the UNIX timestamp of the given number of hours ago.
+    """
+    return time.time() - hours * 3600
@@ -0,0 +1,66 @@
+-- Resident luacheck validator for the Hercules bot.
+--
+-- Loads luacheck once and checks sources sent over stdin.
+--
+-- Request:  <id> <length>\n<source>
+-- Response: <id> <status> <length>\n<output>
+--           status follows the luacheck CLI exit codes: 0 no warnings, 1 warnings,
+--           2 errors, 3 fatal errors.
+
+local ok, luacheck = pcall(require, "luacheck")
+if not ok then
+    io.stdout:write("ERROR ", tostring(luacheck):gsub("\n", " "), "\n")
+    io.stdout:flush()
+    os.exit(1)
+end
+
+local function format_report(report)
+    if report.fatal then
+        return ("stdin: (%s) %s"):format(report.fatal, report.msg or "could not check source"), 3
+    end
+
+    local lines, status, warnings, errors = {}, 0, 0, 0
+    for _, event in ipairs(report) do
+        local is_error = event.code:sub(1, 1) == "0"
+        if is_error then
+            errors = errors + 1
+            status = 2
+        else
+            warnings = warnings + 1
+            status = math.max(status, 1)
+        end
+        lines[#lines + 1] = ("    stdin:%d:%d: (%s%s) %s"):format(event.line or 0, event.column or 0,
+            is_error and "E" or "W", event.code, luacheck.get_message(event))
+    end
+    lines[#lines + 1] = ""
+    lines[#lines + 1] = ("Total: %d warning%s / %d error%s"):format(warnings, warnings == 1 and "" or "s",
+        errors, errors == 1 and "" or "s")
+    return table.concat(lines, "\n"), status
+end
+
+io.stdout:setvbuf("full")
+io.stdout:write("READY\n")
+io.stdout:flush()
+
+while true do
+    local header = io.stdin:read("l")
+    if not header then
+        break
+    end
+    local id, length = header:match("^(%S+) (%d+)$")
+    if not id then
+        break
+    end
+    length = tonumber(length)
+    local source = length > 0 and io.stdin:read(length) or ""
+
+    local checked, result = pcall(luacheck.check_strings, {source})
+    local output, status
+    if checked then
+        output, status = format_report(result[1])
+    else
+        output, status = tostring(result), 3
+    end
+    io.stdout:write(("%s %d %d\n"):format(id, status, #output), output)
+    io.stdout:flush()
+end
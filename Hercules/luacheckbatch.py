@@ -0,0 +1,216 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+import threading
+from typing import Optional
+
+
+class LuacheckBatcher:
+    """
+    Collects luacheck requests over a short window and checks them with a single luacheck run.
+    Sources are written to content-addressed files, so luacheck's --cache can skip unchanged ones.
+    """
+
+    def __init__(self, folder: str, program_logger, window: float = 0.01, max_batch: int = 32, timeout: float = 8, max_files: int = 1024):
+        """
+        Initializes the batcher.
+
+        Args:
+            folder: Folder for the source files and luacheck's cache.
+            program_logger: Logger object to log messages.
+            window: Seconds to wait for more requests after the first one of a batch.
+            max_batch: Number of files that triggers a run before the window ends.
+            timeout: Seconds a luacheck run may take.
+            max_files: Number of source files kept for luacheck's cache.
+        """
+        self._folder = os.path.abspath(folder)
+        self._program_logger = program_logger
+        self.window = window
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.max_files = max_files
+        self._batch: dict[str, list[asyncio.Future]] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks: set[asyncio.Task] = set()
+        self._references: dict[str, int] = {}
+        self._references_lock = threading.Lock()
+        os.makedirs(self._folder, exist_ok=True)
+
+    async def check(self, lua_code: str) -> tuple[bool, str]:
+        """
+        Validates the syntax of the given LUA code as part of the next batch.
+
+        Args:
+            lua_code: LUA code as a string.
+
+        Returns:
+            A tuple containing a boolean indicating if the syntax is valid and the output message.
+
+        Raises:
+            OSError: If luacheck failed as a whole, e.g. with an I/O or fatal error or by exceeding the timeout,
+                so the files have no results. Check them one by one then.
+        """
+        data = lua_code.encode('utf-8', errors='surrogatepass')
+        path = os.path.join(self._folder, f'{hashlib.sha256(data).hexdigest()}.lua')
+        self._reference(path, 1)
+        try:
+            await asyncio.to_thread(self._write_source, path, data)
+
+            future = asyncio.get_running_loop().create_future()
+            self._batch.setdefault(path, []).append(future)
+            if len(self._batch) >= self.max_batch:
+                self._flush()
+            elif not self._flush_handle:
+                self._flush_handle = asyncio.get_running_loop().call_later(self.window, self._flush)
+            return await future
+        finally:
+            self._reference(path, -1)
+
+    def _reference(self, path: str, delta: int):
+        """
+        Counts the requests and luacheck runs using a source file. Referenced files are never pruned.
+        """
+        with self._references_lock:
+            count = self._references.get(path, 0) + delta
+            if count > 0:
+                self._references[path] = count
+            else:
+                self._references.pop(path, None)
+
+    @staticmethod
+    def _write_source(path: str, data: bytes):
+        """
+        Writes a source file unless it already exists, so its mtime and luacheck's cache entry stay valid.
+        """
+        if os.path.exists(path):
+            return
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def _flush(self):
+        """
+        Starts a luacheck run for the current batch.
+        """
+        if self._flush_handle:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._batch = self._batch, {}
+        if not batch:
+            return
+        task = asyncio.create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: dict[str, list[asyncio.Future]]):
+        """
+        Runs luacheck over all files of a batch and resolves every caller's future.
+        """
+        paths = list(batch)
+        command = ['luacheck', '--cache', os.path.join(self._folder, '.luacheckcache'),
+                   '--formatter', 'plain', '--codes', '--no-color'] + paths
+        for path in paths:
+            self._reference(path, 1)
+        try:
+            process = await asyncio.create_subprocess_exec(*command,
+                                                           stdout=asyncio.subprocess.PIPE,
+                                                           stderr=asyncio.subprocess.STDOUT)
+            try:
+                output, _ = await asyncio.wait_for(process.communicate(), timeout=self.timeout)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                # One slow file must not fail the others, so the callers retry with a run of their own.
+                raise OSError(f"luacheck run of {len(paths)} files exceeded {self.timeout} seconds")
+            output = output.decode(errors='replace')
+            # 0-2 are warnings and syntax errors, 3 and 4 are I/O and fatal errors with no reliable per-file lines.
+            if process.returncode >= 3:
+                raise OSError(f"luacheck exited with code {process.returncode}: {output.strip()[-500:]}")
+            results = self._split_output(paths, output)
+        except asyncio.CancelledError:
+            for futures in batch.values():
+                for future in futures:
+                    future.cancel()
+            raise
+        except Exception as e:
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+        finally:
+            for path in paths:
+                self._reference(path, -1)
+
+        for path, futures in batch.items():
+            for future in futures:
+                if not future.done():
+                    future.set_result(results[path])
+        self._program_logger.debug(f"Checked {len(paths)} files in one luacheck run.")
+        await asyncio.to_thread(self._prune)
+
+    @staticmethod
+    def _split_output(paths: list[str], output: str) -> dict[str, tuple[bool, str]]:
+        """
+        Splits the plain formatter output of a luacheck run back into per-file results.
+
+        Args:
+            paths: The checked files.
+            output: The combined output.
+
+        Returns:
+            A dict mapping each file to a tuple of its validity and its output.
+        """
+        lines: dict[str, list[str]] = {path: [] for path in paths}
+        valid = {path: True for path in paths}
+        for line in output.splitlines():
+            path = next((p for p in paths if line.startswith(f'{p}:')), None)
+            if path is None:
+                continue
+            lines[path].append(line)
+            location = line[len(path) + 1:].split(':', 2)
+            if len(location) < 3 or not location[0].isdigit() or location[2].lstrip().startswith('(E'):
+                valid[path] = False
+
+        results = {}
+        for path in paths:
+            warnings = sum(1 for line in lines[path] if '(W' in line)
+            errors = len(lines[path]) - warnings
+            summary = f"Total: {warnings} warning{'s' if warnings != 1 else ''} / {errors} error{'s' if errors != 1 else ''}"
+            results[path] = (valid[path], '\n'.join(lines[path] + ['', summary]))
+        return results
+
+    def _prune(self):
+        """
+        Removes the oldest source files when more than max_files are kept. Files of pending requests and
+        running batches are skipped.
+        """
+        files = []
+        for name in os.listdir(self._folder):
+            if name.endswith('.lua'):
+                path = os.path.join(self._folder, name)
+                try:
+                    files.append((os.path.getmtime(path), path))
+                except OSError:
+                    continue
+        excess = len(files) - self.max_files
+        for _, path in sorted(files):
+            if excess <= 0:
+                break
+            with self._references_lock:
+                if path in self._references:
+                    continue
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+            excess -= 1
+
+    async def stop(self):
+        """
+        Runs the pending batch and waits for all luacheck runs to finish.
+        """
+        self._flush()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,232 @@
+import asyncio
+import itertools
+import os
+from typing import Optional
+
+
+class DaemonError(Exception):
+    """
+    Raised when the luacheck daemon is not running or died while checking.
+    """
+
+
+class LuacheckDaemon:
+    """
+    Client for luacheck_daemon.lua, a long-running Lua process that loads luacheck once.
+    Concurrent checks are multiplexed over the daemon's stdin/stdout and matched by request id, but the daemon
+    checks them one after another. LuacheckDaemonPool therefore hands every daemon one check at a time.
+    """
+
+    def __init__(self, lua: str, program_logger, timeout: float = 8):
+        """
+        Initializes the client. The daemon is started by start().
+
+        Args:
+            lua: Name or path of the LUA 5.4 interpreter.
+            program_logger: Logger object to log messages.
+            timeout: Seconds a single check may take before it is aborted.
+        """
+        self._command = [lua, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'luacheck_daemon.lua')]
+        self._program_logger = program_logger
+        self.timeout = timeout
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._reader: Optional[asyncio.Task] = None
+        self._pending: dict[str, asyncio.Future] = {}
+        self._ids = itertools.count()
+        self._write_lock = asyncio.Lock()
+        self._restart_lock = asyncio.Lock()
+
+    @property
+    def alive(self) -> bool:
+        return self._process is not None and self._process.returncode is None
+
+    async def start(self, timeout: float = 30):
+        """
+        Starts the daemon and waits until luacheck is loaded.
+
+        Args:
+            timeout: Seconds to wait for the daemon to report readiness.
+
+        Raises:
+            DaemonError: If the daemon did not start correctly.
+        """
+        self._process = await asyncio.create_subprocess_exec(*self._command,
+                                                             stdin=asyncio.subprocess.PIPE,
+                                                             stdout=asyncio.subprocess.PIPE,
+                                                             stderr=asyncio.subprocess.DEVNULL)
+        try:
+            ready = await asyncio.wait_for(self._process.stdout.readline(), timeout=timeout)
+        except asyncio.TimeoutError:
+            ready = b''
+        if ready.strip() != b'READY':
+            await self.stop()
+            raise DaemonError(f"luacheck daemon failed to start: {ready.decode(errors='replace').strip()}")
+        self._reader = asyncio.create_task(self._read_responses())
+
+    async def _read_responses(self):
+        """
+        Reads responses from the daemon and resolves the matching futures.
+        """
+        error = DaemonError("luacheck daemon exited.")
+        try:
+            while True:
+                header = await self._process.stdout.readline()
+                if not header:
+                    break
+                request_id, status, length = header.decode().split()
+                output = await self._process.stdout.readexactly(int(length))
+                future = self._pending.pop(request_id, None)
+                if future and not future.done():
+                    future.set_result((int(status), output.decode(errors='replace')))
+        except (ValueError, asyncio.IncompleteReadError) as e:
+            error = DaemonError(f"luacheck daemon sent a malformed response: {e}")
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            self._pending.clear()
+
+    async def check(self, lua_code: str) -> tuple[bool, str]:
+        """
+        Validates the syntax of the given LUA code.
+
+        Args:
+            lua_code: LUA code as a string.
+
+        Returns:
+            A tuple containing a boolean indicating if the syntax is valid and the output message.
+
+        Raises:
+            DaemonError: If the daemon is not running or died while checking.
+            asyncio.TimeoutError: If the check exceeded the timeout. The daemon is restarted.
+        """
+        if not self.alive:
+            raise DaemonError("luacheck daemon is not running.")
+
+        process = self._process
+        request_id = str(next(self._ids))
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        data = lua_code.encode('utf-8', errors='surrogatepass')
+        try:
+            async with self._write_lock:
+                self._process.stdin.write(f"{request_id} {len(data)}\n".encode() + data)
+                await self._process.stdin.drain()
+            status, output = await asyncio.wait_for(future, timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self._pending.pop(request_id, None)
+            self._program_logger.warning("luacheck daemon exceeded the timeout, restarting it.")
+            await self.restart(process)
+            raise
+        except ConnectionError as e:
+            self._pending.pop(request_id, None)
+            raise DaemonError(f"luacheck daemon is not reachable: {e}") from e
+
+        return status in [0, 1], output
+
+    async def restart(self, process: Optional[asyncio.subprocess.Process] = None):
+        """
+        Kills the daemon and starts a new one. Checks still waiting on the old daemon fail with DaemonError.
+
+        Args:
+            process: Only restart if this is still the running daemon process. Restarts unconditionally if None.
+        """
+        async with self._restart_lock:
+            if process is not None and process is not self._process:
+                return
+            if self.alive:
+                self._process.kill()
+            await self.stop()
+            try:
+                await self.start()
+            except (OSError, DaemonError) as e:
+                self._program_logger.error(f"Could not restart luacheck daemon: {e}")
+
+    async def stop(self):
+        """
+        Stops the daemon.
+        """
+        if self.alive:
+            try:
+                self._process.stdin.close()
+                await asyncio.wait_for(self._process.wait(), timeout=2)
+            except (asyncio.TimeoutError, ConnectionError):
+                self._process.kill()
+                await self._process.wait()
+        if self._reader:
+            await asyncio.gather(self._reader, return_exceptions=True)
+            self._reader = None
+
+
+class LuacheckDaemonPool:
+    """
+    A few luacheck daemons, so checks run in parallel like separate luacheck CLI runs did.
+    Every daemon gets one check at a time, so the timeout of a check only counts the time a daemon spends on it,
+    not the time it waited behind other checks.
+    """
+
+    def __init__(self, lua: str, program_logger, size: Optional[int] = None, timeout: float = 8):
+        """
+        Initializes the pool. The daemons are started by start().
+
+        Args:
+            lua: Name or path of the LUA 5.4 interpreter.
+            program_logger: Logger object to log messages.
+            size: Number of daemons. Defaults to the CPU count.
+            timeout: Seconds a single check may take before it is aborted.
+        """
+        self._program_logger = program_logger
+        self.size = size or os.cpu_count() or 1
+        self._daemons = [LuacheckDaemon(lua, program_logger, timeout) for _ in range(self.size)]
+        self._idle: asyncio.Queue[LuacheckDaemon] = asyncio.Queue()
+
+    @property
+    def alive(self) -> bool:
+        return any(daemon.alive for daemon in self._daemons)
+
+    async def start(self):
+        """
+        Starts the daemons. Daemons that fail to start are left out.
+
+        Raises:
+            DaemonError: If no daemon started.
+        """
+        results = await asyncio.gather(*(daemon.start() for daemon in self._daemons), return_exceptions=True)
+        errors = [result for result in results if isinstance(result, Exception)]
+        self._daemons = [daemon for daemon, result in zip(self._daemons, results) if result is None]
+        if not self._daemons:
+            raise DaemonError(f"No luacheck daemon started: {errors[0]}")
+        if errors:
+            self._program_logger.warning(f"Started {len(self._daemons)} of {self.size} luacheck daemons: {errors[0]}")
+        for daemon in self._daemons:
+            self._idle.put_nowait(daemon)
+
+    async def check(self, lua_code: str) -> tuple[bool, str]:
+        """
+        Validates the syntax of the given LUA code on the next idle daemon. A daemon that died is restarted first.
+
+        Args:
+            lua_code: LUA code as a string.
+
+        Returns:
+            A tuple containing a boolean indicating if the syntax is valid and the output message.
+
+        Raises:
+            DaemonError: If no daemon is running or the daemon died while checking.
+            asyncio.TimeoutError: If the check exceeded the timeout. The daemon is restarted.
+        """
+        if not self.alive:
+            raise DaemonError("No luacheck daemon is running.")
+        daemon = await self._idle.get()
+        try:
+            if not daemon.alive:
+                await daemon.restart()
+            return await daemon.check(lua_code)
+        finally:
+            self._idle.put_nowait(daemon)
+
+    async def stop(self):
+        """
+        Stops all daemons.
+        """
+        await asyncio.gather(*(daemon.stop() for daemon in self._daemons), return_exceptions=True)
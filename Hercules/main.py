@@ -3,26 +3,39 @@ import time
 startupTime_start = time.time()
 import aiohttp
 import asyncio
+import batch
+import costmodel
 import datetime
+import delivery
 import discord
 import hercules
+import httpclient
+import ingest
+import io
+import jobapi
+import jobqueue
 import json
 import jsonschema
+import limits
+import logtools
+import metrics
 import os
 import platform
 import psutil
 import re
+import scheduler
+import scratch
 import sentry_sdk
 import signal
 import sys
 import tempfile
+import tracing
+import watchdog
 from CustomModules import bot_directory
 from CustomModules import log_handler
 from dotenv import load_dotenv
-from random import randrange
-from typing import Optional, Any, Tuple
+from typing import Optional, Any, Callable, Tuple
 from urllib.parse import urlparse, unquote
-from zipfile import ZIP_DEFLATED, ZipFile
 
 
 
@@ -35,12 +48,18 @@ os.makedirs(f'{APP_FOLDER_NAME}//Logs', exist_ok=True)
 os.makedirs(f'{APP_FOLDER_NAME}//Buffer', exist_ok=True)
 LOG_FOLDER = f'{APP_FOLDER_NAME}//Logs//'
 BUFFER_FOLDER = f'{APP_FOLDER_NAME}//Buffer//'
+CACHE_FOLDER = f'{APP_FOLDER_NAME}//Cache//'
 ACTIVITY_FILE = f'{APP_FOLDER_NAME}//activity.json'
 BOT_VERSION = "1.4.11"
+trace_sampler = tracing.AdaptiveSampler(base_rate=float(os.getenv('TRACES_SAMPLE_RATE', '0.1')),
+                                        slow_threshold=float(os.getenv('SLOW_JOB_SECONDS', '10')),
+                                        load=lambda: job_scheduler.queue_depth
+                                        )
 sentry_sdk.init(
     dsn=os.getenv('SENTRY_DSN'),
-    traces_sample_rate=1.0,
-    profiles_sample_rate=1.0,
+    traces_sampler=trace_sampler.traces_sampler,
+    before_send_transaction=trace_sampler.before_send_transaction,
+    profiles_sample_rate=float(os.getenv('PROFILES_SAMPLE_RATE', '0')),
     environment='Production',
     release=f'{BOT_NAME}@{BOT_VERSION}'
 )
@@ -52,6 +71,33 @@ LOG_LEVEL = os.getenv('LOG_LEVEL')
 SUPPORTID = os.getenv('SUPPORT_SERVER')
 TOPGG_TOKEN = os.getenv('TOPGG_TOKEN')
 DEBUG_CHANNEL_ID = int(os.getenv('DEBUG_CHANNEL', '1358836394398847155'))
+MAX_CONCURRENT_JOBS = int(os.getenv('MAX_CONCURRENT_JOBS', str(os.cpu_count() or 1)))
+FAST_LANE_MAX_BYTES = int(os.getenv('FAST_LANE_MAX_KB', '64')) * 1024
+BUFFER_MAX_MB = int(os.getenv('BUFFER_MAX_MB', '512'))
+BUFFER_MAX_AGE_MINUTES = int(os.getenv('BUFFER_MAX_AGE_MINUTES', '60'))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '15'))
+URL_CACHE_SIZE_MB = int(os.getenv('URL_CACHE_SIZE_MB', '64'))
+DELIVERY_COMPRESSION = os.getenv('DELIVERY_COMPRESSION', 'deflate').lower()
+DELIVERY_COMPRESSION_LEVEL = int(os.getenv('DELIVERY_COMPRESSION_LEVEL', '9'))
+DELIVERY_MAX_PARTS = int(os.getenv('DELIVERY_MAX_PARTS', '10'))
+LOG_ARCHIVE_LEVEL = int(os.getenv('LOG_ARCHIVE_LEVEL', '6'))
+LOOP_LAG_THRESHOLD = float(os.getenv('LOOP_LAG_THRESHOLD', '1'))
+READY_MAX_LAG = float(os.getenv('READY_MAX_LAG', '5'))
+READY_MAX_QUEUE = int(os.getenv('READY_MAX_QUEUE', '100'))
+FAST_LANE_MAX_SECONDS = float(os.getenv('FAST_LANE_MAX_SECONDS', '2'))
+JOB_WARN_SECONDS = float(os.getenv('JOB_WARN_SECONDS', '30'))
+JOB_MAX_SECONDS = float(os.getenv('JOB_MAX_SECONDS', '300'))
+JOB_MAX_OUTPUT_MB = int(os.getenv('JOB_MAX_OUTPUT_MB', '100'))
+API_TOKEN = os.getenv('API_TOKEN')
+API_MAX_PENDING = int(os.getenv('API_MAX_PENDING', '50'))
+API_RESULT_TTL = int(os.getenv('API_RESULT_TTL', '3600'))
+BATCH_MAX_FILES = int(os.getenv('BATCH_MAX_FILES', '100'))
+BATCH_MAX_BYTES = int(os.getenv('BATCH_MAX_MB', '20')) * 1024 * 1024
+BATCH_PARALLEL = int(os.getenv('BATCH_PARALLEL', '4'))
+MAX_FILE_BYTES = 5 * 1024 * 1024
+JOB_QUEUE_URL = os.getenv('JOB_QUEUE_URL')
+JOB_QUEUE_TIMEOUT = float(os.getenv('JOB_QUEUE_TIMEOUT', '900'))
 
 #Logger init
 log_manager = log_handler.LogManager(LOG_FOLDER, BOT_NAME, LOG_LEVEL)
@@ -59,10 +105,30 @@ discord_logger = log_manager.get_logger('discord')
 program_logger = log_manager.get_logger('Program')
 program_logger.info('Engine powering up...')
 
-Hercules = hercules.Hercules(program_logger)
-
-#Create activity.json if not exists
-class JSONValidator:
+Hercules = hercules.from_env(program_logger, CACHE_FOLDER)
+job_scheduler = scheduler.JobScheduler(MAX_CONCURRENT_JOBS)
+job_queue = jobqueue.create_queue(JOB_QUEUE_URL) if JOB_QUEUE_URL else None
+metrics.queue_depth.set_function(lambda: job_scheduler.queue_depth)
+metrics.jobs_in_flight.set_function(lambda: job_scheduler.in_flight)
+loop_watchdog = watchdog.LoopWatchdog(program_logger, threshold=LOOP_LAG_THRESHOLD)
+http_client = httpclient.HttpClient(max_bytes=5 * 1024 * 1024,
+                                    connect_timeout=HTTP_CONNECT_TIMEOUT,
+                                    read_timeout=HTTP_READ_TIMEOUT,
+                                    cache=httpclient.UrlCache(URL_CACHE_SIZE_MB * 1024 * 1024) if URL_CACHE_SIZE_MB > 0 else None
+                                    )
+buffer_janitor = scratch.BufferJanitor(program_logger,
+                                      BUFFER_FOLDER,
+                                      max_bytes=BUFFER_MAX_MB * 1024 * 1024,
+                                      max_age=BUFFER_MAX_AGE_MINUTES * 60,
+                                      temp_folders=[tempfile.gettempdir(), Hercules.scratch_folder]
+                                      )
+
+#Load activity.json, create it if not exists
+class ActivityStore:
+    """
+    Keeps activity.json in memory. The file is validated once on load and reloaded only when its mtime changes.
+    Updates are written to a temp file and renamed over the original, so the file is never half-written.
+    """
     schema = {
         "type" : "object",
         "properties" : {
@@ -88,24 +154,69 @@ class JSONValidator:
 
     def __init__(self, file_path):
         self.file_path = file_path
+        self.data = dict(self.default_content)
+        self._mtime = None
+        self.load()
 
-    def validate_and_fix_json(self):
-        if os.path.exists(self.file_path):
-            with open(self.file_path, 'r') as file:
-                try:
-                    data = json.load(file)
-                    jsonschema.validate(instance=data, schema=self.schema)  # validate the data
-                except (jsonschema.exceptions.ValidationError, json.decoder.JSONDecodeError) as e:
-                    program_logger.error(f'ValidationError: {e}')
-                    self.write_default_content()
-        else:
-            self.write_default_content()
+    def load(self):
+        """
+        Loads and validates the file. An invalid or missing file is replaced by the default content.
+        """
+        try:
+            with open(self.file_path, 'r', encoding='utf8') as file:
+                data = json.load(file)
+            jsonschema.validate(instance=data, schema=self.schema)
+        except FileNotFoundError:
+            self.write(dict(self.default_content))
+            return
+        except (jsonschema.exceptions.ValidationError, json.decoder.JSONDecodeError) as e:
+            program_logger.error(f'ValidationError: {e}')
+            self.write(dict(self.default_content))
+            return
+        self.data = {**self.default_content, **data}
+        self._mtime = os.stat(self.file_path).st_mtime_ns
+
+    def reload_if_changed(self):
+        """
+        Reloads the file if it was changed on disk.
+        """
+        try:
+            mtime = os.stat(self.file_path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime != self._mtime:
+            self.load()
+
+    def get(self, key: str) -> str:
+        """
+        :param key: Key of the value to get.
+        :return: The value from memory.
+        """
+        self.reload_if_changed()
+        return self.data[key]
 
-    def write_default_content(self):
-        with open(self.file_path, 'w') as file:
-            json.dump(self.default_content, file, indent=4)
-validator = JSONValidator(ACTIVITY_FILE)
-validator.validate_and_fix_json()
+    def update(self, **changes):
+        """
+        Updates values and persists them atomically.
+
+        :param changes: Keys and values to set.
+        """
+        self.write({**self.data, **changes})
+
+    def write(self, data: dict):
+        folder = os.path.dirname(os.path.abspath(self.file_path))
+        fd, temp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf8') as file:
+                json.dump(data, file, indent=2)
+            os.replace(temp_path, self.file_path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self.data = data
+        self._mtime = os.stat(self.file_path).st_mtime_ns
+activity_store = ActivityStore(ACTIVITY_FILE)
 
 
 class aclient(discord.AutoShardedClient):
@@ -127,11 +238,9 @@ class aclient(discord.AutoShardedClient):
     class Presence():
         @staticmethod
         def get_activity() -> discord.Activity:
-            with open(ACTIVITY_FILE) as f:
-                data = json.load(f)
-                activity_type = data['activity_type']
-                activity_title = data['activity_title']
-                activity_url = data['activity_url']
+            activity_type = activity_store.get('activity_type')
+            activity_title = activity_store.get('activity_title')
+            activity_url = activity_store.get('activity_url')
             if activity_type == 'Playing':
                 return discord.Game(name=activity_title)
             elif activity_type == 'Streaming':
@@ -145,9 +254,7 @@ class aclient(discord.AutoShardedClient):
 
         @staticmethod
         def get_status() -> discord.Status:
-            with open(ACTIVITY_FILE) as f:
-                data = json.load(f)
-                status = data['status']
+            status = activity_store.get('status')
             if status == 'online':
                 return discord.Status.online
             elif status == 'idle':
@@ -251,6 +358,11 @@ class aclient(discord.AutoShardedClient):
         await tree.sync()
         discord_logger.info('Synced.')
         self.synced = True
+        if not job_queue:
+            await Hercules.start_worker_pool()
+            await Hercules.start_luacheck_daemon()
+        await http_client.start()
+        loop_watchdog.start()
         self.stats = bot_directory.Stats(bot=bot,
                                     logger=program_logger,
                                     topgg_token=TOPGG_TOKEN,
@@ -269,6 +381,9 @@ class aclient(discord.AutoShardedClient):
 \/ /_/ \___|_|  \___|\__,_|_|\___||___/
         ''')
         bot.loop.create_task(Tasks.health_server())
+        bot.loop.create_task(Tasks.clean_buffer())
+        if job_queue and Hercules.cost_model:
+            bot.loop.create_task(Tasks.train_cost_model())
         global start_time
         start_time = datetime.datetime.now(datetime.UTC)
         program_logger.info(f"Initialization completed in {time.time() - startupTime_start} seconds.")
@@ -276,6 +391,7 @@ class aclient(discord.AutoShardedClient):
 
 bot = aclient()
 tree = discord.app_commands.CommandTree(bot)
+metrics.gateway_latency.set_function(lambda: {(shard_id,): latency for shard_id, latency in bot.latencies})
 tree.on_error = bot.on_app_command_error
 
 
@@ -301,8 +417,27 @@ class Tasks():
         async def __health_check(request):
             return aiohttp.web.Response(text="Healthy")
 
-        app = aiohttp.web.Application()
+        async def __ready_check(request):
+            problems = []
+            if not bot.initialized:
+                problems.append("not initialized")
+            if loop_watchdog.lag > READY_MAX_LAG:
+                problems.append(f"event loop lag {loop_watchdog.lag:.2f}s")
+            if job_scheduler.queue_depth > READY_MAX_QUEUE:
+                problems.append(f"{job_scheduler.queue_depth} queued jobs")
+            if problems:
+                return aiohttp.web.Response(status=503, text=f"Not ready: {', '.join(problems)}")
+            return aiohttp.web.Response(text="Ready")
+
+        async def __metrics(request):
+            return aiohttp.web.Response(text=metrics.REGISTRY.render(), content_type='text/plain')
+
+        app = aiohttp.web.Application(client_max_size=11 * 1024 * 1024)
         app.router.add_get('/health', __health_check)
+        app.router.add_get('/ready', __ready_check)
+        app.router.add_get('/metrics', __metrics)
+        if job_api:
+            job_api.register(app)
         runner = aiohttp.web.AppRunner(app)
         await runner.setup()
         site = aiohttp.web.TCPSite(runner, '0.0.0.0', 5000)
@@ -311,6 +446,23 @@ class Tasks():
         except OSError as e:
             program_logger.warning(f'Error while starting health server: {e}')
 
+    async def clean_buffer():
+        while True:
+            try:
+                await asyncio.to_thread(buffer_janitor.sweep)
+            except Exception as e:
+                program_logger.warning(f'Error while cleaning the buffer: {e}')
+            await asyncio.sleep(300)
+
+    async def train_cost_model():
+        # With a job queue the workers record the job history, so the bot has to pick it up itself.
+        while True:
+            await asyncio.sleep(600)
+            try:
+                await asyncio.to_thread(Hercules.cost_model.train)
+            except Exception as e:
+                program_logger.warning(f'Error while training the cost model: {e}')
+
 
 #Functions
 class Functions():
@@ -341,7 +493,184 @@ class Functions():
                 pass
         return item_object
 
-    async def is_valid_url_and_lua_syntax(url: str) -> Tuple[bool, str]:
+    async def schedule(interaction: discord.Interaction, job, lane: str):
+        """
+        Runs a job through the job scheduler and shows the queue position in the interaction response.
+
+        :param interaction: Interaction the job belongs to
+        :param job: Callable returning the awaitable to run
+        :param lane: 'fast' for checks and small inputs, 'slow' for everything else
+        :return: Result of the job
+        """
+        async def __show_position(position: int):
+            if position:
+                await interaction.edit_original_response(content=f"Your job has been added to the queue. Position: {position}")
+            else:
+                await interaction.edit_original_response(content="Your job is being processed...")
+
+        return await job_scheduler.run(job, interaction.user.id, interaction.guild_id, lane, on_position=__show_position)
+
+    def get_lane(size: int, estimate: Optional[costmodel.Estimate] = None) -> str:
+        if estimate:
+            return 'fast' if estimate.seconds <= FAST_LANE_MAX_SECONDS else 'slow'
+        return 'fast' if size <= FAST_LANE_MAX_BYTES else 'slow'
+
+    def limit_message(error: limits.ResourceLimitExceeded) -> str:
+        return (f"Obfuscation stopped: the job exceeded the {error.limit} limit.\n"
+                "Please select fewer methods, a lighter preset or a smaller file.")
+
+    async def admit_job(interaction: Optional[discord.Interaction], lua_code: str, bitkey: int, optional_preset: Optional[str]) -> Tuple[bool, str]:
+        """
+        Estimates an obfuscation job with the cost model before it is queued.
+        Jobs over the time or output budget are rejected, long ones get a warning.
+
+        :param interaction: Interaction the job belongs to, None for API jobs
+        :param lua_code: Code to obfuscate
+        :param bitkey: Selected obfuscation methods
+        :param optional_preset: Selected preset
+        :return: (True, lane) if the job may run, (False, reason) if not
+        """
+        estimate = await Hercules.estimate_async(lua_code, bitkey, optional_preset)
+        if not estimate:
+            return True, Functions.get_lane(len(lua_code.encode('utf-8', errors='surrogatepass')))
+        program_logger.debug(f"Job estimate: {estimate.seconds:.1f}s, {estimate.output_bytes / 1024:.0f}KB")
+
+        if estimate.seconds > JOB_MAX_SECONDS or estimate.output_bytes > JOB_MAX_OUTPUT_MB * 1024 * 1024:
+            return False, (f"This job is estimated to take about {estimate.seconds:.0f} seconds and produce {estimate.output_bytes / 1024 / 1024:.1f} MB, "
+                           f"which is over the limit ({JOB_MAX_SECONDS:.0f} seconds, {JOB_MAX_OUTPUT_MB} MB).\n"
+                           "Please select fewer methods, a lighter preset or a smaller file.")
+        if estimate.seconds > JOB_WARN_SECONDS and interaction:
+            await interaction.followup.send(f"This job is estimated to take about {estimate.seconds:.0f} seconds. It will run in the slow lane.", ephemeral=True)
+        return True, Functions.get_lane(0, estimate)
+
+    async def validate(lua_code: str) -> Tuple[bool, str]:
+        """
+        Validates code in this process or, if a job queue is configured, on a worker.
+
+        :param lua_code: Code to validate
+        :return: Validity and luacheck output
+        """
+        if not job_queue:
+            return await Hercules.isValidLUASyntax_async(lua_code)
+        result = await Functions.run_queued('validate', lua_code, 0, None, 'fast')
+        return result.success, result.conout
+
+    async def obfuscate(lua_code: str, bitkey: int, optional_preset: Optional[str], lane: str = 'slow') -> Tuple[bool, str, Optional[bytes]]:
+        """
+        Obfuscates code in this process or, if a job queue is configured, on a worker.
+
+        :param lua_code: Code to obfuscate
+        :param bitkey: Selected obfuscation methods
+        :param optional_preset: Selected preset
+        :param lane: Lane of the job, workers take fast jobs first
+        :return: Success, console output and obfuscated code
+        :raises limits.ResourceLimitExceeded: If the obfuscator breached its resource limits
+        """
+        if not job_queue:
+            return await Hercules.obfuscate_code_async(lua_code, bitkey, optional_preset)
+        result = await Functions.run_queued('obfuscate', lua_code, bitkey, optional_preset, lane)
+        if result.limit:
+            raise limits.ResourceLimitExceeded(result.limit, result.conout.encode())
+        return result.success, result.conout, result.output
+
+    async def run_queued(kind: str, lua_code: str, bitkey: int, optional_preset: Optional[str], lane: str) -> jobqueue.JobResult:
+        """
+        Submits a job to the job queue and waits for a worker to finish it.
+
+        :param kind: 'validate' or 'obfuscate'
+        :param lua_code: Code of the job
+        :param bitkey: Selected obfuscation methods
+        :param optional_preset: Selected preset
+        :param lane: Lane of the job
+        :return: The result of the job
+        """
+        source = lua_code.encode('utf-8', errors='surrogatepass')
+        try:
+            job_id = await asyncio.to_thread(job_queue.submit, kind, source, bitkey, optional_preset, lane)
+            with tracing.span(f'queued_{kind}'):
+                result = await job_queue.wait(job_id, timeout=JOB_QUEUE_TIMEOUT)
+        except jobqueue.QueueError as e:
+            program_logger.error(f"Job queue error: {e}")
+            return jobqueue.JobResult(False, "The job queue is not available. Please try again later.", None, None)
+        if result is None:
+            program_logger.warning(f"No worker finished {kind} job {job_id} within {JOB_QUEUE_TIMEOUT:.0f} seconds.")
+            return jobqueue.JobResult(False, "No worker finished the job in time. Please try again later.", None, None)
+        return result
+
+    async def run_api_job(source: Optional[str], url: Optional[str], bitkey: int, optional_preset: Optional[str],
+                          on_start: Callable[[], None]) -> Tuple[bool, str, Optional[bytes]]:
+        """
+        Runs a job submitted through the job API like the obfuscate commands: download, validation, admission and
+        obfuscation, all through the job scheduler.
+
+        :param source: Code to obfuscate, or None
+        :param url: URL to fetch the code from, or None
+        :param bitkey: Selected obfuscation methods
+        :param optional_preset: Selected preset
+        :param on_start: Called once the scheduler starts the job
+        :return: Success, console output and obfuscated code
+        """
+        async def __check() -> Tuple[bool, str]:
+            on_start()
+            if url is None:
+                return await Functions.validate(source)
+            with tracing.span('fetch'):
+                return await Functions.is_valid_url_and_lua_syntax(url)
+
+        valid, conout = await job_scheduler.run(__check, API_USER_ID, None, 'fast')
+        if not valid:
+            return False, conout, None
+        if url is not None:
+            source = conout
+
+        admitted, lane = await Functions.admit_job(None, source, bitkey, optional_preset)
+        if not admitted:
+            return False, lane, None
+        return await job_scheduler.run(lambda: Functions.obfuscate(source, bitkey, optional_preset, lane), API_USER_ID, None, lane)
+
+    async def read_batch(attachments: list[discord.Attachment]) -> Tuple[list[Tuple[str, str]], list[str]]:
+        """
+        Downloads and decodes the attachments of a batch. Zip archives are unpacked in memory.
+        The batch limits are checked as files are added, so reading stops at the first file that exceeds them.
+
+        :param attachments: The .lua and .zip attachments
+        :return: The (path, code) tuples and the problems with single files
+        :raises batch.BatchError: If the batch is too big or an archive is broken
+        """
+        files, problems, taken = [], [], set()
+        total, downloaded = 0, 0
+        for attachment in attachments:
+            name = attachment.filename
+            if name.lower().endswith('.zip'):
+                if downloaded + attachment.size > BATCH_MAX_BYTES:
+                    raise batch.BatchError(f"The attachments are bigger than {BATCH_MAX_BYTES // 1024 // 1024} MB in total.")
+                with tracing.stage('download'):
+                    data = await attachment.read()
+                downloaded += len(data)
+                entries, archive_problems = await asyncio.to_thread(batch.extract_lua_files, data, BATCH_MAX_FILES, BATCH_MAX_BYTES, MAX_FILE_BYTES, len(files), total)
+                problems += [f"{name}: {problem}" for problem in archive_problems]
+            elif name.lower().endswith('.lua'):
+                if attachment.size > MAX_FILE_BYTES:
+                    problems.append(f"{name}: bigger than {MAX_FILE_BYTES // 1024 // 1024} MB, skipped")
+                    continue
+                if len(files) >= BATCH_MAX_FILES:
+                    raise batch.BatchError(f"The batch contains more than {BATCH_MAX_FILES} Lua files.")
+                if total + attachment.size > BATCH_MAX_BYTES:
+                    raise batch.BatchError(f"The Lua files are bigger than {BATCH_MAX_BYTES // 1024 // 1024} MB in total.")
+                with tracing.stage('download'):
+                    entries = [(name, await attachment.read())]
+                downloaded += len(entries[0][1])
+            else:
+                problems.append(f"{name}: not a .lua or .zip file, skipped")
+                continue
+            files += [(batch.unique_path(path, taken), raw) for path, raw in entries]
+            total += sum(len(raw) for _, raw in entries)
+
+        with tracing.stage('decode'):
+            decoded = await asyncio.to_thread(lambda: [(path, ingest.decode_source(raw)) for path, raw in files])
+        return decoded, problems
+
+    async def is_valid_url_and_lua_syntax(url: str, interaction: Optional[discord.Interaction] = None) -> Tuple[bool, str]:
         url = unquote(url)
 
         url_pattern = re.compile(
@@ -356,44 +685,58 @@ class Functions():
             return False, "Invalid URL."
 
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.head(url) as response:
-                    if response.status not in [200, 204, 301, 302]:
-                        return False, f"HTTP Error: {response.status}"
-                    if int(response.headers.get('Content-Length', 0)) > 5 * 1024 * 1024:
-                        return False, "File is too big. (Max: 5MB)"
-
-                async with session.get(url) as response:
-                    if response.status not in [200, 204, 301, 302]:
-                        return False, f"HTTP Error: {response.status}"
-                    lua_code = await response.text()
-                    isValid, conout = Hercules.isValidLUASyntax(lua_code)
-                    if isValid:
-                        return True, lua_code
-                    else:
-                        return False, conout
-        except aiohttp.ClientError as e:
+            with tracing.stage('download'):
+                status, body, charset = await http_client.fetch(url)
+        except httpclient.DownloadTooLarge:
+            return False, "File is too big. (Max: 5MB)"
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             program_logger.error(f"Error fetching URL: {e}")
             return False, "URL not reachable."
+        if status not in [200, 204, 301, 302]:
+            return False, f"HTTP Error: {status}"
+
+        with tracing.stage('decode'):
+            lua_code = ingest.decode_source(body, charset)
+        if interaction:
+            isValid, conout = await Functions.schedule(interaction, lambda: Functions.validate(lua_code), 'fast')
+        else:
+            isValid, conout = await Functions.validate(lua_code)
+        if isValid:
+            return True, lua_code
+        else:
+            return False, conout
 
-    async def send_file(interaction: discord.Interaction, file_path: str):
+    async def send_file(interaction: discord.Interaction, data: bytes, filename: str, note: Optional[str] = None):
+        """
+        Sends an obfuscation result. Results above the upload limit of the channel are compressed in a thread,
+        and split into a multi-part archive if they are still too big.
+
+        :param interaction: The interaction to respond to.
+        :param data: The obfuscated code.
+        :param filename: Name of the file.
+        :param note: Optional line added to the message.
+        """
+        parts = await asyncio.to_thread(delivery.prepare, filename, data, delivery.upload_limit(interaction.guild),
+                                        DELIVERY_COMPRESSION, DELIVERY_COMPRESSION_LEVEL)
+        if len(parts) > DELIVERY_MAX_PARTS:
+            await interaction.followup.send(f"{interaction.user.mention}\nObfuscation complete! The file is too big to be sent directly.", ephemeral=True)
+            return
+
+        content = f"{interaction.user.mention}\nObfuscation complete!"
+        if note:
+            content += f"\n{note}"
+        if len(parts) > 1:
+            archive_name = parts[0][0].rsplit('.', 1)[0]
+            content += f"\nThe result was split into {len(parts)} parts. Join them in order to get `{archive_name}`, e.g. with `cat {archive_name}.* > {archive_name}`."
         try:
-            await interaction.followup.send(f"{interaction.user.mention}\nObfuscation complete!", file=discord.File(file_path), ephemeral=True)
+            with tracing.stage('upload'):
+                for index, (part_name, part) in enumerate(parts):
+                    await interaction.followup.send(content if index == 0 else None, file=discord.File(io.BytesIO(part), filename=part_name), ephemeral=True)
         except discord.HTTPException as err:
             if err.status == 413:
-                zip_file = f'{BUFFER_FOLDER}{interaction.user.id}_{randrange(0, 9999)}.zip'
-                with ZipFile(zip_file, mode='w', compression=ZIP_DEFLATED, compresslevel=9, allowZip64=True) as f:
-                    f.write(file_path)
-                try:
-                    await interaction.followup.send(f"{interaction.user.mention}\nObfuscation complete!", file=discord.File(zip_file), ephemeral=True)
-                except discord.HTTPException as err:
-                    if err.status == 413:
-                        await interaction.followup.send(f"{interaction.user.mention}\nObfuscation complete! The file is too big to be sent directly.")
-        finally:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-            if 'zip_file' in locals() and os.path.exists(zip_file):
-                os.remove(zip_file)
+                await interaction.followup.send(f"{interaction.user.mention}\nObfuscation complete! The file is too big to be sent directly.", ephemeral=True)
+            else:
+                raise
 
     async def create_support_invite(interaction):
         try:
@@ -432,43 +775,31 @@ class Functions():
                 continue
         return "Could not create invite. There is either no text-channel, or I don't have the rights to create an invite."
 
-    async def send_debug_files(interaction: discord.Interaction, error_text: str, original_code: str) -> bool:
-        temp_file_path = ''
-        to_send = None
-        file_url = os.path.abspath(f'{BUFFER_FOLDER}{interaction.user.id}_url.lua')
-        file_file = os.path.abspath(f'{BUFFER_FOLDER}{interaction.user.id}_file.lua')
-
-        if os.path.exists(file_url):
-            to_send = file_url
-        elif os.path.exists(file_file):
-            to_send = file_file
-        else:
-            return False
+    async def send_debug_files(interaction: discord.Interaction, error_text: str, original_code: str, output: Optional[bytes]) -> bool:
+        channel: discord.TextChannel = await Functions.get_or_fetch('channel', DEBUG_CHANNEL_ID)
 
-        with tempfile.NamedTemporaryFile(suffix=".lua", delete=False, encoding='utf-8', mode='w') as original_temp:
-            original_temp.write(original_code)
-            orig_file_path = original_temp.name
+        with scratch.JobScratch(BUFFER_FOLDER) as job:
+            files = [discord.File(job.write_text('Input.lua', original_code)),
+                     discord.File(job.write_bytes('Output.lua', output if output is not None else original_code.encode('utf-8')))]
+            try:
+                if len(error_text) > 1900:
+                    files.insert(0, discord.File(job.write_text('ErrorMessage.txt', error_text)))
+                    await channel.send(content=f"A error appeared during/after obfuscation, executed by {interaction.user.mention}.:\n", files=files)
+                    return True
+                else:
+                    await channel.send(content=f"A error appeared during/after obfuscation, executed by {interaction.user.mention}.:\n```txt\n{error_text}```", files=files)
+                    return True
+            except discord.errors.DiscordException as e:
+                program_logger.error(f'Error while sending debug files -> {e}')
+                return False
 
-        channel: discord.TextChannel = await Functions.get_or_fetch('channel', DEBUG_CHANNEL_ID)
 
-        try:
-            if len(error_text) > 1900:
-                with tempfile.NamedTemporaryFile(suffix=".txt", delete=False, encoding='utf-8', mode='w') as temp_file:
-                    temp_file.write(error_text)
-                    temp_file_path = temp_file.name
-                await channel.send(content=f"A error appeared during/after obfuscation, executed by {interaction.user.mention}.:\n", files=[discord.File(temp_file_path, filename='ErrorMessage.txt'), discord.File(orig_file_path, filename='Input.lua'), discord.File(to_send, filename='Output.lua')])
-                return True
-            else:
-                await channel.send(content=f"A error appeared during/after obfuscation, executed by {interaction.user.mention}.:\n```txt\n{error_text}```", files=[discord.File(orig_file_path, filename='Input.lua'), discord.File(to_send, filename='Output.lua')])
-                return True
-        except discord.errors.DiscordException as e:
-            program_logger.error(f'Error while sending debug files -> {e}')
-            return False
-        finally:
-            os.remove(orig_file_path)
-            os.remove(to_send)
-            if os.path.exists(temp_file_path):
-                os.remove(temp_file_path)
+#Job API
+API_USER_ID = 0
+job_api = jobapi.JobApi(program_logger, API_TOKEN, Functions.run_api_job, Hercules.methods,
+                        max_pending=API_MAX_PENDING,
+                        store=jobapi.JobStore(ttl=API_RESULT_TTL)
+                        ) if API_TOKEN else None
 
 
 ##Owner Commands
@@ -477,6 +808,7 @@ class Owner():
         async def __wrong_selection():
             await message.channel.send('```'
                                        'log [current/folder/lines] (Replace lines with a positive number, if you only want lines.) - Get the log\n'
+                                       'log folder [hours] (Only logs modified in the last X hours.)\n'
                                        '```')
         if not args:
             await __wrong_selection()
@@ -485,35 +817,38 @@ class Owner():
         command = args[0]
         if command == 'current':
             log_file_path = f'{LOG_FOLDER}{BOT_NAME}.log'
-            try:
+            if os.path.getsize(log_file_path) <= delivery.upload_limit(message.guild):
                 await message.channel.send(file=discord.File(log_file_path))
-            except discord.HTTPException as err:
-                if err.status == 413:
-                    zip_path = f'{BUFFER_FOLDER}Logs.zip'
-                    with ZipFile(zip_path, mode='w', compression=ZIP_DEFLATED, compresslevel=9, allowZip64=True) as zip_file:
-                        zip_file.write(log_file_path)
-                    try:
-                        await message.channel.send(file=discord.File(zip_path))
-                    except discord.HTTPException as err:
-                        if err.status == 413:
-                            await message.channel.send("The log is too big to be sent directly.\nYou have to look at the log in your server (VPS).")
-                    os.remove(zip_path)
+                return
+            with scratch.JobScratch(BUFFER_FOLDER) as job:
+                zip_path = job.file('Logs.zip')
+                await asyncio.to_thread(logtools.archive, LOG_FOLDER, zip_path, level=LOG_ARCHIVE_LEVEL, names=[f'{BOT_NAME}.log'])
+                try:
+                    await message.channel.send(file=discord.File(zip_path))
+                except discord.HTTPException as err:
+                    if err.status == 413:
+                        await message.channel.send("The log is too big to be sent directly.\nYou have to look at the log in your server (VPS).")
             return
 
         if command == 'folder':
-            zip_path = f'{BUFFER_FOLDER}Logs.zip'
-            if os.path.exists(zip_path):
-                os.remove(zip_path)
-            with ZipFile(zip_path, mode='w', compression=ZIP_DEFLATED, compresslevel=9, allowZip64=True) as zip_file:
-                for file in os.listdir(LOG_FOLDER):
-                    if not file.endswith(".zip"):
-                        zip_file.write(f'{LOG_FOLDER}{file}')
-            try:
-                await message.channel.send(file=discord.File(zip_path))
-            except discord.HTTPException as err:
-                if err.status == 413:
-                    await message.channel.send("The folder is too big to be sent directly.\nPlease get the current file or the last X lines.")
-            os.remove(zip_path)
+            since = None
+            if len(args) > 1:
+                try:
+                    since = logtools.since_hours(float(args[1]))
+                except ValueError:
+                    await __wrong_selection()
+                    return
+            with scratch.JobScratch(BUFFER_FOLDER) as job:
+                zip_path = job.file('Logs.zip')
+                count = await asyncio.to_thread(logtools.archive, LOG_FOLDER, zip_path, since=since, level=LOG_ARCHIVE_LEVEL)
+                if count == 0:
+                    await message.channel.send("No logs in this time range.")
+                    return
+                try:
+                    await message.channel.send(file=discord.File(zip_path))
+                except discord.HTTPException as err:
+                    if err.status == 413:
+                        await message.channel.send("The folder is too big to be sent directly.\nPlease get the current file, the last X lines or a shorter time range.")
             return
 
         try:
@@ -526,13 +861,10 @@ class Owner():
             return
 
         log_file_path = f'{LOG_FOLDER}{BOT_NAME}.log'
-        buffer_file_path = f'{BUFFER_FOLDER}log-lines.txt'
-        with open(log_file_path, 'r', encoding='utf8') as log_file:
-            log_lines = log_file.readlines()[-lines:]
-        with open(buffer_file_path, 'w', encoding='utf8') as buffer_file:
-            buffer_file.writelines(log_lines)
-        await message.channel.send(content=f'Here are the last {len(log_lines)} lines of the current logfile:', file=discord.File(buffer_file_path))
-        os.remove(buffer_file_path)
+        log_lines = await asyncio.to_thread(logtools.tail, log_file_path, lines)
+        with scratch.JobScratch(BUFFER_FOLDER) as job:
+            buffer_file_path = job.write_text('log-lines.txt', ''.join(log_lines))
+            await message.channel.send(content=f'Here are the last {len(log_lines)} lines of the current logfile:', file=discord.File(buffer_file_path))
 
     async def activity(message, args):
         async def __wrong_selection():
@@ -560,8 +892,7 @@ class Owner():
         title = ' '.join(args[1:])
         program_logger.debug(title)
         program_logger.debug(url)
-        with open(ACTIVITY_FILE, 'r', encoding='utf8') as f:
-            data = json.load(f)
+        data = {}
         if action == 'playing':
             data['activity_type'] = 'Playing'
             data['activity_title'] = title
@@ -585,8 +916,7 @@ class Owner():
         else:
             await __wrong_selection()
             return
-        with open(ACTIVITY_FILE, 'w', encoding='utf8') as f:
-            json.dump(data, f, indent=2)
+        activity_store.update(**data)
         await bot.change_presence(activity = bot.Presence.get_activity(), status = bot.Presence.get_status())
         await message.channel.send(f'Activity set to {action} {title}{" " + url if url else ""}.')
 
@@ -600,8 +930,7 @@ class Owner():
             await __wrong_selection()
             return
         action = args[0].lower()
-        with open(ACTIVITY_FILE, 'r', encoding='utf8') as f:
-            data = json.load(f)
+        data = {}
         if action == 'online':
             data['status'] = 'online'
         elif action == 'idle':
@@ -613,8 +942,7 @@ class Owner():
         else:
             await __wrong_selection()
             return
-        with open(ACTIVITY_FILE, 'w', encoding='utf8') as f:
-            json.dump(data, f, indent=2)
+        activity_store.update(**data)
         await bot.change_presence(activity = bot.Presence.get_activity(), status = bot.Presence.get_status())
         await message.channel.send(f'Status set to {action}.')
 
@@ -634,6 +962,14 @@ class Owner():
         await asyncio.gather(*tasks, return_exceptions=True)
 
         bot.stats.stop_stats_update()
+        await Hercules.stop_worker_pool()
+        await Hercules.stop_luacheck_daemon()
+        if job_queue:
+            job_queue.close()
+        if job_api:
+            await job_api.stop()
+        await http_client.stop()
+        loop_watchdog.stop()
 
         await bot.close()
 
@@ -710,6 +1046,9 @@ async def cmd_help(interaction: discord.Interaction):
     commands_help = (
         "**/obfuscate_url [url]**:\nSubmit a URL (e.g. from pastebin) containing a Lua file. Hercules will process and obfuscate it.\n\n"
         "**/obfuscate_file [file]**:\nUpload a `.lua` file along with this command. Hercules will add it to the queue and notify you once it's done.\n\n"
+        f"**/obfuscate_batch [file1] ... [file10]**:\nUpload up to 10 `.lua` files or `.zip` archives of a Lua project. Batches may contain up to {BATCH_MAX_FILES} Lua files "
+        f"of at most {MAX_FILE_BYTES // 1024 // 1024} MB each and {BATCH_MAX_BYTES // 1024 // 1024} MB in total. You get back one `.zip` with the obfuscated files "
+        f"and an `{batch.REPORT_NAME}` listing the files that failed.\n\n"
         "**/check_url [url]**:\nCheck if a URL (e.g. from pastebin) contains valid Lua syntax.\n\n"
         "**/check_file [file]**:\nUpload a `.lua` file along with this command to check if it contains valid Lua syntax.\n\n\n"
     )
@@ -815,6 +1154,7 @@ class AskSendDebug(discord.ui.View):
         self.message: discord.Message = None
         self.error_text: str = None
         self.original_code: str
+        self.output: Optional[bytes] = None
         self.answered = False
 
     @discord.ui.button(label='Yes', style=discord.ButtonStyle.success)
@@ -826,7 +1166,7 @@ class AskSendDebug(discord.ui.View):
 
         await interaction.response.edit_message(content='Sending...', view=self)
 
-        success = await Functions.send_debug_files(interaction, error_text=self.error_text, original_code=self.original_code)
+        success = await Functions.send_debug_files(interaction, error_text=self.error_text, original_code=self.original_code, output=self.output)
 
         if success:
             await interaction.edit_original_response(content="Debug files sent successfully.", view=self)
@@ -867,21 +1207,19 @@ class AskSendDebug(discord.ui.View):
         discord.app_commands.Choice(name='Maximum parameters for heavier obfuscation.', value='max')
         ]
     )
+@tracing.job('obfuscate_url')
 async def cmd_obfuscate_url(interaction: discord.Interaction,
                url: str,
                optional_preset: str = None
                ):
     await interaction.response.defer(ephemeral=True)
-    valid, conout = await Functions.is_valid_url_and_lua_syntax(url)
+    valid, conout = await Functions.is_valid_url_and_lua_syntax(url, interaction)
     if not valid:
         # Check if output exceeds Discord's character limit (adding some margin for the message text and markdown)
         if len(conout) > 1900:
-            with tempfile.NamedTemporaryFile(suffix=".txt", delete=False, encoding='utf-8', mode='w') as temp_file:
-                temp_file.write(conout)
-                temp_file_path = temp_file.name
             await interaction.edit_original_response(content="The URL is not reachable or does not contain valid Lua syntax.")
-            await interaction.followup.send(content="Details:", file=discord.File(temp_file_path, filename='error_output.txt'), ephemeral=True)
-            os.remove(temp_file_path)
+            with scratch.JobScratch(BUFFER_FOLDER) as job:
+                await interaction.followup.send(content="Details:", file=discord.File(job.write_text('error_output.txt', conout)), ephemeral=True)
         else:
             await interaction.edit_original_response(content=f"The URL is not reachable or does not contain valid Lua syntax.:\n```txt\n{conout}```")
         return
@@ -894,27 +1232,34 @@ async def cmd_obfuscate_url(interaction: discord.Interaction,
         await view.wait()
         selected_bits = view.selected_bits
 
-        file_path = os.path.abspath(f'{BUFFER_FOLDER}{interaction.user.id}_url.lua')
-        with open(file_path, 'w', encoding='utf8') as f:
-            f.write(conout)
-
-        success, conout = Hercules.obfuscate(file_path, selected_bits, optional_preset)
+        admitted, lane = await Functions.admit_job(interaction, original_code, selected_bits, optional_preset)
+        if not admitted:
+            await interaction.edit_original_response(content=lane, view=None)
+            return
+        try:
+            success, conout, output = await Functions.schedule(interaction,
+                                                               lambda: Functions.obfuscate(original_code, selected_bits, optional_preset, lane),
+                                                               lane
+                                                               )
+        except limits.ResourceLimitExceeded as e:
+            tracing.mark_failed()
+            await interaction.edit_original_response(content=Functions.limit_message(e), view=None)
+            return
         if not success:
+            tracing.mark_failed()
             view = AskSendDebug()
 
-            with tempfile.NamedTemporaryFile(suffix=".txt", delete=False, encoding='utf-8', mode='w') as temp_file:
-                temp_file.write(conout)
-                temp_file_path = temp_file.name
-
-            message = await interaction.followup.send(f"{interaction.user.mention}\nObfuscation failed. Please try again.\nSend the original file to the owner for debug?", file=discord.File(temp_file_path, filename='Error.txt'), view=view, ephemeral=True)
+            with scratch.JobScratch(BUFFER_FOLDER) as job:
+                message = await interaction.followup.send(f"{interaction.user.mention}\nObfuscation failed. Please try again.\nSend the original file to the owner for debug?", file=discord.File(job.write_text('Error.txt', conout)), view=view, ephemeral=True)
             await interaction.delete_original_response()
             view.message = message
             view.error_text = conout
             view.original_code = original_code
+            view.output = output
             await view.wait()
-            os.remove(temp_file_path)
         else:
-            await Functions.send_file(interaction, file_path)
+            filename = os.path.basename(urlparse(url).path) or 'obfuscated.lua'
+            await Functions.send_file(interaction, output, filename if filename.endswith('.lua') else f'{filename}.lua')
 
 
 #Fetch file from upload
@@ -930,6 +1275,7 @@ async def cmd_obfuscate_url(interaction: discord.Interaction,
         discord.app_commands.Choice(name='Maximum parameters for heavier obfuscation.', value='max')
         ]
     )
+@tracing.job('obfuscate_file')
 async def cmd_obfuscate_file(interaction: discord.Interaction,
              file: discord.Attachment,
    optional_preset: str = None
@@ -938,69 +1284,21 @@ async def cmd_obfuscate_file(interaction: discord.Interaction,
     if not file.filename.endswith('.lua'):
         await interaction.edit_original_response(content="Please upload a `.lua` file.")
         return
-    if file.size > 1024 * 1024 * 5:
+    if file.size > MAX_FILE_BYTES:
         await interaction.edit_original_response(content="The file is too big. Please upload a file smaller than 5 MB.")
         return
 
-    file_path = os.path.abspath(f'{BUFFER_FOLDER}{interaction.user.id}_file.lua')
-    with open(file_path, 'wb') as f:
-        f.write(await file.read())
-
-    def detect_bom_encoding(file_path):
-        with open(file_path, 'rb') as f:
-            raw = f.read(4)
-        if raw.startswith(b'\xef\xbb\xbf'):
-            return 'utf-8-sig'
-        elif raw.startswith(b'\xff\xfe'):
-            return 'utf-16-le'
-        elif raw.startswith(b'\xfe\xff'):
-            return 'utf-16-be'
-        elif raw.startswith(b'\xff\xfe\x00\x00'):
-            return 'utf-32-le'
-        elif raw.startswith(b'\x00\x00\xfe\xff'):
-            return 'utf-32-be'
-        return None
-
-    encoding = detect_bom_encoding(file_path)
-    if encoding:
-        with open(file_path, 'r', encoding=encoding) as f:
-            lua_code = f.read()
-        with open(file_path, 'w', encoding='utf8') as f:
-            f.write(lua_code)
-    else:
-        try:
-            with open(file_path, 'r', encoding='utf8') as f:
-                lua_code = f.read()
-        except UnicodeDecodeError:
-            for fallback_encoding in ['cp1252', 'latin-1']:
-                try:
-                    with open(file_path, 'r', encoding=fallback_encoding) as f:
-                        lua_code = f.read()
-                    with open(file_path, 'w', encoding='utf8') as f:
-                        f.write(lua_code)
-                    break
-                except UnicodeDecodeError:
-                    continue
-            else:
-                with open(file_path, 'rb') as f:
-                    raw = f.read()
-                lua_code = raw.decode('utf-8', errors='replace')
-                with open(file_path, 'w', encoding='utf8') as f:
-                    f.write(lua_code)
+    lua_code = await ingest.read_attachment(file)
 
-    isValid, conout = Hercules.isValidLUASyntax(lua_code)
+    isValid, conout = await Functions.schedule(interaction, lambda: Functions.validate(lua_code), 'fast')
     if not isValid:
         # Check if output exceeds Discord's character limit (adding some margin for the message text and markdown)
         if len(conout) > 1900:
-            with tempfile.NamedTemporaryFile(suffix=".txt", delete=False, encoding='utf-8', mode='w') as temp_file:
-                temp_file.write(conout)
-                temp_file_path = temp_file.name
             await interaction.edit_original_response(content="The uploaded file does not contain valid Lua syntax.")
-            await interaction.followup.send(content="Luacheck output:", file=discord.File(temp_file_path, filename='luacheck_output.txt'), ephemeral=True)
-            os.remove(temp_file_path)
+            with scratch.JobScratch(BUFFER_FOLDER) as job:
+                await interaction.followup.send(content="Luacheck output:", file=discord.File(job.write_text('luacheck_output.txt', conout)), ephemeral=True)
         else:
             await interaction.edit_original_response(content=f"The uploaded file does not contain valid Lua syntax.:\n```txt\n{conout}```")
-        os.remove(file_path)
     else:
         view = ModeSelectionView()
         await interaction.edit_original_response(content=f"Please select the obfuscation methods you want to use for {file.filename}.", view=view)
@@ -1008,38 +1306,139 @@ async def cmd_obfuscate_file(interaction: discord.Interaction,
 
         selected_bits = view.selected_bits
 
-        success, conout = Hercules.obfuscate(file_path, selected_bits, optional_preset)
+        admitted, lane = await Functions.admit_job(interaction, lua_code, selected_bits, optional_preset)
+        if not admitted:
+            await interaction.edit_original_response(content=lane, view=None)
+            return
+        try:
+            success, conout, output = await Functions.schedule(interaction,
+                                                               lambda: Functions.obfuscate(lua_code, selected_bits, optional_preset, lane),
+                                                               lane
+                                                               )
+        except limits.ResourceLimitExceeded as e:
+            tracing.mark_failed()
+            await interaction.edit_original_response(content=Functions.limit_message(e), view=None)
+            return
         if not success:
+            tracing.mark_failed()
             view = AskSendDebug()
 
-            with tempfile.NamedTemporaryFile(suffix=".txt", delete=False, encoding='utf-8', mode='w') as temp_file:
-                temp_file.write(conout)
-                temp_file_path = temp_file.name
-
-            message = await interaction.followup.send(f"{interaction.user.mention}\nObfuscation failed. Please try again.\nSend the original file to the owner for debug?", file=discord.File(temp_file_path, filename='Error.txt'), view=view, ephemeral=True)
+            with scratch.JobScratch(BUFFER_FOLDER) as job:
+                message = await interaction.followup.send(f"{interaction.user.mention}\nObfuscation failed. Please try again.\nSend the original file to the owner for debug?", file=discord.File(job.write_text('Error.txt', conout)), view=view, ephemeral=True)
             await interaction.delete_original_response()
             view.message = message
             view.error_text = conout
             view.original_code = lua_code
+            view.output = output
             await view.wait()
-            os.remove(temp_file_path)
         else:
-            await Functions.send_file(interaction, file_path)
+            await Functions.send_file(interaction, output, file.filename)
+
+
+#Fetch files from uploads
+@tree.command(name = 'obfuscate_batch', description = 'Upload several Lua files or a .zip of a Lua project.')
+@discord.app_commands.checks.cooldown(1, 60, key=lambda i: (i.user.id))
+@discord.app_commands.describe(file1 = 'A .lua file or a .zip of a Lua project.',
+                               optional_preset = 'Optional presets that can be used.',
+                               **{f'file{number}': 'Another .lua or .zip file.' for number in range(2, 11)}
+                               )
+@discord.app_commands.choices(
+    optional_preset = [
+        discord.app_commands.Choice(name='Minimal parameters for lighter obfuscation.', value='min'),
+        discord.app_commands.Choice(name='Moderate parameters for balanced obfuscation.', value='mid'),
+        discord.app_commands.Choice(name='Maximum parameters for heavier obfuscation.', value='max')
+        ]
+    )
+@tracing.job('obfuscate_batch')
+async def cmd_obfuscate_batch(interaction: discord.Interaction,
+              file1: discord.Attachment,
+              optional_preset: str = None,
+              file2: discord.Attachment = None,
+              file3: discord.Attachment = None,
+              file4: discord.Attachment = None,
+              file5: discord.Attachment = None,
+              file6: discord.Attachment = None,
+              file7: discord.Attachment = None,
+              file8: discord.Attachment = None,
+              file9: discord.Attachment = None,
+              file10: discord.Attachment = None
+              ):
+    await interaction.response.defer(ephemeral=True)
+    attachments = [file for file in (file1, file2, file3, file4, file5, file6, file7, file8, file9, file10) if file]
+    try:
+        files, problems = await Functions.read_batch(attachments)
+    except batch.BatchError as e:
+        await interaction.edit_original_response(content=str(e))
+        return
+    if not files:
+        await interaction.edit_original_response(content="No Lua files found. Please upload `.lua` files or a `.zip` containing them.")
+        return
+
+    view = ModeSelectionView()
+    await interaction.edit_original_response(content=f"Please select the obfuscation methods you want to use for {len(files)} files.", view=view)
+    await view.wait()
+    selected_bits = view.selected_bits
+    await interaction.edit_original_response(content=f"Processing {len(files)} files...", view=None)
+
+    semaphore = asyncio.Semaphore(BATCH_PARALLEL)
+    progress = {'done': 0, 'shown': 0.0}
+
+    async def __process(path: str, lua_code: str) -> Tuple[str, Optional[bytes], Optional[str]]:
+        async with semaphore:
+            try:
+                valid, conout = await job_scheduler.run(lambda: Functions.validate(lua_code), interaction.user.id, interaction.guild_id, 'fast')
+                if not valid:
+                    return path, None, conout
+                admitted, lane = await Functions.admit_job(None, lua_code, selected_bits, optional_preset)
+                if not admitted:
+                    return path, None, lane
+                success, conout, output = await job_scheduler.run(lambda: Functions.obfuscate(lua_code, selected_bits, optional_preset, lane),
+                                                                  interaction.user.id, interaction.guild_id, lane)
+                return (path, output, None) if success else (path, None, conout)
+            except limits.ResourceLimitExceeded as e:
+                return path, None, str(e)
+            finally:
+                progress['done'] += 1
+                if time.monotonic() - progress['shown'] > 2:
+                    progress['shown'] = time.monotonic()
+                    try:
+                        await interaction.edit_original_response(content=f"Processed {progress['done']}/{len(files)} files...")
+                    except discord.HTTPException:
+                        pass
+
+    results = await asyncio.gather(*(__process(path, lua_code) for path, lua_code in files))
+    outputs = [(path, output) for path, output, _ in results if output is not None]
+    errors = [(path, error) for path, output, error in results if output is None]
+    report = batch.build_report(errors, problems) if errors or problems else None
+    await interaction.edit_original_response(content=f"Processed {len(files)}/{len(files)} files.")
+
+    if not outputs:
+        tracing.mark_failed()
+        with scratch.JobScratch(BUFFER_FOLDER) as job:
+            await interaction.followup.send(f"{interaction.user.mention}\nNone of the files could be obfuscated.", file=discord.File(job.write_text(batch.REPORT_NAME, report)), ephemeral=True)
+        return
+    if errors:
+        tracing.mark_failed()
+
+    entries = outputs + ([(batch.REPORT_NAME, report.encode('utf-8'))] if report else [])
+    archive = await asyncio.to_thread(delivery.pack, entries, DELIVERY_COMPRESSION, DELIVERY_COMPRESSION_LEVEL)
+    note = f"{len(outputs)}/{len(files)} files obfuscated."
+    if report:
+        note += f" See `{batch.REPORT_NAME}` in the archive for the files that failed or were skipped."
+    await Functions.send_file(interaction, archive, 'obfuscated.zip', note)
 
 
 #Errorcheck from url
 @tree.command(name = 'check_url', description = 'Check if the URL is reachable and contains valid Lua syntax.')
 @discord.app_commands.checks.cooldown(2, 60, key=lambda i: (i.user.id))
 @discord.app_commands.describe(url = 'The URL to check.')
+@tracing.job('check_url')
 async def cmd_check_url(interaction: discord.Interaction, url: str):
     await interaction.response.defer(ephemeral=True)
-    valid, conout = await Functions.is_valid_url_and_lua_syntax(url)
+    valid, conout = await Functions.is_valid_url_and_lua_syntax(url, interaction)
     if not valid:
-        with tempfile.NamedTemporaryFile(suffix=".txt", delete=False, encoding='utf-8', mode='w') as temp_file:
-            temp_file.write(conout)
-            temp_file_path = temp_file.name
-        await interaction.followup.send(content=f"The URL is not reachable or does not contain valid Lua syntax.", file=discord.File(temp_file_path))
-        os.remove(temp_file_path)
+        with scratch.JobScratch(BUFFER_FOLDER) as job:
+            await interaction.followup.send(content=f"The URL is not reachable or does not contain valid Lua syntax.", file=discord.File(job.write_text('luacheck_output.txt', conout)))
     else:
         await interaction.followup.send(content="The URL is reachable and contains valid Lua syntax.")
 
@@ -1048,32 +1447,24 @@ async def cmd_check_url(interaction: discord.Interaction, url: str):
 @tree.command(name = 'check_file', description = 'Check if the uploaded file contains valid Lua syntax.')
 @discord.app_commands.checks.cooldown(2, 60, key=lambda i: (i.user.id))
 @discord.app_commands.describe(file = 'The file to check.')
+@tracing.job('check_file')
 async def cmd_check_file(interaction: discord.Interaction, file: discord.Attachment):
     await interaction.response.defer(ephemeral=True)
     if not file.filename.endswith('.lua'):
         await interaction.edit_original_response(content="Please upload a `.lua` file.")
         return
-    if file.size > 1024 * 1024 * 5:
+    if file.size > MAX_FILE_BYTES:
         await interaction.edit_original_response(content="The file is too big. Please upload a file smaller than 5 MB.")
         return
 
-    file_path = os.path.abspath(f'{BUFFER_FOLDER}{interaction.user.id}_file.lua')
-    with open(file_path, 'wb') as f:
-        f.write(await file.read())
-
-    with open(file_path, 'r', encoding='utf8') as f:
-        lua_code = f.read()
+    lua_code = await ingest.read_attachment(file)
 
-    isValid, conout = Hercules.isValidLUASyntax(lua_code)
+    isValid, conout = await Functions.schedule(interaction, lambda: Functions.validate(lua_code), 'fast')
     if not isValid:
-        with tempfile.NamedTemporaryFile(suffix=".txt", delete=False, encoding='utf-8', mode='w') as temp_file:
-            temp_file.write(conout)
-            temp_file_path = temp_file.name
-        await interaction.followup.send(content=f"The uploaded file does not contain valid Lua syntax.", file=discord.File(temp_file_path))
-        os.remove(temp_file_path)
+        with scratch.JobScratch(BUFFER_FOLDER) as job:
+            await interaction.followup.send(content=f"The uploaded file does not contain valid Lua syntax.", file=discord.File(job.write_text('luacheck_output.txt', conout)))
     else:
         await interaction.followup.send(content="The uploaded file contains valid Lua syntax.")
-    os.remove(file_path)
 
 
 
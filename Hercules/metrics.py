@@ -0,0 +1,206 @@
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional, Union
+
+LabelValues = tuple[str, ...]
+
+
+class Registry:
+    """
+    Collects metrics and renders them in the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self._metrics: list['_Metric'] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: '_Metric'):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self) -> str:
+        """
+        Renders all metrics.
+
+        Returns:
+            The metrics in the text exposition format, version 0.0.4.
+        """
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+class _Metric:
+    type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), registry: Optional[Registry] = REGISTRY):
+        """
+        Initializes the metric.
+
+        Args:
+            name: Name of the metric.
+            documentation: Help text of the metric.
+            labelnames: Names of the labels every sample has.
+            registry: Registry to add the metric to.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        if registry:
+            registry.register(self)
+
+    def _key(self, labels: dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects the labels {self.labelnames}, got {tuple(labels)}.")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, values: LabelValues, extra: str = '') -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """
+    A value that only goes up.
+    """
+    type = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [f'{self.name}{self._labels(key)} {_format_value(value)}' for key, value in values.items()]
+
+
+class Gauge(_Metric):
+    """
+    A value that goes up and down. Instead of being set, it can read its values from a function when rendered.
+    """
+    type = 'gauge'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: dict[LabelValues, float] = {}
+        self._function: Optional[Callable[[], Union[float, dict[LabelValues, float]]]] = None
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, function: Callable[[], Union[float, dict[LabelValues, float]]]):
+        """
+        Reads the values from a function when rendered.
+
+        Args:
+            function: Returns the value, or a dict mapping label value tuples to values for labelled gauges.
+        """
+        self._function = function
+
+    def samples(self) -> list[str]:
+        if self._function:
+            try:
+                result = self._function()
+            except Exception:
+                return []
+            values = result if isinstance(result, dict) else {(): result}
+        else:
+            with self._lock:
+                values = dict(self._values)
+        return [f'{self.name}{self._labels(tuple(str(v) for v in key))} {_format_value(value)}' for key, value in values.items()]
+
+
+class Histogram(_Metric):
+    """
+    Counts observations in cumulative buckets and tracks their sum.
+    """
+    type = 'histogram'
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self, *args, buckets: tuple[float, ...] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        self._values: dict[LabelValues, tuple[list[int], float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observes the seconds the block took.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        lines = []
+        for key, (counts, total) in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{self._labels(key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{self._labels(key)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{self._labels(key)} {cumulative}')
+        return lines
+
+
+BYTE_BUCKETS = (1024, 4 * 1024, 16 * 1024, 64 * 1024, 256 * 1024, 1024 * 1024, 4 * 1024 * 1024, 16 * 1024 * 1024)
+
+queue_depth = Gauge('hercules_queue_depth', 'Jobs waiting for a free slot.')
+jobs_in_flight = Gauge('hercules_jobs_in_flight', 'Jobs currently running.')
+stage_seconds = Histogram('hercules_stage_seconds', 'Duration of the download, decode, validation, obfuscation and upload stages.', ('stage',))
+input_bytes = Histogram('hercules_input_bytes', 'Size of the code submitted for obfuscation.', buckets=BYTE_BUCKETS)
+output_bytes = Histogram('hercules_output_bytes', 'Size of the obfuscated code.', buckets=BYTE_BUCKETS)
+subprocesses = Counter('hercules_subprocesses_total', 'Obfuscator and luacheck runs.', ('kind',))
+subprocess_failures = Counter('hercules_subprocess_failures_total', 'Obfuscator and luacheck runs that crashed or timed out.', ('kind',))
+resource_limit_breaches = Counter('hercules_resource_limit_breaches_total', 'Obfuscator runs killed for breaching a resource limit.', ('limit',))
+cache_requests = Counter('hercules_cache_requests_total', 'Cache lookups by cache and result.', ('cache', 'result'))
+gateway_latency = Gauge('hercules_gateway_latency_seconds', 'Gateway heartbeat latency per shard.', ('shard',))
+event_loop_lag = Gauge('hercules_event_loop_lag_seconds', 'How late the event loop ran a timer at the last measurement.')
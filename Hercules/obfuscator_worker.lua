@@ -0,0 +1,245 @@
+-- Persistent obfuscation worker for the Hercules bot.
+--
+-- The worker is started with the obfuscator folder as working directory and the
+-- obfuscator's module files as arguments. hercules.lua and the modules are compiled
+-- once; every job then runs the cached chunks with a fresh package.loaded, and the
+-- globals are restored to their start-up values afterwards, so no state leaks from
+-- one job into the next. Output written to io.stderr during a job is captured with
+-- stdout, like the combined output of a separate hercules.lua process.
+--
+-- Request:  <frame count>\n followed by that many frames of <length>\n<bytes>.
+--           The first frame is the random seed (empty for none), the remaining
+--           frames are the arguments passed to hercules.lua.
+-- Response: <exit code> <length>\n<captured output>
+--
+-- Only the last HERCULES_MAX_OUTPUT bytes (default 1 MB) of a job's output are kept.
+
+local real_stdin = io.stdin
+local real_stdout = io.stdout
+local real_randomseed = math.randomseed
+
+local preload = {table.unpack(arg)}
+local chunk_cache = {}
+local captured = {}
+local captured_bytes = 0
+local max_output = math.tointeger(tonumber(os.getenv("HERCULES_MAX_OUTPUT") or "")) or 1024 * 1024
+local truncated = false
+
+local function normalize(path)
+    return (path:gsub("\\", "/"):gsub("^%./", ""))
+end
+
+local function compile(path)
+    local key = normalize(path)
+    local chunk = chunk_cache[key]
+    if not chunk then
+        local err
+        chunk, err = loadfile(path)
+        if not chunk then
+            return nil, err
+        end
+        chunk_cache[key] = chunk
+    end
+    return chunk
+end
+
+local function cached_searcher(name)
+    local path, err = package.searchpath(name, package.path)
+    if not path then
+        return err
+    end
+    local chunk, load_err = compile(path)
+    if not chunk then
+        error(("error loading module '%s' from file '%s':\n\t%s"):format(name, path, load_err), 2)
+    end
+    return chunk, path
+end
+table.insert(package.searchers, 2, cached_searcher)
+
+local function append(text)
+    captured[#captured + 1] = text
+    captured_bytes = captured_bytes + #text
+    if captured_bytes > 2 * max_output then
+        local tail = table.concat(captured):sub(-max_output)
+        captured = {tail}
+        captured_bytes = #tail
+        truncated = true
+    end
+end
+
+local function capture(...)
+    local parts = table.pack(...)
+    for i = 1, parts.n do
+        append(tostring(parts[i]))
+    end
+end
+
+local capture_stdout = {}
+function capture_stdout:write(...)
+    capture(...)
+    return self
+end
+function capture_stdout:flush() return self end
+function capture_stdout:setvbuf() return true end
+function capture_stdout:close() return true end
+
+local function capture_print(...)
+    local parts = table.pack(...)
+    for i = 1, parts.n do
+        if i > 1 then
+            append("\t")
+        end
+        append(tostring(parts[i]))
+    end
+    append("\n")
+end
+
+local capture_stderr = {}
+function capture_stderr:write(...)
+    capture(...)
+    return self
+end
+capture_stderr.flush = capture_stdout.flush
+capture_stderr.setvbuf = capture_stdout.setvbuf
+capture_stderr.close = capture_stdout.close
+
+local function capture_write(...)
+    capture(...)
+    return capture_stdout
+end
+
+local function capture_exit(code)
+    if code == nil or code == true then
+        code = 0
+    elseif code == false then
+        code = 1
+    end
+    error({exit_code = code}, 0)
+end
+
+local function read_frame()
+    local header = real_stdin:read("l")
+    local length = header and tonumber(header)
+    if not length then
+        return nil
+    end
+    if length == 0 then
+        return ""
+    end
+    return real_stdin:read(length)
+end
+
+local main_chunk = assert(compile("hercules.lua"))
+for _, path in ipairs(preload) do
+    compile(path)
+end
+
+local base_loaded = {}
+for name in pairs(package.loaded) do
+    base_loaded[name] = true
+end
+-- Snapshot of the globals and of the fields of the standard library tables, so
+-- jobs that replace e.g. string.format or a global function can be undone.
+local base_globals = {}
+local base_libraries = {}
+for name, value in pairs(_G) do
+    base_globals[name] = value
+    if type(value) == "table" and value ~= _G then
+        local fields = {}
+        for key, field in pairs(value) do
+            fields[key] = field
+        end
+        base_libraries[value] = fields
+    end
+end
+
+local function restore_globals()
+    setmetatable(_G, nil)
+    for name in pairs(_G) do
+        if base_globals[name] == nil then
+            _G[name] = nil
+        end
+    end
+    for name, value in pairs(base_globals) do
+        if rawget(_G, name) ~= value then
+            _G[name] = value
+        end
+    end
+    for library, fields in pairs(base_libraries) do
+        for key in pairs(library) do
+            if fields[key] == nil then
+                library[key] = nil
+            end
+        end
+        for key, field in pairs(fields) do
+            if rawget(library, key) ~= field then
+                library[key] = field
+            end
+        end
+    end
+end
+
+local function run_job(seed, args)
+    captured = {}
+    captured_bytes = 0
+    truncated = false
+    arg = {[0] = "hercules.lua", table.unpack(args)}
+    print, io.write, io.stdout, io.stderr, os.exit = capture_print, capture_write, capture_stdout, capture_stderr, capture_exit
+    if seed then
+        real_randomseed(seed)
+        math.randomseed = function() end
+    end
+
+    local ok, err = pcall(main_chunk, table.unpack(args))
+
+    restore_globals()
+    for name in pairs(package.loaded) do
+        if not base_loaded[name] then
+            package.loaded[name] = nil
+        end
+    end
+
+    local code = 0
+    if not ok then
+        if type(err) == "table" and err.exit_code then
+            code = math.tointeger(err.exit_code) or 1
+        else
+            code = 1
+            append(tostring(err) .. "\n")
+        end
+    end
+    local output = table.concat(captured)
+    if #output > max_output then
+        output = output:sub(-max_output)
+        truncated = true
+    end
+    if truncated then
+        output = "[output truncated]\n" .. output
+    end
+    captured = {}
+    captured_bytes = 0
+    collectgarbage("collect")
+    return code, output
+end
+
+real_stdout:setvbuf("full")
+real_stdout:write("READY\n")
+real_stdout:flush()
+
+while true do
+    local header = real_stdin:read("l")
+    local count = header and tonumber(header)
+    if not count then
+        break
+    end
+    local seed_frame = read_frame()
+    local args = {}
+    for i = 1, count - 1 do
+        args[i] = read_frame()
+    end
+    local seed = seed_frame and seed_frame ~= "" and math.tointeger(tonumber(seed_frame)) or nil
+
+    local code, output = run_job(seed, args)
+    real_stdout:write(("%d %d\n"):format(code, #output), output)
+    real_stdout:flush()
+end
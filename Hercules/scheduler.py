@@ -0,0 +1,214 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Literal, Optional
+
+
+class _Job:
+    __slots__ = ('user_id', 'guild_key', 'lane', 'future', 'on_position', 'position', 'sent', 'notified_at', 'notice', 'trailing')
+
+    def __init__(self, user_id: int, guild_key: Any, lane: str, future: asyncio.Future, on_position: Optional[Callable[[int], Awaitable[None]]]):
+        self.user_id = user_id
+        self.guild_key = guild_key
+        self.lane = lane
+        self.future = future
+        self.on_position = on_position
+        self.position = 0
+        self.sent = 0
+        self.notified_at = 0.0
+        self.notice: Optional[asyncio.Task] = None
+        self.trailing: Optional[asyncio.TimerHandle] = None
+
+    def cancel_trailing(self):
+        if self.trailing:
+            self.trailing.cancel()
+            self.trailing = None
+
+
+class JobScheduler:
+    """
+    Runs jobs with a bounded global concurrency.
+    Jobs wait in two lanes: 'fast' for checks and small inputs, 'slow' for everything else. Some slots are
+    reserved for the fast lane, so small jobs are never stuck behind big ones. Inside a lane, jobs are taken
+    round-robin across guilds and, inside a guild, across users.
+    """
+
+    def __init__(self, max_concurrency: int, fast_lane_slots: int = 1, notify_interval: float = 2):
+        """
+        Initializes the scheduler.
+
+        Args:
+            max_concurrency: Maximum number of jobs running at the same time.
+            fast_lane_slots: Slots only the fast lane may use.
+            notify_interval: Minimum seconds between two position updates of the same job. Changes inside the
+                interval are sent once it has passed, so the last position always arrives.
+        """
+        self.max_concurrency = max(1, max_concurrency)
+        self.slow_lane_limit = max(1, self.max_concurrency - fast_lane_slots)
+        self.notify_interval = notify_interval
+        self._lanes: dict[str, OrderedDict[Any, OrderedDict[int, deque[_Job]]]] = {'fast': OrderedDict(), 'slow': OrderedDict()}
+        self._running = {'fast': 0, 'slow': 0}
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        Number of jobs waiting in all lanes.
+        """
+        return sum(len(jobs) for lane in self._lanes.values() for users in lane.values() for jobs in users.values())
+
+    @property
+    def in_flight(self) -> int:
+        """
+        Number of jobs currently running.
+        """
+        return sum(self._running.values())
+
+    async def run(self, job: Callable[[], Awaitable[Any]], user_id: int, guild_id: Optional[int], lane: Literal['fast', 'slow'] = 'slow',
+                  on_position: Optional[Callable[[int], Awaitable[None]]] = None) -> Any:
+        """
+        Waits for a free slot and runs the job.
+
+        Args:
+            job: Callable returning the awaitable to run.
+            user_id: ID of the user that submitted the job.
+            guild_id: ID of the guild the job was submitted in, None for DMs.
+            lane: 'fast' or 'slow'.
+            on_position: Optional coroutine function called with the job's queue position while it waits,
+                and with 0 once a job that had to wait starts.
+
+        Returns:
+            The result of the job.
+        """
+        entry = _Job(user_id, guild_id if guild_id is not None else f'dm-{user_id}', lane,
+                     asyncio.get_running_loop().create_future(), on_position)
+        self._lanes[lane].setdefault(entry.guild_key, OrderedDict()).setdefault(user_id, deque()).append(entry)
+        self._dispatch()
+        self._notify_positions()
+
+        try:
+            await entry.future
+        except asyncio.CancelledError:
+            entry.cancel_trailing()
+            if entry.future.done() and not entry.future.cancelled():
+                self._release(lane)
+            else:
+                self._remove(entry)
+                self._notify_positions()
+            raise
+
+        entry.cancel_trailing()
+        if entry.position and on_position:
+            self._notify(entry, 0)
+        try:
+            return await job()
+        finally:
+            self._release(lane)
+
+    def _release(self, lane: str):
+        self._running[lane] -= 1
+        self._dispatch()
+        self._notify_positions()
+
+    def _dispatch(self):
+        """
+        Starts queued jobs while slots are free.
+        """
+        while self.in_flight < self.max_concurrency:
+            entry = self._pop('fast')
+            if entry is None and self._running['slow'] < self.slow_lane_limit:
+                entry = self._pop('slow')
+            if entry is None:
+                return
+            self._running[entry.lane] += 1
+            entry.future.set_result(None)
+
+    def _pop(self, lane: str) -> Optional[_Job]:
+        """
+        Takes the next job of a lane, round-robin across guilds and users.
+        """
+        guilds = self._lanes[lane]
+        if not guilds:
+            return None
+        guild_key, users = next(iter(guilds.items()))
+        user_id, jobs = next(iter(users.items()))
+        entry = jobs.popleft()
+
+        del users[user_id]
+        if jobs:
+            users[user_id] = jobs
+        del guilds[guild_key]
+        if users:
+            guilds[guild_key] = users
+        return entry
+
+    def _remove(self, entry: _Job):
+        users = self._lanes[entry.lane].get(entry.guild_key)
+        if not users or entry.user_id not in users:
+            return
+        jobs = users[entry.user_id]
+        if entry in jobs:
+            jobs.remove(entry)
+        if not jobs:
+            del users[entry.user_id]
+        if not users:
+            del self._lanes[entry.lane][entry.guild_key]
+
+    def _order(self, lane: str) -> list[_Job]:
+        """
+        Returns the jobs of a lane in the order they would be started.
+        """
+        guilds = deque(deque((deque(jobs) for jobs in users.values())) for users in self._lanes[lane].values())
+        order = []
+        while guilds:
+            users = guilds.popleft()
+            jobs = users.popleft()
+            order.append(jobs.popleft())
+            if jobs:
+                users.append(jobs)
+            if users:
+                guilds.append(users)
+        return order
+
+    def _notify_positions(self):
+        for lane in self._lanes:
+            for position, entry in enumerate(self._order(lane), start=1):
+                if entry.on_position and entry.position != position:
+                    now = time.monotonic()
+                    if entry.position == 0 or now - entry.notified_at >= self.notify_interval:
+                        entry.notified_at = now
+                        self._notify(entry, position)
+                    elif entry.trailing is None:
+                        delay = entry.notified_at + self.notify_interval - now
+                        entry.trailing = asyncio.get_running_loop().call_later(delay, self._notify_trailing, entry)
+                    entry.position = position
+
+    def _notify_trailing(self, entry: _Job):
+        """
+        Sends the position a waiting job reached while its updates were throttled.
+        """
+        entry.trailing = None
+        if entry.future.done() or entry.position == entry.sent:
+            return
+        entry.notified_at = time.monotonic()
+        self._notify(entry, entry.position)
+
+    def _notify(self, entry: _Job, position: int):
+        """
+        Sends a position update. Updates of the same job are sent in order.
+        """
+        previous = entry.notice
+        entry.sent = position
+
+        async def __notice():
+            if previous:
+                await asyncio.gather(previous, return_exceptions=True)
+            try:
+                await entry.on_position(position)
+            except Exception:
+                pass
+
+        task = asyncio.create_task(__notice())
+        entry.notice = task
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
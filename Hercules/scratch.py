@@ -0,0 +1,220 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Optional
+
+PREFIX = 'hercules-'
+
+_active: set[str] = set()
+_active_lock = threading.Lock()
+
+
+class JobScratch:
+    """
+    Scratch directory of a single job. Every job gets its own directory, so concurrent jobs of the same user
+    can't overwrite each other's files. The directory and everything in it is removed when the context exits.
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        """
+        Initializes the scratch directory. It is created when the context is entered.
+
+        Args:
+            root: Folder to create the directory in. Defaults to the temp folder.
+        """
+        self._root = root
+        self.path: Optional[str] = None
+
+    def __enter__(self) -> 'JobScratch':
+        if self._root:
+            os.makedirs(self._root, exist_ok=True)
+        self.path = os.path.abspath(tempfile.mkdtemp(prefix=f'{PREFIX}job-', dir=self._root))
+        with _active_lock:
+            _active.add(self.path)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        shutil.rmtree(self.path, ignore_errors=True)
+        with _active_lock:
+            _active.discard(self.path)
+
+    def file(self, name: str) -> str:
+        """
+        Returns the path of a file inside the scratch directory.
+
+        Args:
+            name: Name of the file. Directory parts are stripped.
+
+        Returns:
+            The absolute path of the file.
+        """
+        return os.path.join(self.path, os.path.basename(name))
+
+    def write_text(self, name: str, text: str) -> str:
+        """
+        Writes a text file into the scratch directory.
+
+        Args:
+            name: Name of the file.
+            text: Content of the file.
+
+        Returns:
+            The absolute path of the file.
+        """
+        path = self.file(name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def write_bytes(self, name: str, data: bytes) -> str:
+        """
+        Writes a binary file into the scratch directory.
+
+        Args:
+            name: Name of the file.
+            data: Content of the file.
+
+        Returns:
+            The absolute path of the file.
+        """
+        path = self.file(name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+
+class ScratchFile:
+    """
+    A single temp file, e.g. the input of one obfuscator run. Like a JobScratch directory it is protected from
+    the BufferJanitor while the context is open, and removed when the context exits.
+    """
+
+    def __init__(self, root: Optional[str] = None, suffix: str = '.lua'):
+        """
+        Initializes the scratch file. It is created when the context is entered.
+
+        Args:
+            root: Folder to create the file in. Defaults to the temp folder.
+            suffix: Suffix of the file name.
+        """
+        self._root = root
+        self._suffix = suffix
+        self.fd: Optional[int] = None
+        self.path: Optional[str] = None
+
+    def __enter__(self) -> 'ScratchFile':
+        # Created and registered under the lock, so a sweep can't list the file before it is protected.
+        with _active_lock:
+            self.fd, path = tempfile.mkstemp(prefix=PREFIX, suffix=self._suffix, dir=self._root)
+            self.path = os.path.abspath(path)
+            _active.add(self.path)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        os.close(self.fd)
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+        with _active_lock:
+            _active.discard(self.path)
+
+
+class BufferJanitor:
+    """
+    Removes leftovers from the buffer folder and the temp folders.
+    Entries older than max_age are removed first, then the oldest entries until the folder is below its byte quota.
+    In temp folders only entries created by the bot (prefixed with 'hercules-') are touched.
+    Scratch directories and files of running jobs are never removed.
+    """
+
+    def __init__(self, program_logger, buffer_folder: str, max_bytes: int, max_age: float, temp_folders: Optional[list[str]] = None):
+        """
+        Initializes the janitor.
+
+        Args:
+            program_logger: Logger object to log messages.
+            buffer_folder: The bot's buffer folder.
+            max_bytes: Byte quota of each folder.
+            max_age: Seconds after which an entry is removed.
+            temp_folders: Temp folders the bot writes to. Defaults to the system's temp folder.
+        """
+        self._program_logger = program_logger
+        self._folders = [(os.path.abspath(buffer_folder), '')]
+        for folder in dict.fromkeys(os.path.abspath(f) for f in temp_folders or [tempfile.gettempdir()]):
+            self._folders.append((folder, PREFIX))
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+
+    def sweep(self) -> tuple[int, int]:
+        """
+        Enforces the age limit and the quota on all folders.
+
+        Returns:
+            A tuple of the number of removed entries and the reclaimed bytes.
+        """
+        removed, reclaimed = 0, 0
+        for folder, prefix in self._folders:
+            count, size = self._sweep_folder(folder, prefix)
+            removed += count
+            reclaimed += size
+        if removed:
+            self._program_logger.info(f"Buffer janitor removed {removed} entries and reclaimed {reclaimed / 1024:.1f} KB.")
+        return removed, reclaimed
+
+    def _sweep_folder(self, folder: str, prefix: str) -> tuple[int, int]:
+        try:
+            names = os.listdir(folder)
+        except OSError:
+            return 0, 0
+        with _active_lock:
+            active = set(_active)
+
+        entries = []
+        for name in names:
+            path = os.path.join(folder, name)
+            if not name.startswith(prefix) or path in active:
+                continue
+            try:
+                entries.append((os.lstat(path).st_mtime, self._size(path), path))
+            except OSError:
+                continue
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        cutoff = time.time() - self.max_age
+        removed, reclaimed = 0, 0
+        for mtime, size, path in entries:
+            if mtime >= cutoff and total <= self.max_bytes:
+                break
+            if self._remove(path):
+                removed += 1
+                reclaimed += size
+                total -= size
+        return removed, reclaimed
+
+    @staticmethod
+    def _size(path: str) -> int:
+        if not os.path.isdir(path) or os.path.islink(path):
+            return os.lstat(path).st_size
+        size = 0
+        for root, _, files in os.walk(path):
+            for name in files:
+                try:
+                    size += os.lstat(os.path.join(root, name)).st_size
+                except OSError:
+                    continue
+        return size
+
+    @staticmethod
+    def _remove(path: str) -> bool:
+        try:
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+            return True
+        except OSError:
+            return False
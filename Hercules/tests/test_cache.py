@@ -0,0 +1,54 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import ObfuscationCache
+
+
+class ObfuscationCacheTest(unittest.TestCase):
+    def setUp(self):
+        self._folder = tempfile.TemporaryDirectory()
+        self.folder = self._folder.name
+
+    def tearDown(self):
+        self._folder.cleanup()
+
+    def test_round_trip_keeps_non_utf8_bytes(self):
+        output = b'local s = "\xff\xfe\x00\x80"\nprint(s)\n'
+        key = ObfuscationCache.make_key(b'print(1)', 1, None, 'rev')
+        ObfuscationCache(self.folder, 1024 * 1024).put(key, output, 'ok')
+
+        cached = ObfuscationCache(self.folder, 1024 * 1024).get(key)
+        self.assertEqual(cached, (output, 'ok'))
+
+    def test_evicts_least_recently_used(self):
+        cache = ObfuscationCache(self.folder, 200)
+        cache.put('a', b'x' * 60, '')
+        cache.put('b', b'y' * 60, '')
+        cache.get('a')
+        cache.put('c', b'z' * 60, '')
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertFalse(os.path.exists(os.path.join(self.folder, 'b.lua')))
+
+    def test_removes_other_revisions_and_temp_files(self):
+        cache = ObfuscationCache(self.folder, 1024 * 1024)
+        cache.set_revision('old')
+        cache.put('a', b'old', '')
+        cache.set_revision('new')
+        cache.put('b', b'new', '')
+        with open(os.path.join(self.folder, 'stray.tmp'), 'wb') as f:
+            f.write(b'partial')
+
+        cache = ObfuscationCache(self.folder, 1024 * 1024)
+        cache.set_revision('new')
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('b'), (b'new', ''))
+        self.assertEqual(sorted(os.listdir(self.folder)), ['b.json', 'b.lua'])
+
+
+if __name__ == '__main__':
+    unittest.main()
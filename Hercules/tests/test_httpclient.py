@@ -0,0 +1,78 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from httpclient import DownloadTooLarge, HttpClient, UrlCache
+
+ETAG = '"v1"'
+
+
+class HttpClientTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.requests = []
+        app = web.Application()
+        app.router.add_get('/script.lua', self._script)
+        app.router.add_get('/big.lua', self._big)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        self.cache = UrlCache(max_bytes=1024)
+        self.client = HttpClient(max_bytes=256, cache=self.cache)
+
+    async def asyncTearDown(self):
+        await self.client.stop()
+        await self.server.close()
+
+    async def _script(self, request: web.Request) -> web.Response:
+        self.requests.append(request.headers.get('If-None-Match'))
+        if request.headers.get('If-None-Match') == ETAG:
+            return web.Response(status=304, headers={'ETag': ETAG})
+        return web.Response(body=b'print("hello")\n', content_type='text/plain', charset='utf-8', headers={'ETag': ETAG})
+
+    async def _big(self, request: web.Request) -> web.StreamResponse:
+        # Streamed without Content-Length, so only the running size can stop the download.
+        response = web.StreamResponse(headers={'ETag': ETAG})
+        response.enable_chunked_encoding()
+        await response.prepare(request)
+        for _ in range(8):
+            await response.write(b'-' * 64)
+        await response.write_eof()
+        return response
+
+    def url(self, path: str) -> str:
+        return str(self.server.make_url(path))
+
+    async def test_stores_200_response(self):
+        status, body, charset = await self.client.fetch(self.url('/script.lua'))
+
+        self.assertEqual((status, body, charset), (200, b'print("hello")\n', 'utf-8'))
+        self.assertEqual(self.cache.get(self.url('/script.lua')), (body, 'utf-8', ETAG, None))
+
+    async def test_304_returns_cached_body(self):
+        await self.client.fetch(self.url('/script.lua'))
+        status, body, charset = await self.client.fetch(self.url('/script.lua'))
+
+        self.assertEqual(self.requests, [None, ETAG])
+        self.assertEqual((status, body, charset), (200, b'print("hello")\n', 'utf-8'))
+
+    async def test_enforces_size_cap(self):
+        with self.assertRaises(DownloadTooLarge):
+            await self.client.fetch(self.url('/big.lua'))
+        self.assertIsNone(self.cache.get(self.url('/big.lua')))
+
+        status, body, _ = await self.client.fetch(self.url('/big.lua'), max_bytes=2048)
+        self.assertEqual((status, len(body)), (200, 512))
+        self.assertIsNotNone(self.cache.get(self.url('/big.lua')))
+
+        self.cache.put('http://other/', b'x' * 600, None, ETAG, None)
+        self.assertIsNone(self.cache.get(self.url('/big.lua')))
+        self.cache.put('http://huge/', b'x' * 2048, None, ETAG, None)
+        self.assertIsNone(self.cache.get('http://huge/'))
+
+
+if __name__ == '__main__':
+    unittest.main()
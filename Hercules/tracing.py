@@ -0,0 +1,153 @@
+import contextvars
+import datetime
+import functools
+import metrics
+import random
+import sentry_sdk
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Optional
+
+JOB_OP = 'job'
+UNTRACED_PATHS = {'/health', '/ready', '/metrics'}
+
+_work: contextvars.ContextVar[Optional[list[float]]] = contextvars.ContextVar('work', default=None)
+
+
+class AdaptiveSampler:
+    """
+    Sentry sampling for the bot. Jobs are always recorded, and the keep decision is made when they finish:
+    failed and slow jobs are always sent, ordinary ones at a rate that drops as the queue grows.
+    Other transactions are sampled at the same rate up front, and probe requests are never traced.
+    """
+
+    def __init__(self, base_rate: float, slow_threshold: float, load: Callable[[], float], load_scale: float = 10):
+        """
+        Initializes the sampler.
+
+        Args:
+            base_rate: Sample rate of ordinary traffic while the bot is idle.
+            slow_threshold: Seconds of work after which a job is always sent.
+            load: Returns the current load, e.g. the queue depth.
+            load_scale: Load at which the rate is halved.
+        """
+        self.base_rate = base_rate
+        self.slow_threshold = slow_threshold
+        self._load = load
+        self.load_scale = load_scale
+
+    @property
+    def rate(self) -> float:
+        """
+        The current sample rate of ordinary traffic.
+        """
+        try:
+            load = max(float(self._load()), 0.0)
+        except Exception:
+            load = 0.0
+        return self.base_rate / (1 + load / self.load_scale)
+
+    def traces_sampler(self, sampling_context: dict[str, Any]) -> float:
+        """
+        Head sampling decision, passed to sentry_sdk.init as traces_sampler.
+        """
+        if sampling_context.get('parent_sampled') is not None:
+            return float(sampling_context['parent_sampled'])
+        if sampling_context.get('transaction_context', {}).get('op') == JOB_OP:
+            return 1.0
+        request = sampling_context.get('aiohttp_request')
+        if request is not None and request.path in UNTRACED_PATHS:
+            return 0.0
+        return self.rate
+
+    def before_send_transaction(self, event: dict[str, Any], hint: dict[str, Any]) -> Optional[dict[str, Any]]:
+        """
+        Tail sampling decision for jobs, passed to sentry_sdk.init as before_send_transaction.
+        """
+        trace = event.get('contexts', {}).get('trace', {})
+        if trace.get('op') != JOB_OP:
+            return event
+        if trace.get('status') not in (None, 'ok'):
+            return event
+        work = trace.get('data', {}).get('work_seconds')
+        if work is None:
+            work = _duration(event)
+        if work >= self.slow_threshold:
+            return event
+        return event if random.random() < self.rate else None
+
+
+def _duration(event: dict[str, Any]) -> float:
+    start, end = event.get('start_timestamp'), event.get('timestamp')
+    if isinstance(start, str):
+        start, end = datetime.datetime.fromisoformat(start), datetime.datetime.fromisoformat(end)
+    if isinstance(start, datetime.datetime):
+        return (end - start).total_seconds()
+    try:
+        return float(end) - float(start)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def job(name: str):
+    """
+    Decorator running a command as a Sentry job transaction.
+    Only time spent in stages counts as work for the slow-job decision, so waiting for the user doesn't.
+
+    Args:
+        name: Name of the transaction.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            work = [0.0]
+            token = _work.set(work)
+            try:
+                with sentry_sdk.start_transaction(op=JOB_OP, name=name) as transaction:
+                    try:
+                        return await func(*args, **kwargs)
+                    finally:
+                        transaction.set_data('work_seconds', round(work[0], 3))
+            finally:
+                _work.reset(token)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Runs a pipeline stage inside a Sentry span and records its duration in the stage histogram.
+
+    Args:
+        name: Name of the stage.
+    """
+    start = time.perf_counter()
+    try:
+        with sentry_sdk.start_span(op=name, name=name):
+            yield
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.stage_seconds.observe(elapsed, stage=name)
+        work = _work.get()
+        if work is not None:
+            work[0] += elapsed
+
+
+def span(name: str):
+    """
+    Returns a Sentry span for a step that is not a stage of its own, e.g. one that contains stages.
+
+    Args:
+        name: Name of the span.
+    """
+    return sentry_sdk.start_span(op=name, name=name)
+
+
+def mark_failed():
+    """
+    Marks the current job as failed, so it is always sent.
+    """
+    transaction = sentry_sdk.get_current_scope().transaction
+    if transaction is not None:
+        transaction.set_status('internal_error')
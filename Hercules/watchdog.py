@@ -0,0 +1,99 @@
+import asyncio
+import metrics
+import sentry_sdk
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+
+class LoopWatchdog:
+    """
+    Measures the lag of an event loop and reports what is blocking it.
+    The loop updates a heartbeat on a timer. A separate thread watches the heartbeat, and when the loop
+    falls behind by more than the threshold it captures the loop thread's current stack, so the blocking call shows up
+    in the log and in Sentry. Every stall is reported once.
+    """
+
+    def __init__(self, program_logger, threshold: float = 1, interval: float = 0.5):
+        """
+        Initializes the watchdog. It is started by start().
+
+        Args:
+            program_logger: Logger object to log messages.
+            threshold: Seconds of lag after which the loop counts as blocked.
+            interval: Seconds between two heartbeats.
+        """
+        self._program_logger = program_logger
+        self.threshold = threshold
+        self.interval = interval
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._beat = 0.0
+        self._expected = 0.0
+        self._last_lag = 0.0
+
+    @property
+    def lag(self) -> float:
+        """
+        Seconds the loop is behind: the lag of the last heartbeat or, while the loop is blocked, how long it has been blocked.
+        """
+        if not self._loop:
+            return 0.0
+        stall = time.monotonic() - self._beat - self.interval
+        return max(self._last_lag, stall, 0.0)
+
+    def start(self):
+        """
+        Starts the heartbeat on the running loop and the watching thread.
+        """
+        if self._thread:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._expected = self._beat + self.interval
+        self._handle = self._loop.call_later(self.interval, self._heartbeat)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name='LoopWatchdog', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops the heartbeat and the watching thread.
+        """
+        self._stop.set()
+        if self._handle:
+            self._handle.cancel()
+            self._handle = None
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def _heartbeat(self):
+        now = time.monotonic()
+        self._last_lag = max(now - self._expected, 0.0)
+        metrics.event_loop_lag.set(self._last_lag)
+        self._beat = now
+        self._expected = now + self.interval
+        self._handle = self._loop.call_later(self.interval, self._heartbeat)
+
+    def _watch(self):
+        reported_beat = None
+        while not self._stop.wait(self.interval / 2):
+            beat = self._beat
+            stall = time.monotonic() - beat - self.interval
+            if stall <= self.threshold or reported_beat == beat:
+                continue
+            reported_beat = beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = ''.join(traceback.format_stack(frame)) if frame else 'Stack not available.'
+            self._program_logger.warning(f"Event loop blocked for {stall:.2f} seconds in:\n{stack}")
+            with sentry_sdk.new_scope() as scope:
+                scope.set_extra('stack', stack)
+                scope.set_extra('lag_seconds', round(stall, 3))
+                sentry_sdk.capture_message(f"Event loop blocked for more than {self.threshold} seconds", level='warning')
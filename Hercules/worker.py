@@ -0,0 +1,188 @@
+"""
+Obfuscation worker.
+
+Pulls validation and obfuscation jobs from the job queue and runs them through Hercules, so the pipeline can run
+in other processes or containers than the bot. Start any number of them against the queue the bot uses:
+
+    JOB_QUEUE_URL=sqlite:///Hercules-Bot/queue.db python worker.py
+
+The worker builds its pipeline with hercules.from_env(), so it reads the same settings from the environment as the bot.
+It logs to the bot's log folder under its own name.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import asyncio
+import signal
+import socket
+import uuid
+from typing import Optional
+
+import hercules
+import jobqueue
+from CustomModules import log_handler
+from dotenv import load_dotenv
+from limits import ResourceLimitExceeded
+
+APP_FOLDER_NAME = 'Hercules-Bot'
+WORKER_NAME = 'Hercules-Worker'
+LOG_FOLDER = f'{APP_FOLDER_NAME}//Logs//'
+CACHE_FOLDER = f'{APP_FOLDER_NAME}//Cache//'
+
+
+class Worker:
+    """
+    Runs jobs from a queue with a fixed number of concurrent slots.
+    """
+
+    def __init__(self, program_logger, herc: hercules.Hercules, queue: jobqueue.JobQueue, concurrency: int = 1,
+                 lease_seconds: float = 60, poll_interval: float = 0.5, purge_age: float = 3600):
+        """
+        Initializes the worker.
+
+        Args:
+            program_logger: Logger object to log messages.
+            herc: The Hercules instance running the jobs.
+            queue: The job queue.
+            concurrency: Jobs run at once.
+            lease_seconds: Lease of a claimed job. It is renewed while the job runs, so it only bounds how long
+                a job of a dead worker waits before it is handed out again.
+            poll_interval: Seconds to wait when the queue is empty.
+            purge_age: Seconds after which jobs whose result was never picked up are removed.
+        """
+        self._program_logger = program_logger
+        self._hercules = herc
+        self._queue = queue
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.purge_age = purge_age
+        self.worker_id = f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self._stopping = asyncio.Event()
+
+    def stop(self):
+        """
+        Stops claiming jobs. Jobs that are running are finished.
+        """
+        self._stopping.set()
+
+    async def run(self):
+        """
+        Runs until stop() is called.
+        """
+        await self._hercules.start_worker_pool()
+        await self._hercules.start_luacheck_daemon()
+        self._program_logger.info(f"Worker {self.worker_id} started with {self.concurrency} slots.")
+        try:
+            await asyncio.gather(*(self._slot() for _ in range(self.concurrency)), self._purge())
+        finally:
+            await self._hercules.stop_worker_pool()
+            await self._hercules.stop_luacheck_daemon()
+            self._program_logger.info(f"Worker {self.worker_id} stopped.")
+
+    async def _sleep(self, seconds: float):
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _slot(self):
+        while not self._stopping.is_set():
+            try:
+                job = await asyncio.to_thread(self._queue.claim, self.worker_id, self.lease_seconds)
+            except Exception as e:
+                self._program_logger.error(f"Could not claim a job: {e}")
+                await self._sleep(self.poll_interval * 10)
+                continue
+            if job is None:
+                await self._sleep(self.poll_interval)
+                continue
+            await self._process(job)
+
+    async def _process(self, job: jobqueue.QueuedJob):
+        task = asyncio.create_task(self._execute(job))
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=self.lease_seconds / 3)
+            if done:
+                break
+            try:
+                held = await asyncio.to_thread(self._queue.extend, job.id, self.worker_id, self.lease_seconds)
+            except jobqueue.QueueError as e:
+                self._program_logger.warning(f"Could not extend the lease of job {job.id}: {e}")
+                continue
+            if not held:
+                self._program_logger.info(f"Job {job.id} was cancelled.")
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                return
+        try:
+            result = task.result()
+        except Exception as e:
+            self._program_logger.error(f"Job {job.id} failed: {e}")
+            result = jobqueue.JobResult(False, f"Internal error: {e}", None, None)
+        try:
+            await asyncio.to_thread(self._queue.complete, job.id, self.worker_id, result)
+        except jobqueue.QueueError as e:
+            self._program_logger.error(f"Could not store the result of job {job.id}: {e}")
+
+    async def _execute(self, job: jobqueue.QueuedJob) -> jobqueue.JobResult:
+        lua_code = job.source.decode('utf-8', errors='surrogatepass')
+        if job.kind == 'validate':
+            valid, conout = await self._hercules.isValidLUASyntax_async(lua_code)
+            return jobqueue.JobResult(valid, conout, None, None)
+        try:
+            success, conout, output = await self._hercules.obfuscate_code_async(lua_code, job.bitkey, job.preset)
+        except ResourceLimitExceeded as e:
+            return jobqueue.JobResult(False, e.output.decode(errors='replace'), None, e.limit)
+        return jobqueue.JobResult(success, conout, output, None)
+
+    async def _purge(self):
+        while not self._stopping.is_set():
+            try:
+                removed = await asyncio.to_thread(self._queue.purge, self.purge_age)
+                if removed:
+                    self._program_logger.info(f"Removed {removed} stale jobs from the queue.")
+            except Exception as e:
+                self._program_logger.warning(f"Could not purge the job queue: {e}")
+            await self._sleep(600)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    load_dotenv()
+    os.makedirs(LOG_FOLDER, exist_ok=True)
+    log_manager = log_handler.LogManager(LOG_FOLDER, WORKER_NAME, os.getenv('LOG_LEVEL'))
+    program_logger = log_manager.get_logger('Worker')
+
+    queue_url = os.getenv('JOB_QUEUE_URL')
+    if not queue_url:
+        program_logger.error("JOB_QUEUE_URL is not set.")
+        return 1
+    queue = jobqueue.create_queue(queue_url)
+
+    herc = hercules.from_env(program_logger, CACHE_FOLDER)
+    worker = Worker(program_logger, herc, queue,
+                    concurrency=int(os.getenv('WORKER_CONCURRENCY', str(os.cpu_count() or 1))),
+                    lease_seconds=float(os.getenv('JOB_QUEUE_LEASE', '60'))
+                    )
+
+    async def __run():
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, worker.stop)
+            except NotImplementedError:
+                # Windows event loops have no signal handlers.
+                signal.signal(signum, lambda *_: loop.call_soon_threadsafe(worker.stop))
+        await worker.run()
+
+    try:
+        asyncio.run(__run())
+    finally:
+        queue.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,322 @@
+import asyncio
+import os
+from typing import Callable, Optional
+
+import psutil
+
+from limits import ResourceLimitExceeded, ResourceLimits, kill_group
+
+STDERR_TAIL = 4096
+
+
+class WorkerError(Exception):
+    """
+    Raised when a worker process died or answered with a malformed frame.
+    """
+
+
+class NoWorkersError(WorkerError):
+    """
+    Raised when the pool has no live workers left, e.g. because restarting them keeps failing.
+    """
+
+
+class LuaWorker:
+    """
+    A single long-lived Lua process running obfuscator_worker.lua.
+    It loads the obfuscator once and processes one job at a time over stdin/stdout.
+    """
+
+    def __init__(self, lua: str, script: str, cwd: str, preload: list[str], limits: Optional[ResourceLimits] = None):
+        """
+        Initializes the worker. The process is started by start().
+
+        Args:
+            lua: Name or path of the LUA 5.4 interpreter.
+            script: Path to obfuscator_worker.lua.
+            cwd: The obfuscator folder the worker runs in.
+            preload: Module files (relative to cwd) that are compiled at start-up.
+            limits: Resource limits. Memory and file size apply to the process, wall time and output to every job.
+                CPU time accumulates over the life of the worker, so it is bounded through the wall time instead.
+        """
+        self._command = [lua, script] + preload
+        self._cwd = cwd
+        self._limits = limits or ResourceLimits()
+        self._process_limits = ResourceLimits(memory_bytes=self._limits.memory_bytes, file_bytes=self._limits.file_bytes)
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._stderr_task: Optional[asyncio.Task] = None
+        self._stderr = b''
+        self.jobs_done = 0
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self._process.pid if self._process else None
+
+    @property
+    def alive(self) -> bool:
+        return self._process is not None and self._process.returncode is None
+
+    @property
+    def stderr(self) -> bytes:
+        """
+        The last bytes the process wrote to stderr outside of a job, e.g. the interpreter's message when it crashed.
+        """
+        return self._stderr
+
+    async def _drain_stderr(self):
+        while chunk := await self._process.stderr.read(STDERR_TAIL):
+            self._stderr = (self._stderr + chunk)[-STDERR_TAIL:]
+
+    async def _collect_stderr(self):
+        """
+        Waits briefly for the stderr of an exited process to be read to the end.
+        """
+        if self._stderr_task:
+            await asyncio.wait({self._stderr_task}, timeout=1)
+
+    async def start(self, timeout: float = 30):
+        """
+        Starts the process and waits until the obfuscator is loaded.
+
+        Args:
+            timeout: Seconds to wait for the worker to report readiness.
+
+        Raises:
+            WorkerError: If the worker did not start correctly.
+        """
+        self._process = await asyncio.create_subprocess_exec(*self._command,
+                                                             cwd=self._cwd,
+                                                             stdin=asyncio.subprocess.PIPE,
+                                                             stdout=asyncio.subprocess.PIPE,
+                                                             stderr=asyncio.subprocess.PIPE,
+                                                             env={**os.environ, 'HERCULES_MAX_OUTPUT': str(self._limits.output_bytes)},
+                                                             start_new_session=True)
+        self._process_limits.apply(self._process.pid)
+        self._stderr_task = asyncio.create_task(self._drain_stderr())
+        try:
+            ready = await asyncio.wait_for(self._process.stdout.readline(), timeout=timeout)
+        except asyncio.TimeoutError:
+            ready = b''
+        if ready.strip() != b'READY':
+            await self.stop()
+            raise WorkerError(f"Worker failed to start: {ready!r} {self._stderr.decode(errors='replace').strip()}")
+
+    async def run(self, args: list[str], seed: Optional[int] = None) -> tuple[int, bytes]:
+        """
+        Runs a single hercules.lua invocation inside the worker.
+
+        Args:
+            args: Arguments for hercules.lua.
+            seed: Optional seed for math.randomseed.
+
+        Returns:
+            A tuple containing the exit code and the captured output.
+
+        Raises:
+            WorkerError: If the worker died while processing the job.
+            ResourceLimitExceeded: If the job breached a resource limit. The worker is killed and must be replaced.
+        """
+        frames = ['' if seed is None else str(seed)] + args
+        payload = [f"{len(frames)}\n".encode()]
+        for frame in frames:
+            data = frame.encode()
+            payload.append(f"{len(data)}\n".encode())
+            payload.append(data)
+
+        async def __exchange() -> tuple[bytes, bytes]:
+            self._process.stdin.write(b''.join(payload))
+            await self._process.stdin.drain()
+            header = await self._process.stdout.readline()
+            code, length = header.split()
+            return code, await self._process.stdout.readexactly(int(length))
+
+        try:
+            code, output = await asyncio.wait_for(__exchange(), timeout=self._limits.wall_seconds)
+        except asyncio.TimeoutError:
+            kill_group(self.pid)
+            raise ResourceLimitExceeded('wall time')
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError) as e:
+            try:
+                await asyncio.wait_for(self._process.wait(), timeout=1)
+            except asyncio.TimeoutError:
+                pass
+            await self._collect_stderr()
+            limit = self._process_limits.breached(self._process.returncode or 0, self._stderr)
+            if limit:
+                raise ResourceLimitExceeded(limit, self._stderr) from e
+            raise WorkerError(f"Worker {self.pid} died: {e} {self._stderr.decode(errors='replace').strip()}") from e
+
+        self.jobs_done += 1
+        limit = self._process_limits.breached(int(code), output)
+        if limit:
+            kill_group(self.pid)
+            raise ResourceLimitExceeded(limit, output)
+        return int(code), output
+
+    def rss(self) -> int:
+        """
+        Returns the resident set size of the worker in bytes, or 0 if it is not running.
+        """
+        try:
+            return psutil.Process(self.pid).memory_info().rss
+        except (psutil.Error, TypeError):
+            return 0
+
+    async def stop(self):
+        """
+        Stops the process. Closing stdin ends the worker loop; it is killed if it does not exit.
+        """
+        if self.alive:
+            try:
+                self._process.stdin.close()
+                await asyncio.wait_for(self._process.wait(), timeout=2)
+            except (asyncio.TimeoutError, ConnectionError):
+                self._process.kill()
+                await self._process.wait()
+        await self._collect_stderr()
+        if self._stderr_task and not self._stderr_task.done():
+            self._stderr_task.cancel()
+
+
+class LuaWorkerPool:
+    """
+    Pool of persistent Lua obfuscation workers.
+    Workers are recycled after a number of jobs, when their memory grows past a limit, or when they crash.
+    """
+
+    def __init__(self, lua: str, obfuscator_folder: str, program_logger, size: Optional[int] = None, max_jobs: int = 100, max_rss: Optional[int] = None,
+                 limits: Optional[ResourceLimits] = None, idle_timeout: float = 5):
+        """
+        Initializes the pool. Workers are started by start().
+
+        Args:
+            lua: Name or path of the LUA 5.4 interpreter.
+            obfuscator_folder: Folder containing hercules.lua.
+            program_logger: Logger object to log messages.
+            size: Number of workers. Defaults to the CPU count.
+            max_jobs: Jobs after which a worker is replaced.
+            max_rss: Resident memory in bytes after which a worker is replaced.
+            limits: Resource limits of the workers and their jobs.
+            idle_timeout: Seconds between checks whether the pool still has workers while a job waits for an idle one.
+        """
+        self._lua = lua
+        self._folder = obfuscator_folder
+        self._script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'obfuscator_worker.lua')
+        self._program_logger = program_logger
+        self.size = size or os.cpu_count() or 1
+        self.max_jobs = max_jobs
+        self.max_rss = max_rss
+        self._limits = limits
+        self.idle_timeout = idle_timeout
+        self._idle: asyncio.Queue[LuaWorker] = asyncio.Queue()
+        self._workers: set[LuaWorker] = set()
+        self._tasks: set[asyncio.Task] = set()
+        self.running = False
+
+    @property
+    def available(self) -> bool:
+        """
+        True if the pool is running and has workers that are alive or being restarted.
+        """
+        return self.running and bool(self._workers or self._tasks)
+
+    def _preload(self) -> list[str]:
+        """
+        Collects the module files of the obfuscator, relative to its folder.
+        """
+        files = []
+        for root, _, names in os.walk(self._folder):
+            for name in names:
+                if name.endswith('.lua') and name != 'hercules.lua':
+                    files.append(os.path.relpath(os.path.join(root, name), self._folder).replace('\\', '/'))
+        return sorted(files)
+
+    async def _spawn(self) -> LuaWorker:
+        worker = LuaWorker(self._lua, self._script, self._folder, self._preload(), self._limits)
+        await worker.start()
+        self._workers.add(worker)
+        return worker
+
+    async def _replace(self, worker: LuaWorker):
+        self._workers.discard(worker)
+        await worker.stop()
+        if not self.running:
+            return
+        try:
+            self._idle.put_nowait(await self._spawn())
+        except (OSError, WorkerError) as e:
+            self._program_logger.error(f"Could not restart obfuscation worker: {e}")
+
+    def _schedule_replace(self, worker: LuaWorker):
+        task = asyncio.create_task(self._replace(worker))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def start(self):
+        """
+        Starts all workers.
+        """
+        self.running = True
+        workers = await asyncio.gather(*(self._spawn() for _ in range(self.size)))
+        for worker in workers:
+            self._idle.put_nowait(worker)
+        self._program_logger.info(f"Started {self.size} obfuscation workers.")
+
+    async def run(self, args: list[str], seed: Optional[int] = None, on_start: Optional[Callable[[], None]] = None) -> tuple[int, bytes]:
+        """
+        Runs a hercules.lua invocation on the next idle worker.
+
+        Args:
+            args: Arguments for hercules.lua.
+            seed: Optional seed for math.randomseed.
+            on_start: Called once a worker was acquired and the job starts.
+
+        Returns:
+            A tuple containing the exit code and the captured output.
+
+        Raises:
+            WorkerError: If the worker died while processing the job.
+            NoWorkersError: If the pool has no workers left to run the job.
+        """
+        worker = await self._acquire()
+        if on_start:
+            on_start()
+        try:
+            result = await worker.run(args, seed)
+        except BaseException:
+            self._schedule_replace(worker)
+            raise
+
+        if worker.jobs_done >= self.max_jobs or (self.max_rss and worker.rss() > self.max_rss):
+            self._program_logger.debug(f"Recycling obfuscation worker {worker.pid} after {worker.jobs_done} jobs.")
+            self._schedule_replace(worker)
+        else:
+            self._idle.put_nowait(worker)
+        return result
+
+    async def _acquire(self) -> LuaWorker:
+        """
+        Waits for an idle worker that is alive. Dead workers are replaced on the way.
+
+        Raises:
+            NoWorkersError: If no worker is alive or being restarted anymore.
+        """
+        while True:
+            if not self.available:
+                raise NoWorkersError("No obfuscation workers are left")
+            try:
+                worker = await asyncio.wait_for(self._idle.get(), timeout=self.idle_timeout)
+            except asyncio.TimeoutError:
+                continue
+            if worker.alive:
+                return worker
+            self._schedule_replace(worker)
+
+    async def stop(self):
+        """
+        Stops all workers.
+        """
+        self.running = False
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await asyncio.gather(*(worker.stop() for worker in list(self._workers)), return_exceptions=True)
+        self._workers.clear()